@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
-import requests
+import asyncio
 import json
 import re
 import argparse
 import sys
-import pandas as pd
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from datetime import datetime
 import logging
+import time
 from collections import defaultdict
+from instrumentation import span
+from product_record import Product, product_id_from_url, write_parquet
+from rate_limiter import BudgetExhausted, get_oxylabs_limiter
+from shared_cache import normalize_query
+from singleflight import SingleFlight
+from metrics import (OXYLABS_REQUEST_SECONDS, OXYLABS_RESPONSES, OXYLABS_RESPONSE_BYTES, CARDS_FOUND,
+                     PRODUCTS_EXTRACTED, PRODUCTS_DROPPED, EXTRACTION_PATH,
+                     record_cache, start_from_env, flush_to_file_from_env)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -198,8 +206,11 @@ def extract_alibaba_products_from_cards(html):
     Extrae productos usando el método de tarjetas individuales según la guía.
     Cada tarjeta contiene toda la info de un producto/proveedor sin mezclar datos.
     """
+    return list(iter_alibaba_products_from_cards(html))
+
+def iter_alibaba_products_from_cards(html):
+    """Versión generador: entrega cada producto apenas se extrae de su tarjeta"""
     soup = BeautifulSoup(html, 'html.parser')
-    products = []
     
     # Buscar tarjetas de resultados (varios formatos posibles)
     card_selectors = [
@@ -215,55 +226,34 @@ def extract_alibaba_products_from_cards(html):
         cards = soup.select(selector)
         if cards:
             logger.info(f"Found {len(cards)} product cards using selector: {selector}")
+            CARDS_FOUND.observe(len(cards), selector=selector)
             break
     
     if not cards:
         logger.warning("No product cards found with any selector")
-        return []
+        CARDS_FOUND.observe(0, selector='none')
+        return
     
+    extracted = 0
     for i, card in enumerate(cards):
         try:
             product = extract_product_from_card(card)
-            if product:
-                products.append(product)
         except Exception as e:
             logger.warning(f"Error extracting product from card {i}: {e}")
+            PRODUCTS_DROPPED.inc(reason='card_error')
             continue
+        if product:
+            extracted += 1
+            PRODUCTS_EXTRACTED.inc(path='cards')
+            yield product
+        else:
+            PRODUCTS_DROPPED.inc(reason='card_without_title')
     
-    logger.info(f"Successfully extracted {len(products)} products from {len(cards)} cards")
-    return products
+    logger.info(f"Successfully extracted {extracted} products from {len(cards)} cards")
 
 def extract_product_from_card(card):
     """Extrae todos los datos de un producto desde una tarjeta individual"""
-    product = {
-        'product_id': None,
-        'product_title': None,
-        'product_url': None,
-        'price_min': None,
-        'price_max': None,
-        'price': None,
-        'currency': None,
-        'moq_value': None,
-        'moq_unit': None,
-        'sold_quantity': None,
-        'product_review_avg': None,
-        'product_review_count': None,
-        'product_certifications': [],
-        'product_cert_icon_urls': [],
-        'est_delivery_by': None,
-        'has_easy_return': False,
-        'has_add_to_cart': False,
-        'has_chat_now': False,
-        'has_add_to_compare': False,
-        'has_add_to_favorites': False,
-        'supplier_name': None,
-        'supplier_profile_url': None,
-        'supplier_verified': False,
-        'supplier_gold_level': 0,
-        'supplier_years': None,
-        'supplier_country_code': None,
-        'image_link': None
-    }
+    product = Product()
     
     # 1) Enlaces y título del producto
     detail_link = card.select_one('a.search-card-e-detail-wrapper[href]')
@@ -274,20 +264,18 @@ def extract_product_from_card(card):
                 href = 'https:' + href
             elif href.startswith('/'):
                 href = 'https://www.alibaba.com' + href
-            product['product_url'] = href
+            product.product_url = href
             
         # Extraer product_id de la URL
         if href:
-            id_match = re.search(r'(\d{8,})', href)
-            if id_match:
-                product['product_id'] = id_match.group(1)
+            product.product_id = product_id_from_url(href)
     
     # Título del producto
     title_elem = card.select_one('[data-spm="d_title"] a, h2 a, .search-card-e-title a')
     if title_elem:
         title = title_elem.get_text(strip=True)
         title = re.sub(r'<[^>]+>', '', title)  # Limpiar HTML
-        product['product_title'] = title
+        product.product_title = title
     
     # 2) Precio y moneda - MEJORADO con parser inteligente
     price_elem = card.select_one('.search-card-e-price-main')
@@ -296,21 +284,21 @@ def extract_product_from_card(card):
         prices = extract_price_range_smart(price_text)
         if prices:
             if len(prices) == 1:
-                product['price'] = prices[0]
-                product['price_min'] = prices[0]
-                product['price_max'] = prices[0]
+                product.price = prices[0]
+                product.price_min = prices[0]
+                product.price_max = prices[0]
             else:
-                product['price'] = max(prices)
-                product['price_min'] = min(prices)
-                product['price_max'] = max(prices)
+                product.price = max(prices)
+                product.price_min = min(prices)
+                product.price_max = max(prices)
         
         # Detectar moneda
         if '€' in price_text:
-            product['currency'] = 'EUR'
+            product.currency = 'EUR'
         elif '$' in price_text or 'USD' in price_text.upper():
-            product['currency'] = 'USD'
+            product.currency = 'USD'
         else:
-            product['currency'] = 'USD'  # Por defecto
+            product.currency = 'USD'  # Por defecto
     
     # 3) MOQ (pedido mínimo)
     moq_elem = card.select_one('[data-aplus-auto-card-mod*="area=moq"]')
@@ -320,8 +308,8 @@ def extract_product_from_card(card):
         if moq_match:
             moq_val = parse_int_any(moq_match.group(1))
             if moq_val:
-                product['moq_value'] = float(moq_val)
-                product['moq_unit'] = normalize_unit(moq_match.group(2))
+                product.moq_value = float(moq_val)
+                product.moq_unit = normalize_unit(moq_match.group(2))
     
     # 4) Cantidad vendida
     sold_elem = card.select_one('[data-aplus-auto-card-mod*="soldQuantity"]')
@@ -330,7 +318,7 @@ def extract_product_from_card(card):
         content_match = re.search(r'areaContent=(\d+)', area_content)
         if content_match:
             try:
-                product['sold_quantity'] = int(content_match.group(1))
+                product.sold_quantity = int(content_match.group(1))
             except:
                 pass
         else:
@@ -339,7 +327,7 @@ def extract_product_from_card(card):
             sold_match = re.search(r'(\d+)\s*sold', sold_text, re.IGNORECASE)
             if sold_match:
                 try:
-                    product['sold_quantity'] = int(sold_match.group(1))
+                    product.sold_quantity = int(sold_match.group(1))
                 except:
                     pass
     
@@ -357,13 +345,13 @@ def extract_product_from_card(card):
             if '@@' in review_data:
                 rating_str, count_str = (review_data.split('@@') + [None, None])[:2]
                 try:
-                    product['product_review_avg'] = float((rating_str or '').replace(',', '.'))
+                    product.product_review_avg = float((rating_str or '').replace(',', '.'))
                 except:
-                    product['product_review_avg'] = None
+                    product.product_review_avg = None
                 try:
-                    product['product_review_count'] = int(re.sub(r'\D', '', count_str or '') or 0)
+                    product.product_review_count = int(re.sub(r'\D', '', count_str or '') or 0)
                 except:
-                    product['product_review_count'] = None
+                    product.product_review_count = None
     
     # 6) Certificaciones del producto
     cert_icons = card.select('img.search-card-e-icon__certification')
@@ -377,39 +365,39 @@ def extract_product_from_card(card):
                 certs.append(alt)
             if src:
                 cert_urls.append(src)
-        product['product_certifications'] = certs
-        product['product_cert_icon_urls'] = cert_urls
+        product.product_certifications = certs
+        product.product_cert_icon_urls = cert_urls
     
     # 7) Entrega estimada y características
     delivery_elem = card.select_one('[data-aplus-auto-card-mod*="area=deliveryBy"]')
     if delivery_elem:
         delivery_text = delivery_elem.get_text(strip=True)
-        product['est_delivery_by'] = delivery_text
+        product.est_delivery_by = delivery_text
     
     # Características booleanas
-    product['has_easy_return'] = bool(card.select_one('[data-aplus-auto-card-mod*="easy_return"]'))
+    product.has_easy_return = bool(card.select_one('[data-aplus-auto-card-mod*="easy_return"]'))
     
     # Usar búsqueda de texto en lugar de :contains deprecated
     card_text = card.get_text()
-    product['has_add_to_cart'] = 'Add to cart' in card_text
-    product['has_chat_now'] = 'Chat now' in card_text
-    product['has_add_to_compare'] = 'Add to compare' in card_text
-    product['has_add_to_favorites'] = 'Add to Favorites' in card_text
+    product.has_add_to_cart = 'Add to cart' in card_text
+    product.has_chat_now = 'Chat now' in card_text
+    product.has_add_to_compare = 'Add to compare' in card_text
+    product.has_add_to_favorites = 'Add to Favorites' in card_text
     
     # 8) Información del proveedor
     supplier_elem = card.select_one('a.search-card-e-company')
     if supplier_elem:
-        product['supplier_name'] = supplier_elem.get_text(strip=True)
+        product.supplier_name = supplier_elem.get_text(strip=True)
         href = supplier_elem.get('href', '')
         if href:
             if href.startswith('//'):
                 href = 'https:' + href
             elif href.startswith('/'):
                 href = 'https://www.alibaba.com' + href
-            product['supplier_profile_url'] = href
+            product.supplier_profile_url = href
     
     # 9) Verificación y años del proveedor
-    product['supplier_verified'] = bool(card.select_one('.verified-supplier-icon__wrapper img.verified-supplier-icon'))
+    product.supplier_verified = bool(card.select_one('.verified-supplier-icon__wrapper img.verified-supplier-icon'))
     
     # Años como proveedor y país
     years_elem = card.select_one('a.search-card-e-supplier__year')
@@ -417,12 +405,12 @@ def extract_product_from_card(card):
         years_text = years_elem.get_text(strip=True)
         years_match = re.search(r'(\d+)\s*yrs?', years_text, re.IGNORECASE)
         if years_match:
-            product['supplier_years'] = int(years_match.group(1))
+            product.supplier_years = int(years_match.group(1))
         
         # País (de la bandera)
         flag_img = years_elem.select_one('img[alt]')
         if flag_img:
-            product['supplier_country_code'] = flag_img.get('alt', '').strip().upper()
+            product.supplier_country_code = flag_img.get('alt', '').strip().upper()
     
     # 10) Diamantes (Gold Supplier level) - selector CSS corregido
     try:
@@ -436,9 +424,9 @@ def extract_product_from_card(card):
                 href = use.get('xlink:href', '') or use.get('href', '')
                 if '#icon-diamond-large' in href:
                     diamond_count += 1
-        product['supplier_gold_level'] = diamond_count
+        product.supplier_gold_level = diamond_count
     except Exception as e:
-        product['supplier_gold_level'] = 0
+        product.supplier_gold_level = 0
     
     # 11) Imagen del producto - MEJORADO CON MÚLTIPLES SELECTORES
     img_elem = None
@@ -471,15 +459,15 @@ def extract_product_from_card(card):
                 
                 # Validar que sea una URL de imagen válida
                 if ('alicdn.com' in src or 'alibaba.com' in src) and any(ext in src.lower() for ext in ['.jpg', '.jpeg', '.png', '.webp', '.gif']):
-                    product['image_link'] = src
+                    product.image_link = src
                     break
                 elif 'http' in src and not 'data:' in src:  # URL válida pero sin extensión específica
-                    product['image_link'] = src
+                    product.image_link = src
                     break
     
     # Solo retornar si tenemos título
-    if product['product_title']:
-        return product
+    if product.product_title:
+        return product.intern_fields()
     
     return None
 
@@ -617,6 +605,11 @@ def extract_alibaba_reviews_prices(html):
     out = [v for v in products.values() if v['product_link']]
     return out
 
+# Requests idénticos en vuelo (misma búsqueda normalizada y opciones) se hacen una sola vez;
+# compartido por todas las instancias del proceso (sesiones de Streamlit, threads del modo batch)
+SEARCH_FLIGHT = SingleFlight()
+
+
 class AlibabaProductScraper:
     def __init__(self, username=None, password=None):
         # Usar config.py para obtener credenciales
@@ -633,78 +626,202 @@ class AlibabaProductScraper:
 
     def search_products(self, query):
         logger.info(f"Starting search for: '{query}'")
-        payload = {
+        with span('scrape.search_products', query=query) as search_span:
+            try:
+                response_data = self.fetch_search_response(query)
+                with span('scrape.parse'):
+                    products = self.parse_response(response_data)
+                search_span.set(products=len(products))
+                logger.info(f"Successfully extracted {len(products)} products")
+                return products
+            except BudgetExhausted:
+                # No es un resultado vacío: el llamador decide (batch se detiene, la UI avisa)
+                logger.warning(f"Oxylabs daily budget exhausted before searching '{query}'")
+                raise
+            except Exception as e:
+                logger.error(f"Error during scraping: {e}")
+                return []
+
+    def iter_products(self, query):
+        """Como search_products pero entrega cada producto apenas se extrae (modo streaming)
+        
+        La página llega completa de Oxylabs; el streaming es sobre la extracción por tarjeta.
+        El fallback JSON + HTML necesita la página entera para enriquecer y se entrega en bloque.
+        """
+        logger.info(f"Starting streaming search for: '{query}'")
+        try:
+            with span('scrape.search_products', query=query, streaming=True):
+                response_data = self.fetch_search_response(query)
+        except BudgetExhausted:
+            logger.warning(f"Oxylabs daily budget exhausted before searching '{query}'")
+            raise
+        except Exception as e:
+            logger.error(f"Error during scraping: {e}")
+            return
+        html_content = self.html_from_response(response_data)
+        if not html_content:
+            return
+        try:
+            extracted = 0
+            for product in iter_alibaba_products_from_cards(html_content):
+                extracted += 1
+                yield product
+            if extracted:
+                EXTRACTION_PATH.inc(path='cards')
+                return
+            yield from self.extract_with_fallback(BeautifulSoup(html_content, 'html.parser'), html_content)
+        except Exception as e:
+            logger.error(f"Error parsing HTML: {e}")
+
+    def build_payload(self, query):
+        return {
             'source': 'alibaba_search',
             'user_agent_type': 'desktop_chrome',
             'render': 'html',
-            'query': query
+            'query': query.strip()
         }
+
+    @staticmethod
+    def flight_key(payload):
+        """Clave de coalescencia: payload completo con la búsqueda normalizada"""
+        return json.dumps({**payload, 'query': normalize_query(payload['query'])}, sort_keys=True)
+
+    def fetch_search_response(self, query):
+        """POST a Oxylabs y JSON decodificado (lanza excepción ante error HTTP/red)
+        Si la misma búsqueda ya está en vuelo, espera esa respuesta en lugar de pagar otra."""
+        payload = self.build_payload(query)
+        response_data, shared = SEARCH_FLIGHT.do(self.flight_key(payload), self._post_search, payload)
+        record_cache('oxylabs_inflight', shared)
+        if shared:
+            logger.info(f"Reused in-flight Oxylabs request for '{query}'")
+        return response_data
+
+    async def fetch_search_response_async(self, query):
+        """fetch_search_response para asyncio (comparte los requests en vuelo con los threads)"""
+        payload = self.build_payload(query)
+        response_data, shared = await SEARCH_FLIGHT.do_async(self.flight_key(payload), self._post_search, payload)
+        record_cache('oxylabs_inflight', shared)
+        if shared:
+            logger.info(f"Reused in-flight Oxylabs request for '{query}'")
+        return response_data
+
+    async def search_products_async(self, query):
+        """search_products para asyncio: red y parseo corren en threads, el event loop queda libre"""
+        logger.info(f"Starting async search for: '{query}'")
         try:
-            resp = requests.post(
-                self.base_url,
-                auth=(self.username, self.password),
-                json=payload,
-                timeout=120
-            )
-            resp.raise_for_status()
-            response_data = resp.json()
-            products = self.parse_response(response_data)
+            response_data = await self.fetch_search_response_async(query)
+            products = await asyncio.to_thread(self.parse_response, response_data)
             logger.info(f"Successfully extracted {len(products)} products")
             return products
+        except BudgetExhausted:
+            logger.warning(f"Oxylabs daily budget exhausted before searching '{query}'")
+            raise
         except Exception as e:
             logger.error(f"Error during scraping: {e}")
             return []
 
+    def _post_search(self, payload):
+        import requests  # Diferido: no se paga al arrancar el CLI ni al parsear archivos
+        # Turno del limitador del proceso (concurrencia, requests/s, presupuesto diario):
+        # se espera en lugar de recibir 429; BudgetExhausted si no queda presupuesto
+        limiter = get_oxylabs_limiter()
+        with limiter.slot() as queue_wait, span('scrape.network') as net_span:
+            net_span.set(queue_wait_ms=round(queue_wait * 1000, 1))
+            started = time.perf_counter()
+            try:
+                resp = requests.post(
+                    self.base_url,
+                    auth=(self.username, self.password),
+                    json=payload,
+                    timeout=120
+                )
+            except Exception:
+                OXYLABS_RESPONSES.inc(status='error')
+                limiter.refund(1)  # Sin respuesta: no se cobra, no cuenta para el presupuesto
+                raise
+            finally:
+                OXYLABS_REQUEST_SECONDS.observe(time.perf_counter() - started, source=payload['source'])
+            net_span.set(status=resp.status_code, bytes=len(resp.content))
+            OXYLABS_RESPONSES.inc(status=resp.status_code)
+            OXYLABS_RESPONSE_BYTES.inc(len(resp.content))
+            if not 200 <= resp.status_code < 300:
+                limiter.refund(1)  # Oxylabs solo cobra los resultados exitosos
+                resp.raise_for_status()
+                raise requests.HTTPError(f"Unexpected status {resp.status_code} from Oxylabs", response=resp)
+        with span('scrape.json_decode'):
+            return resp.json()
+
     def parse_response(self, response_data):
+        html_content = self.html_from_response(response_data)
+        if not html_content:
+            return []
+        return self.extract_from_html(html_content)
+
+    def html_from_response(self, response_data):
+        """HTML de la primera página del resultado de Oxylabs (None si no hay)"""
         if not isinstance(response_data, dict) or 'results' not in response_data:
             logger.error("Invalid response format")
-            return []
+            return None
         results = response_data['results']
         if not results:
             logger.error("No results in response")
-            return []
+            return None
         html_content = results[0].get('content', '')
         if not html_content:
             logger.error("No HTML content found")
-            return []
-        return self.extract_from_html(html_content)
+            return None
+        return html_content
 
     def extract_from_html(self, html_content):
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            with span('parse.soup', bytes=len(html_content)):
+                soup = BeautifulSoup(html_content, 'html.parser')
             
             # MÉTODO NUEVO: Extracción directa desde tarjetas HTML (prioritario)
             logger.info("🆕 Using new card-based extraction method")
-            products = extract_alibaba_products_from_cards(html_content)
+            with span('parse.cards') as cards_span:
+                products = extract_alibaba_products_from_cards(html_content)
+                cards_span.set(products=len(products))
             
             if products:
+                EXTRACTION_PATH.inc(path='cards')
                 logger.info(f"✅ Card extraction successful: {len(products)} products")
-                # Agregar campos de compatibilidad para productos extraídos de tarjetas
-                products = self.add_compatibility_fields(products)
                 return products
             
-            # FALLBACK: Método anterior con JSON + HTML robusto
-            logger.warning("🔄 Card extraction failed, falling back to JSON + HTML method")
-            # 1) Primero intento JSON embebido (nombres/links/precio/etc.)
+            return self.extract_with_fallback(soup, html_content)
+        except Exception as e:
+            logger.error(f"Error parsing HTML: {e}")
+            return []
+
+    def extract_with_fallback(self, soup, html_content):
+        """FALLBACK: Método anterior con JSON + HTML robusto (cuando no hay tarjetas)"""
+        logger.warning("🔄 Card extraction failed, falling back to JSON + HTML method")
+        # 1) Primero intento JSON embebido (nombres/links/precio/etc.)
+        with span('parse.json') as json_span:
             products = self.extract_from_json(soup) or []
-            
-            # 2) Usar método robusto para reviews y precios desde data-aplus-auto-card-mod
+            json_span.set(products=len(products))
+        
+        # 2) Usar método robusto para reviews y precios desde data-aplus-auto-card-mod
+        with span('parse.robust_html'):
             robust_data = extract_alibaba_reviews_prices(html_content)
-            
-            # 3) Enriquecer productos JSON con datos robustos de HTML
+        
+        # 3) Enriquecer productos JSON con datos robustos de HTML
+        with span('parse.enrich_robust'):
             products = self.enrich_with_robust_data(products, robust_data)
-            
-            # 4) Enriquecer con HTML de las tarjetas (MOQ y vendidos)
-            if products:
+        
+        # 4) Enriquecer con HTML de las tarjetas (MOQ y vendidos)
+        if products:
+            with span('parse.enrich_html'):
                 products = self.enrich_with_html_by_product_id(soup, products)
-                # Fallback global (por si aún faltan campos)
+            # Fallback global (por si aún faltan campos)
+            with span('parse.global_html'):
                 products = self.enhance_with_global_html_search(soup, products)
-                return products
-            logger.warning("All extraction methods failed")
-            return []
-        except Exception as e:
-            logger.error(f"Error parsing HTML: {e}")
-            return []
+            EXTRACTION_PATH.inc(path='json_fallback')
+            PRODUCTS_EXTRACTED.inc(len(products), path='json_fallback')
+            return products
+        EXTRACTION_PATH.inc(path='failed')
+        logger.warning("All extraction methods failed")
+        return []
 
     # -------------------------
     # Enriquecimiento por tarjeta HTML (match por productId)
@@ -735,7 +852,7 @@ class AlibabaProductScraper:
 
         enriched_moq, enriched_sold = 0, 0
         for p in products:
-            pid = str(p.get('product_id') or '') or self.try_guess_pid_from_url(p.get('product_link'))
+            pid = str(p.product_id or '') or self.try_guess_pid_from_url(p.product_url)
             if not pid:
                 continue
             card = containers.get(pid)
@@ -743,30 +860,26 @@ class AlibabaProductScraper:
                 continue
 
             # MOQ
-            if p.get('minimum_order') in [None, 0]:
+            if p.moq_value in [None, 0]:
                 moq_text = self.get_text(card, '.price-area-center .searchx-moq, .searchx-moq')
                 moq_val = parse_int_any(moq_text)
                 if moq_val is not None:
-                    p['minimum_order'] = float(moq_val)
+                    p.moq_value = float(moq_val)
                     enriched_moq += 1
 
             # Vendidos
-            if p.get('amount_sold') in [None, 0]:
+            if p.sold_quantity in [None, 0]:
                 sold_text = self.get_text(card, '.price-area-center .searchx-sold-order, .searchx-sold-order')
                 sold_val = parse_int_any(sold_text)
                 if sold_val is not None:
-                    p['amount_sold'] = float(sold_val)
+                    p.sold_quantity = int(sold_val)
                     enriched_sold += 1
 
         logger.info(f"HTML enrich: MOQ={enriched_moq}, Sold={enriched_sold}")
         return products
 
     def try_guess_pid_from_url(self, url):
-        if not url:
-            return None
-        # agarro el último bloque de dígitos largo
-        m = re.search(r'(\d{8,})', url)
-        return m.group(1) if m else None
+        return product_id_from_url(url)
 
     def get_text(self, node, css):
         el = node.select_one(css)
@@ -785,15 +898,15 @@ class AlibabaProductScraper:
             # asigno solo si el producto aún está vacío y hay material
             i, j = 0, 0
             for p in products:
-                if (p.get('minimum_order') in [None, 0]) and i < len(moq_matches):
+                if (p.moq_value in [None, 0]) and i < len(moq_matches):
                     val = parse_int_any(moq_matches[i])
                     if val is not None:
-                        p['minimum_order'] = float(val)
+                        p.moq_value = float(val)
                         i += 1
-                if (p.get('amount_sold') in [None, 0]) and j < len(sold_matches):
+                if (p.sold_quantity in [None, 0]) and j < len(sold_matches):
                     val = parse_int_any(sold_matches[j])
                     if val is not None:
-                        p['amount_sold'] = float(val)
+                        p.sold_quantity = int(val)
                         j += 1
             return products
         except Exception as e:
@@ -824,6 +937,8 @@ class AlibabaProductScraper:
                     prod = self.parse_offer(offer)
                     if prod:
                         products.append(prod)
+                    else:
+                        PRODUCTS_DROPPED.inc(reason='offer_invalid')
                 if products:
                     return products
             except Exception as e:
@@ -838,49 +953,13 @@ class AlibabaProductScraper:
 
     def parse_offer(self, offer):
         try:
-            product = {
-                'product_id': None,
-                'product_title': None,
-                'product_url': None,
-                'price_min': None,
-                'price_max': None,
-                'price': None,  # Mantener para compatibilidad
-                'currency': None,
-                'moq_value': None,
-                'moq_unit': None,
-                'minimum_order': None,  # Mantener para compatibilidad
-                'sold_quantity': None,
-                'amount_sold': None,  # Mantener para compatibilidad
-                'product_review_avg': None,
-                'product_review_count': None,
-                'review_average': None,  # Mantener para compatibilidad
-                'amount_of_reviews': None,  # Mantener para compatibilidad
-                'product_certifications': [],
-                'product_cert_icon_urls': [],
-                'est_delivery_by': None,
-                'has_easy_return': False,
-                'has_add_to_cart': False,
-                'has_chat_now': False,
-                'has_add_to_compare': False,
-                'has_add_to_favorites': False,
-                'supplier_name': None,
-                'supplier_profile_url': None,
-                'supplier_verified': False,
-                'supplier_gold_level': 0,
-                'supplier_years': None,
-                'supplier_country_code': None,
-                'seller_name': None,  # Mantener para compatibilidad
-                'seller_link': None,  # Mantener para compatibilidad
-                'product_link': None,  # Mantener para compatibilidad
-                'image_link': None,
-                'is_supplier_verified': False  # Mantener para compatibilidad
-            }
+            product = Product()
 
             # product_id: varios nombres posibles
             pid = (offer.get('productId') or offer.get('offerId') or
                    offer.get('id') or offer.get('dataId') or offer.get('offerid'))
             if pid:
-                product['product_id'] = str(pid)
+                product.product_id = str(pid)
 
             # título - PRIORIZAR enPureTitle que está limpio
             title = offer.get('enPureTitle') or offer.get('title') or ''
@@ -888,8 +967,7 @@ class AlibabaProductScraper:
                 title = ''
             # Limpiar HTML tags si los hay
             title = re.sub(r'<[^>]+>', '', str(title)).strip()
-            product['product_title'] = title or None
-            product['title'] = title or None  # Mantener compatibilidad
+            product.product_title = title or None
 
             # precio → manejo de rangos y moneda (mejorado con parser inteligente)
             price = offer.get('price') or offer.get('priceV2')
@@ -898,46 +976,43 @@ class AlibabaProductScraper:
                 prices = extract_price_range_smart(price_str)
                 if prices:
                     if len(prices) == 1:
-                        product['price'] = prices[0]
-                        product['price_min'] = prices[0]
-                        product['price_max'] = prices[0]
+                        product.price = prices[0]
+                        product.price_min = prices[0]
+                        product.price_max = prices[0]
                     else:
-                        product['price'] = max(prices)  # Compatibilidad
-                        product['price_min'] = min(prices)
-                        product['price_max'] = max(prices)
+                        product.price = max(prices)
+                        product.price_min = min(prices)
+                        product.price_max = max(prices)
                     
                     # Detectar moneda (asumimos USD por defecto en Alibaba)
                     if '€' in price_str or 'EUR' in price_str.upper():
-                        product['currency'] = 'EUR'
+                        product.currency = 'EUR'
                     elif '$' in price_str or 'USD' in price_str.upper():
-                        product['currency'] = 'USD'
+                        product.currency = 'USD'
                     else:
-                        product['currency'] = 'USD'  # Por defecto
+                        product.currency = 'USD'  # Por defecto
 
             # seller/supplier info
             company_name = (offer.get('companyName') or '').strip()
-            product['supplier_name'] = company_name or None
-            product['seller_name'] = company_name or None  # Compatibilidad
+            product.supplier_name = company_name or None
 
             # links
             supplier_href = offer.get('supplierHref', '')
             if supplier_href:
-                product['supplier_profile_url'] = self.clean_url(supplier_href)
-                product['seller_link'] = self.clean_url(supplier_href)  # Compatibilidad
+                product.supplier_profile_url = self.clean_url(supplier_href)
 
             product_url = offer.get('productUrl', '')
             if product_url:
-                product['product_url'] = self.clean_url(product_url)
-                product['product_link'] = self.clean_url(product_url)  # Compatibilidad
-                if not product['product_id']:
+                product.product_url = self.clean_url(product_url)
+                if not product.product_id:
                     # intento extraer pid de la URL
-                    guessed = self.try_guess_pid_from_url(product['product_url'])
+                    guessed = self.try_guess_pid_from_url(product.product_url)
                     if guessed:
-                        product['product_id'] = guessed
+                        product.product_id = guessed
 
             main_image = offer.get('mainImage', '')
             if main_image:
-                product['image_link'] = self.clean_url(main_image)
+                product.image_link = self.clean_url(main_image)
 
             # MOQ desde JSON - MEJORADO: Extraer valor y unidad
             moq_value = None
@@ -979,9 +1054,8 @@ class AlibabaProductScraper:
                         moq_value = float(moq_val)
                         
             if moq_value and moq_value > 0:
-                product['moq_value'] = moq_value
-                product['moq_unit'] = moq_unit or 'piece'
-                product['minimum_order'] = moq_value  # Compatibilidad
+                product.moq_value = moq_value
+                product.moq_unit = moq_unit or 'piece'
 
             # Verificación del proveedor y nivel Gold
             is_verified = False
@@ -1027,10 +1101,9 @@ class AlibabaProductScraper:
                                     if years_match:
                                         supplier_years = int(years_match.group(1))
             
-            product['supplier_verified'] = is_verified
-            product['supplier_gold_level'] = gold_level  # Se actualizará en HTML parsing
-            product['supplier_years'] = supplier_years
-            product['is_supplier_verified'] = is_verified  # Compatibilidad
+            product.supplier_verified = is_verified
+            product.supplier_gold_level = gold_level  # Se actualizará en HTML parsing
+            product.supplier_years = supplier_years
 
             # REVIEWS - SEPARACIÓN ESTRICTA: Producto vs Proveedor
             # SOLO reviews de PRODUCTO (nunca mezclar con supplier)
@@ -1052,11 +1125,9 @@ class AlibabaProductScraper:
             
             # Establecer campos de reviews de PRODUCTO SOLAMENTE
             if product_review_count > 0:
-                product['product_review_count'] = product_review_count
-                product['amount_of_reviews'] = product_review_count  # Compatibilidad
+                product.product_review_count = product_review_count
             if product_review_score > 0:
-                product['product_review_avg'] = product_review_score
-                product['review_average'] = product_review_score  # Compatibilidad
+                product.product_review_avg = product_review_score
             
             # REVIEWS DE PROVEEDOR - Guardar por separado (NUNCA mezclar con producto)
             supplier_review_count = None
@@ -1078,8 +1149,8 @@ class AlibabaProductScraper:
                             pass
             
             # Campos separados para reviews de proveedor
-            product['supplier_review_count'] = supplier_review_count
-            product['supplier_review_avg'] = supplier_review_avg
+            product.supplier_review_count = supplier_review_count
+            product.supplier_review_avg = supplier_review_avg
 
             # vendidos / órdenes
             sold_value = None
@@ -1095,11 +1166,10 @@ class AlibabaProductScraper:
                     pass
                     
             if sold_value is not None and sold_value > 0:
-                product['sold_quantity'] = int(sold_value)
-                product['amount_sold'] = sold_value  # Compatibilidad
+                product.sold_quantity = int(sold_value)
 
-            if product['product_title']:
-                return product
+            if product.product_title:
+                return product.intern_fields()
         except Exception as e:
             logger.warning(f"Error parsing offer: {e}")
         return None
@@ -1142,37 +1212,6 @@ class AlibabaProductScraper:
         else:
             return unit or 'piece'
     
-    def add_compatibility_fields(self, products):
-        """Agrega campos de compatibilidad para productos extraídos con el nuevo método
-        IMPORTANTE: NUNCA mapear supplier_review_* a campos de producto
-        """
-        for product in products:
-            # Campos de compatibilidad con el sistema anterior
-            if not product.get('title') and product.get('product_title'):
-                product['title'] = product['product_title']
-            if not product.get('product_link') and product.get('product_url'):
-                product['product_link'] = product['product_url']
-            if not product.get('seller_name') and product.get('supplier_name'):
-                product['seller_name'] = product['supplier_name']
-            if not product.get('seller_link') and product.get('supplier_profile_url'):
-                product['seller_link'] = product['supplier_profile_url']
-            if not product.get('minimum_order') and product.get('moq_value'):
-                product['minimum_order'] = product['moq_value']
-            if not product.get('amount_sold') and product.get('sold_quantity'):
-                product['amount_sold'] = float(product['sold_quantity'])
-            
-            # REVIEWS - SOLO mapear si existen reviews de PRODUCTO (nunca de supplier)
-            if not product.get('amount_of_reviews') and product.get('product_review_count'):
-                product['amount_of_reviews'] = product['product_review_count']
-            if not product.get('review_average') and product.get('product_review_avg'):
-                product['review_average'] = product['product_review_avg']
-            
-            # Verificación del proveedor
-            if not product.get('is_supplier_verified') and product.get('supplier_verified'):
-                product['is_supplier_verified'] = product['supplier_verified']
-                
-        return products
-    
     def enrich_with_robust_data(self, products, robust_data):
         """Enriquecer productos del JSON con datos robustos del HTML"""
         if not robust_data:
@@ -1185,7 +1224,7 @@ class AlibabaProductScraper:
         enriched_price, enriched_reviews = 0, 0
         
         for product in products:
-            product_link = product.get('product_link')
+            product_link = product.product_url
             if not product_link:
                 continue
                 
@@ -1195,17 +1234,17 @@ class AlibabaProductScraper:
                 continue
             
             # Enriquecer precio si está vacío o es None
-            if (not product.get('price') or product.get('price') == 0) and robust_item.get('price_max'):
-                product['price'] = robust_item['price_max']
+            if not product.price and robust_item.get('price_max'):
+                product.price = robust_item['price_max']
                 enriched_price += 1
                 
             # Enriquecer reviews si están vacíos o son None
-            if (not product.get('amount_of_reviews') or product.get('amount_of_reviews') == 0) and robust_item.get('rating_count'):
-                product['amount_of_reviews'] = int(robust_item['rating_count'])
+            if not product.product_review_count and robust_item.get('rating_count'):
+                product.product_review_count = int(robust_item['rating_count'])
                 enriched_reviews += 1
                 
-            if (not product.get('review_average') or product.get('review_average') == 0) and robust_item.get('rating_avg'):
-                product['review_average'] = float(robust_item['rating_avg'])
+            if not product.product_review_avg and robust_item.get('rating_avg'):
+                product.product_review_avg = float(robust_item['rating_avg'])
         
         logger.info(f"Robust HTML enrich: Price={enriched_price}, Reviews={enriched_reviews}")
         return products
@@ -1233,22 +1272,8 @@ class AlibabaProductScraper:
         filtered = []
         
         for product in products:
-            # Filtro por reviews
-            if min_reviews > 0:
-                reviews = product.get('amount_of_reviews')
-                if not reviews or reviews < min_reviews:
-                    if verbose:
-                        logger.debug(f"Filtered out - insufficient reviews: {product.get('title', 'Unknown')[:50]}... (reviews: {reviews})")
-                    continue
-            
-            # Filtro por verificación
-            if require_verified:
-                if not product.get('is_supplier_verified', False):
-                    if verbose:
-                        logger.debug(f"Filtered out - not verified: {product.get('title', 'Unknown')[:50]}...")
-                    continue
-            
-            filtered.append(product)
+            if self.passes_filters(product, min_reviews, require_verified, verbose):
+                filtered.append(product)
         
         filtered_count = len(filtered)
         if verbose:
@@ -1262,6 +1287,25 @@ class AlibabaProductScraper:
         
         return filtered
     
+    def passes_filters(self, product, min_reviews=1, require_verified=True, verbose=True):
+        """Criterio de filter_products para un solo producto (usado también en modo streaming)"""
+        # Filtro por reviews
+        if min_reviews > 0:
+            reviews = product.get('amount_of_reviews')
+            if not reviews or reviews < min_reviews:
+                if verbose:
+                    logger.debug(f"Filtered out - insufficient reviews: {product.get('title', 'Unknown')[:50]}... (reviews: {reviews})")
+                return False
+        
+        # Filtro por verificación
+        if require_verified:
+            if not product.get('is_supplier_verified', False):
+                if verbose:
+                    logger.debug(f"Filtered out - not verified: {product.get('title', 'Unknown')[:50]}...")
+                return False
+        
+        return True
+    
     # -------------------------
     # Output helpers
     # -------------------------
@@ -1275,10 +1319,14 @@ class AlibabaProductScraper:
         try:
             if format.lower() == 'json':
                 with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(products, f, indent=2, ensure_ascii=False)
+                    json.dump([Product.from_dict(p).to_dict() for p in products], f, indent=2, ensure_ascii=False)
             elif format.lower() == 'csv':
-                df = pd.DataFrame(products)
+                import pandas as pd
+                df = pd.DataFrame([Product.from_dict(p).to_dict() for p in products])
                 df.to_csv(filename, index=False, encoding='utf-8-sig')
+            elif format.lower() == 'parquet':
+                # Columnar con schema estable (listas reales, zstd); requiere pyarrow
+                write_parquet(products, filename)
             else:
                 raise ValueError(f"Unsupported format: {format}")
             logger.info(f"Results saved to: {filename}")
@@ -1287,6 +1335,26 @@ class AlibabaProductScraper:
             logger.error(f"Error saving results: {e}")
             return None
 
+    def stream_ndjson(self, queries, out, min_reviews=1, require_verified=True, apply_filters=True):
+        """Escribir cada producto como una línea JSON apenas se extrae (flush por registro)
+        
+        A diferencia de filter_products, en streaming no hay vuelta atrás: si ningún
+        producto pasa los filtros, la búsqueda no emite nada.
+        """
+        total = 0
+        for query in queries:
+            emitted = 0
+            for product in self.iter_products(query):
+                if apply_filters and not self.passes_filters(product, min_reviews, require_verified, verbose=False):
+                    continue
+                record = {'query': query, **product.to_dict()}
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                emitted += 1
+            logger.info(f"'{query}': {emitted} products streamed")
+            total += emitted
+        return total
+
     def print_summary(self, products):
         if not products:
             print("No products found")
@@ -1446,19 +1514,62 @@ class AlibabaProductScraper:
         
         print(f"  🔗 Link: {product.get('product_link', 'N/A')}")
 
+def read_queries_file(path):
+    """Una búsqueda por línea; ignora líneas vacías y comentarios (#)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
 def main():
+    # Modo lote: `alibaba_scraper.py batch --input queries.txt --concurrency 8 --out dir/`
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        from batch_scraper import batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(description='Scrape Alibaba product data')
-    parser.add_argument('query', help='Search query for Alibaba products')
-    parser.add_argument('--output', '-o', help='Output filename')
-    parser.add_argument('--format', '-f', choices=['csv', 'json'], default='json')
+    parser.add_argument('query', nargs='?', help='Search query for Alibaba products')
+    parser.add_argument('--queries-file', '-q', help='File with one query per line (requires --format ndjson)')
+    parser.add_argument('--output', '-o', help='Output filename (ndjson: defaults to stdout)')
+    parser.add_argument('--format', '-f', choices=['csv', 'json', 'parquet', 'ndjson'], default='json',
+                        help='ndjson streams one product per line as soon as it is extracted')
     parser.add_argument('--show-sample', '-s', type=int, default=3, help='Show N sample products')
     parser.add_argument('--min-reviews', '-r', type=int, default=1, help='Minimum reviews required (0 to disable)')
     parser.add_argument('--allow-unverified', action='store_true', help='Allow non-verified suppliers')
     parser.add_argument('--no-filter', action='store_true', help='Skip all filtering (show all products)')
     args = parser.parse_args()
 
+    queries = read_queries_file(args.queries_file) if args.queries_file else []
+    if args.query:
+        queries.insert(0, args.query)
+    if not queries:
+        parser.error('a query or --queries-file is required')
+    if len(queries) > 1 and args.format != 'ndjson':
+        parser.error('multiple queries (--queries-file) require --format ndjson')
+
+    start_from_env()
     scraper = AlibabaProductScraper()
-    products = scraper.search_products(args.query)
+
+    if args.format == 'ndjson':
+        out = open(args.output, 'w', encoding='utf-8') if args.output and args.output != '-' else sys.stdout
+        try:
+            total = scraper.stream_ndjson(queries, out,
+                                          min_reviews=args.min_reviews,
+                                          require_verified=not args.allow_unverified,
+                                          apply_filters=not args.no_filter)
+        except BudgetExhausted as e:
+            print(f"{e}: rerun tomorrow to stream the remaining queries.", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        flush_to_file_from_env()
+        print(f"Streamed {total} products from {len(queries)} queries", file=sys.stderr)
+        sys.exit(0 if total else 1)
+
+    try:
+        products = scraper.search_products(queries[0])
+    except BudgetExhausted as e:
+        print(f"{e}: rerun tomorrow.", file=sys.stderr)
+        sys.exit(1)
     if not products:
         print("No products found or error occurred.")
         sys.exit(1)
@@ -1495,11 +1606,11 @@ def main():
             for k, v in p.items():
                 if v not in [None, '', False]:
                     if isinstance(v, float):
-                        if k == 'price':
+                        if k in ['price', 'price_min', 'price_max']:
                             print(f"  {k}: ${v:.2f}")
-                        elif k in ['minimum_order','amount_of_reviews','amount_sold']:
+                        elif k == 'moq_value':
                             print(f"  {k}: {v:.0f}")
-                        elif k == 'review_average':
+                        elif k in ['product_review_avg', 'supplier_review_avg']:
                             print(f"  {k}: {v:.1f}")
                         else:
                             print(f"  {k}: {v}")
@@ -1509,6 +1620,7 @@ def main():
     filename = scraper.save_results(products, args.output, args.format)
     if filename:
         print(f"\nResults saved to: {filename}")
+    flush_to_file_from_env()
     print("\nScraping completed successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Batch scraper - Sourcing Triads
+Modo lote del CLI: `python alibaba_scraper.py batch --input queries.txt --concurrency 8 --out dir/`.
+Corre todas las búsquedas en un solo proceso con concurrencia acotada, guarda un archivo por
+búsqueda y un checkpoint append-only para retomar una corrida interrumpida donde quedó.
+Con `--mode push-pull` las búsquedas se envían como jobs asíncronos de Oxylabs (oxylabs_batch)
+en lugar de una conexión realtime por render; el guardado y el checkpoint son los mismos.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+DEFAULT_CONCURRENCY = 4
+MODES = ('realtime', 'push-pull')
+
+
+def query_slug(query: str) -> str:
+    """Nombre de archivo estable para una búsqueda
+    El hash de la búsqueda original evita que 'Licuadoras!' y 'licuadoras?' pisen el mismo archivo"""
+    slug = re.sub(r'[^\w\-]+', '_', query.strip().lower()).strip('_') or 'query'
+    return f"{slug}-{hashlib.sha1(query.encode('utf-8')).hexdigest()[:8]}"
+
+
+class Checkpoint:
+    """Registro append-only de búsquedas terminadas (una línea JSON por búsqueda)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def completed(self) -> Set[str]:
+        """Búsquedas que ya terminaron OK (las fallidas se reintentan)"""
+        done = set()
+        if not self.path.exists():
+            return done
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea cortada por una interrupción
+                if entry.get('status') == 'ok':
+                    done.add(entry['query'])
+                else:
+                    done.discard(entry['query'])
+        return done
+
+    def record(self, query: str, status: str, products: int = 0, file: Optional[str] = None,
+               error: Optional[str] = None):
+        entry = {'query': query, 'status': status, 'products': products, 'file': file,
+                 'error': error, 'time': datetime.now().isoformat(timespec='seconds')}
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class Progress:
+    """Línea de progreso en vivo (stderr): completadas, throughput y ETA"""
+
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.products = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def update(self, products: int, ok: bool, deferred: bool = False):
+        """deferred: búsqueda no intentada (sin presupuesto); cuenta como procesada, no como fallida"""
+        with self._lock:
+            self.done += 1
+            self.products += products
+            self.failed += 0 if ok or deferred else 1
+            elapsed = time.perf_counter() - self.started
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            remaining = (self.total - self.done) / rate if rate > 0 else 0.0
+            self.stream.write(
+                f"\r[{self.done}/{self.total}] {rate * 60:.1f} búsquedas/min · "
+                f"{self.products} productos · {self.failed} fallidas · ETA {_format_seconds(remaining)}   ")
+            self.stream.flush()
+
+    def finish(self):
+        self.stream.write('\n')
+        self.stream.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def run_batch(queries: List[str], out_dir, concurrency: int = DEFAULT_CONCURRENCY, fmt: str = 'json',
+              scraper_factory: Optional[Callable] = None, progress_stream=sys.stderr,
+              mode: str = 'realtime', batch_client=None) -> Dict:
+    """Scrapear `queries` con a lo sumo `concurrency` requests en vuelo, saltando las ya
+    completadas según el checkpoint de `out_dir`. Devuelve un resumen de la corrida.
+    mode='push-pull': jobs asíncronos de Oxylabs; `concurrency` acota el polling de resultados."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = Checkpoint(out_dir / CHECKPOINT_FILE)
+    done = checkpoint.completed()
+    pending = [q for q in dict.fromkeys(queries) if q not in done]
+    skipped = len(set(queries)) - len(pending)
+    if skipped:
+        logger.info(f"Resuming: {skipped} queries already completed in {checkpoint.path}")
+
+    if scraper_factory is None:
+        from alibaba_scraper import AlibabaProductScraper
+        scraper_factory = AlibabaProductScraper
+    scraper = scraper_factory()
+    progress = Progress(len(pending), progress_stream)
+    # Los workers esperan turno en el limitador de Oxylabs (backpressure); sin presupuesto
+    # diario las búsquedas pendientes quedan fuera del checkpoint y se retoman en otra corrida
+    from rate_limiter import BudgetExhausted, get_oxylabs_limiter
+    limiter = get_oxylabs_limiter()
+
+    def store(query: str, products: List):
+        """Guardar los productos de una búsqueda y anotarla en el checkpoint"""
+        if not products:
+            checkpoint.record(query, 'failed', error='no products')
+            return query, 0, False
+        filename = scraper.save_results(products, str(out_dir / f"{query_slug(query)}.{fmt}"), fmt)
+        if not filename:
+            checkpoint.record(query, 'failed', products=len(products), error='save failed')
+            return query, len(products), False
+        checkpoint.record(query, 'ok', products=len(products), file=os.path.basename(filename))
+        return query, len(products), True
+
+    def work(query: str):
+        """-> (query, productos, ok); ok=None si quedó sin intentar por falta de presupuesto"""
+        if limiter.remaining_budget() == 0:
+            return query, 0, None
+        try:
+            products = scraper.search_products(query)
+        except BudgetExhausted:
+            return query, 0, None  # Otro worker gastó el último request
+        return store(query, products)
+
+    summary = {'total': len(set(queries)), 'skipped': skipped, 'completed': 0, 'failed': 0,
+               'deferred': 0, 'products': 0}
+    if mode == 'push-pull':
+        _run_push_pull(pending, scraper, store, checkpoint, summary, progress, concurrency, batch_client)
+        summary['budget_exhausted'] = limiter.remaining_budget() == 0
+        return summary
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='batch-scrape')
+    futures = [executor.submit(work, query) for query in pending]
+    try:
+        for future in as_completed(futures):
+            try:
+                query, count, ok = future.result()
+            except Exception as e:
+                logger.error(f"Batch worker error: {e}")
+                count, ok = 0, False
+            if ok is None:
+                summary['deferred'] += 1
+                progress.update(0, False, deferred=True)
+                continue
+            summary['completed' if ok else 'failed'] += 1
+            summary['products'] += count
+            progress.update(count, ok)
+    except KeyboardInterrupt:
+        progress.finish()
+        print("⏸️  Interrumpido: las búsquedas terminadas quedaron en el checkpoint; "
+              "volvé a correr el mismo comando para retomar.", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    progress.finish()
+    summary['budget_exhausted'] = limiter.remaining_budget() == 0
+    return summary
+
+
+def _run_push_pull(pending: List[str], scraper, store: Callable, checkpoint: Checkpoint, summary: Dict,
+                   progress: Progress, concurrency: int, batch_client=None):
+    """Enviar las búsquedas pendientes como jobs push-pull y procesar cada resultado apenas
+    llega con el mismo parse_response del modo realtime"""
+    from oxylabs_batch import client_for
+    client = batch_client or client_for(scraper, max_workers=max(1, concurrency))
+    payload = {k: v for k, v in scraper.build_payload('').items() if k != 'query'}
+    # El job vuelve con la búsqueda normalizada (strip): volver a la original del archivo
+    originals = {q.strip(): q for q in pending}
+
+    def finish(query: str, response_data: Optional[Dict], error: Optional[Exception]):
+        query = originals.get(query, query)
+        count, ok = 0, False
+        if error is not None:
+            checkpoint.record(query, 'failed', error=str(error))
+        else:
+            try:
+                _, count, ok = store(query, scraper.parse_response(response_data))
+            except Exception as e:
+                logger.error(f"Batch result error for '{query}': {e}")
+                checkpoint.record(query, 'failed', error=str(e))
+        summary['completed' if ok else 'failed'] += 1
+        summary['products'] += count
+        progress.update(count, ok)
+
+    try:
+        # Los lotes cuyo POST falló vuelven como error (su reserva ya se devolvió al presupuesto);
+        # los jobs ya enviados se consultan igual: están pagos
+        jobs, submit_errors = client.submit(list(originals), payload)
+        # Las que no entraron en el presupuesto diario no se enviaron: quedan para otra corrida
+        summary['deferred'] = len(originals) - len(jobs) - len(submit_errors)
+        for _ in range(summary['deferred']):
+            progress.update(0, False, deferred=True)
+        for query, error in submit_errors.items():
+            finish(query, None, error)
+        for query, response_data, error in client.collect(jobs):
+            finish(query, response_data, error)
+    except KeyboardInterrupt:
+        progress.finish()
+        print("⏸️  Interrumpido: las búsquedas terminadas quedaron en el checkpoint; "
+              "volvé a correr el mismo comando para retomar.", file=sys.stderr)
+        raise
+    progress.finish()
+
+
+def batch_main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='alibaba_scraper.py batch',
+                                     description='Scrape many Alibaba queries in one process (resumable)')
+    parser.add_argument('--input', '-i', required=True, help='File with one query per line')
+    parser.add_argument('--out', '-o', required=True, help='Output directory (one file per query + checkpoint)')
+    parser.add_argument('--concurrency', '-c', type=int, default=DEFAULT_CONCURRENCY, help='Max queries in flight')
+    parser.add_argument('--format', '-f', choices=['csv', 'json', 'parquet'], default='json')
+    parser.add_argument('--mode', '-m', choices=MODES, default='realtime',
+                        help='realtime: one open request per query; push-pull: async Oxylabs jobs '
+                             '(submit in bulk, poll results; --concurrency bounds polling)')
+    args = parser.parse_args(argv)
+
+    from alibaba_scraper import read_queries_file
+    from metrics import start_from_env, flush_to_file_from_env
+    queries = read_queries_file(args.input)
+    if not queries:
+        parser.error(f"no queries in {args.input}")
+
+    start_from_env()
+    try:
+        summary = run_batch(queries, args.out, args.concurrency, args.format, mode=args.mode)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        flush_to_file_from_env()
+    print(f"Batch finished: {summary['completed']} ok, {summary['failed']} failed, "
+          f"{summary['skipped']} already done, {summary['products']} products → {args.out}")
+    if summary['budget_exhausted']:
+        print(f"Oxylabs daily budget exhausted: {summary['deferred']} queries not attempted; "
+              "rerun the same command tomorrow to resume.", file=sys.stderr)
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(batch_main())
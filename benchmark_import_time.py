@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark de tiempo de import - Sourcing Triads
+Importa cada módulo de entrada en un proceso nuevo con `python -X importtime`, informa el
+tiempo acumulado y las dependencias pesadas que cargó, y falla (exit 1) si un módulo supera
+su presupuesto o importa algo que debería cargarse recién al usarse.
+
+Uso: python benchmark_import_time.py [--runs 3] [--budget-scale 1.0] [--top 8]
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# módulo -> (presupuesto en ms, dependencias que NO debe cargar al importarse)
+BUDGETS = {
+    'alibaba_scraper': (400, ('pandas', 'requests', 'gspread', 'google.auth', 'pyarrow')),
+    'batch_scraper': (100, ('pandas', 'requests', 'bs4', 'gspread')),
+    'google_sheets_exporter': (2000, ('gspread', 'google.auth', 'google_auth_oauthlib', 'requests')),
+    'sourcing_app_clean': (2500, ('gspread', 'google.auth', 'google_auth_oauthlib', 'requests',
+                                  'alibaba_scraper', 'bs4')),
+}
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def measure(module: str):
+    """(ms acumulados del módulo, {módulo importado: ms acumulados}) en un proceso limpio"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    imported = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            imported[match.group(4)] = int(match.group(2)) / 1000
+    return imported.get(module, 0.0), imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='Corridas por módulo (se toma la mejor)')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiplicador de los presupuestos (máquinas lentas / CI)')
+    parser.add_argument('--top', type=int, default=8, help='Dependencias más costosas a mostrar')
+    parser.add_argument('modules', nargs='*', help='Módulos a medir (default: todos los de BUDGETS)')
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules or BUDGETS:
+        budget_ms, forbidden = BUDGETS.get(module, (float('inf'), ()))
+        budget_ms *= args.budget_scale
+        try:
+            runs = [measure(module) for _ in range(max(1, args.runs))]
+        except RuntimeError as e:
+            print(f"{module:<24} NO SE PUDO IMPORTAR\n    {e}")
+            failures.append(f"{module}: falla al importarse")
+            continue
+        best_ms, imported = min(runs, key=lambda run: run[0])
+
+        status = 'OK' if best_ms <= budget_ms else 'SOBRE PRESUPUESTO'
+        print(f"{module:<24} {best_ms:8.1f} ms  (presupuesto {budget_ms:.0f} ms)  {status}")
+        heavy = sorted(((ms, name) for name, ms in imported.items()
+                        if name != module and '.' not in name), reverse=True)[:args.top]
+        for ms, name in heavy:
+            print(f"    {name:<28} {ms:8.1f} ms")
+        if best_ms > budget_ms:
+            failures.append(f"{module}: {best_ms:.1f} ms > {budget_ms:.0f} ms")
+        loaded = [name for name in forbidden if name in imported]
+        if loaded:
+            print(f"    ⚠️  carga al importarse: {', '.join(loaded)}")
+            failures.append(f"{module}: importa {', '.join(loaded)} (debería ser diferido)")
+
+    if failures:
+        print("\nFALLÓ:\n  " + "\n  ".join(failures))
+        return 1
+    print("\nOK: todos los módulos dentro del presupuesto")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
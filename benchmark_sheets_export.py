@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark de exportación a Google Sheets - Sourcing Triads
+Ejecuta las exportaciones contra el backend falso (fake_sheets.py), mide el tiempo con
+latencia simulada y verifica la cantidad de llamadas a la API por exportación.
+
+Uso: python benchmark_sheets_export.py [--latency 0.05] [--queries 5]
+"""
+
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from fake_sheets import FakeSheetsBackend
+from google_sheets_exporter import GoogleSheetsExporter
+
+SPREADSHEET_ID = "benchmark-spreadsheet"
+
+
+def build_query_data(query: str, n_products: int = 20, price_offset: float = 0.0):
+    """DataFrame normalizado + tríada sintéticos con el formato de SourcingAnalyzer"""
+    rows = []
+    for i in range(n_products):
+        product_id = 1600000000000 + i
+        rows.append({
+            'title': f"{query} modelo {i}",
+            'companyName': f"Proveedor {i % 7}",
+            'verified_supplier': i % 2 == 0,
+            'unit_price_norm_usd': 10.0 + i + price_offset,
+            'landed_est_usd': (10.0 + i + price_offset) * 3,
+            'moq': 100 + i,
+            'supplier_rating': 4.5,
+            'supplier_reviews_count': 10 * i,
+            'product_certifications': ['CE', 'RoHS'] if i % 3 == 0 else [],
+            'supplier_profile_url': f"https://proveedor{i % 7}.en.alibaba.com",
+            'productUrl': f"https://www.alibaba.com/product-detail/Product_{product_id}.html",
+            'image_link': f"https://s.alicdn.com/@sc04/kf/H{product_id}.jpg",
+        })
+    df = pd.DataFrame(rows)
+    triad = {'cheapest': df.iloc[0], 'best_quality': df.iloc[1], 'best_value': df.iloc[2]}
+    estadisticas = {
+        'precio_promedio': df['unit_price_norm_usd'].mean(),
+        'moq_promedio': df['moq'].mean(),
+        'rating_proveedor_promedio': df['supplier_rating'].mean(),
+        'proveedores_verificados': df['verified_supplier'].sum(),
+    }
+    return {'df_data': df, 'triad_data': triad, 'estadisticas': estadisticas}
+
+
+class Checks:
+    """Verificaciones explícitas (no `assert`: `python -O` las elimina y el benchmark pasaría igual)"""
+
+    def __init__(self):
+        self.failures = []
+
+    def expect(self, ok: bool, message: str):
+        if not ok:
+            print(f"    ⚠️  {message}")
+            self.failures.append(message)
+
+    def calls(self, label: str, calls: int, expected: int):
+        self.expect(calls == expected, f"{label}: {calls} llamadas (esperadas {expected})")
+
+
+def run(label: str, backend: FakeSheetsBackend, fn, checks: Checks):
+    backend.reset_calls()
+    exporter = GoogleSheetsExporter(client=backend.client(), spreadsheet_id=SPREADSHEET_ID)
+    start = time.perf_counter()
+    result = fn(exporter)
+    elapsed = time.perf_counter() - start
+    counts = backend.call_counts()
+    detail = ', '.join(f"{method}={count}" for method, count in sorted(counts.items()))
+    print(f"{label:<40} {backend.round_trips:>4} llamadas {elapsed:>7.3f}s  ({detail})")
+    checks.expect(bool(result), f"{label}: la exportación no devolvió URL")
+    return backend.round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de exportación a Google Sheets (backend falso)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latencia simulada por llamada (segundos)')
+    parser.add_argument('--queries', type=int, default=5, help='Cantidad de búsquedas a exportar')
+    args = parser.parse_args()
+
+    queries = {f"busqueda {i}": build_query_data(f"busqueda {i}") for i in range(args.queries)}
+    first_query, first_data = next(iter(queries.items()))
+    exporter = GoogleSheetsExporter()
+    data_rows = len(exporter._collect_rows(first_data['df_data'], first_data['triad_data']))
+
+    checks = Checks()
+    print(f"Backend falso: latencia={args.latency}s, {args.queries} búsquedas, {data_rows} filas por hoja\n")
+
+    # Exportación individual clásica: append_row + 2 update_cell por fila
+    backend = FakeSheetsBackend(latency=args.latency)
+    calls = run("export_triad_data (1 búsqueda)", backend,
+                lambda e: e.export_triad_data(first_query, first_data['df_data'], first_data['triad_data']), checks)
+    checks.calls("export_triad_data", calls, 9 + 3 * data_rows)
+
+    # Exportación consolidada: open + worksheets + batch_update + values_batch_update
+    backend = FakeSheetsBackend(latency=args.latency)
+    calls = run(f"export_multiple_queries ({args.queries} búsquedas)", backend,
+                lambda e: e.export_multiple_queries(queries), checks)
+    checks.calls("export_multiple_queries", calls, 4)
+
+    # Exportación consolidada en el lugar: la segunda vez todas las hojas existen y se leen
+    # con un values_batch_get; las llamadas no dependen de la cantidad de búsquedas
+    backend = FakeSheetsBackend(latency=args.latency)
+    calls = run("export_multiple_queries in place (nuevas)", backend,
+                lambda e: e.export_multiple_queries(queries, update_in_place=True), checks)
+    checks.calls("export_multiple_queries in place (nuevas)", calls, 4)
+    worksheet = backend.spreadsheets[SPREADSHEET_ID]._by_title(first_query)
+    worksheet.cells[(2, 13)] = 250  # CANTIDAD editada a mano
+    changed_queries = {query: build_query_data(query, n_products=25, price_offset=1.0) for query in queries}
+    calls = run("export_multiple_queries in place (diff)", backend,
+                lambda e: e.export_multiple_queries(changed_queries, update_in_place=True), checks)
+    checks.calls("export_multiple_queries in place (diff)", calls, 5)
+    checks.expect(worksheet.cells.get((2, 13)) == 250, "export_multiple_queries: CANTIDAD editada fue sobrescrita")
+    checks.expect(worksheet.cells.get((2, 5)) == 11.0, "export_multiple_queries: el diff no actualizó el precio")
+
+    # Actualización en el lugar: primera vez crea la hoja, luego solo diff
+    backend = FakeSheetsBackend(latency=args.latency)
+    calls = run("update_triad_data (hoja nueva)", backend,
+                lambda e: e.update_triad_data(first_query, first_data['df_data'], first_data['triad_data']), checks)
+    checks.calls("update_triad_data (hoja nueva)", calls, 4)
+
+    worksheet = backend.spreadsheets[SPREADSHEET_ID]._by_title(first_query)
+    worksheet.cells[(2, 13)] = 250  # CANTIDAD editada a mano
+    changed = build_query_data(first_query, n_products=25, price_offset=1.0)
+    calls = run("update_triad_data (diff)", backend,
+                lambda e: e.update_triad_data(first_query, changed['df_data'], changed['triad_data']), checks)
+    checks.calls("update_triad_data (diff)", calls, 4)
+    checks.expect(worksheet.cells.get((2, 13)) == 250, "update_triad_data: CANTIDAD editada fue sobrescrita")
+
+    calls = run("update_triad_data (sin cambios)", backend,
+                lambda e: e.update_triad_data(first_query, changed['df_data'], changed['triad_data']), checks)
+    checks.calls("update_triad_data (sin cambios)", calls, 3)
+
+    if checks.failures:
+        print("\nFALLÓ:\n  " + "\n  ".join(checks.failures))
+        return 1
+    print("\n✅ Cantidad de llamadas por exportación dentro de lo esperado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
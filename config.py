@@ -51,6 +51,23 @@ def get_oxylabs_password() -> str:
     except (KeyError, AttributeError):
         return os.getenv('OXYLABS_PASSWORD', 'Justo1234567_')
 
+def get_oxylabs_limits() -> dict:
+    """Límites de uso de Oxylabs: requests en vuelo, requests/segundo y presupuesto diario (0 = sin límite)"""
+    try:
+        limits = st.secrets["oxylabs"]["limits"]
+        return {
+            'max_concurrency': int(limits.get('max_concurrency', 5)),
+            'requests_per_second': float(limits.get('requests_per_second', 2.0)),
+            'daily_budget': int(limits.get('daily_budget', 0)),
+        }
+    except Exception:
+        # Sin secrets.toml (CLI) o sin sección [oxylabs.limits]
+        return {
+            'max_concurrency': int(os.getenv('OXYLABS_MAX_CONCURRENCY', '5')),
+            'requests_per_second': float(os.getenv('OXYLABS_REQUESTS_PER_SECOND', '2')),
+            'daily_budget': int(os.getenv('OXYLABS_DAILY_BUDGET', '0')),
+        }
+
 def get_google_sheets_spreadsheet_id() -> str:
     """Obtener ID del spreadsheet de Google Sheets"""
     try:
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Export Jobs - Sourcing Triads
+Exportaciones a Google Sheets en un worker en segundo plano.
+El botón de la UI solo encola el trabajo y recibe un handle; el progreso queda en
+un log estructurado del job y la UI lo consulta en cada rerun.
+"""
+
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from instrumentation import span
+
+# Jobs terminados que se conservan en memoria (los más viejos se descartan)
+MAX_FINISHED_JOBS = 100
+
+
+class ExportJob:
+    """Handle de una exportación: estado, eventos de progreso y URL resultante"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, label: str):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.status = self.PENDING
+        self.url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self._events: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_event(self, event: Dict):
+        with self._lock:
+            self._events.append(event)
+
+    @property
+    def events(self) -> List[Dict]:
+        with self._lock:
+            return list(self._events)
+
+    @property
+    def last_event(self) -> Optional[Dict]:
+        with self._lock:
+            return self._events[-1] if self._events else None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED)
+
+
+class ExportJobManager:
+    """Pool de workers compartido por todas las sesiones del proceso"""
+
+    def __init__(self, max_workers: int = 2, exporter_factory: Optional[Callable] = None):
+        """exporter_factory(on_event) -> exporter; por defecto GoogleSheetsExporter real"""
+        self.exporter_factory = exporter_factory
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sheets-export')
+        self.jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label: str, task: Callable) -> ExportJob:
+        """Encolar task(exporter) -> url y devolver el handle inmediatamente"""
+        job = ExportJob(label)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job, task)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job: ExportJob, task: Callable):
+        job.status = ExportJob.RUNNING
+        url, error = None, None
+        try:
+            if self.exporter_factory:
+                exporter = self.exporter_factory(on_event=job.add_event)
+            else:
+                from google_sheets_exporter import GoogleSheetsExporter
+                exporter = GoogleSheetsExporter(on_event=job.add_event)
+            with span('export.job', query=job.label):
+                url = task(exporter)
+            if not url:
+                error = "La exportación no devolvió una URL"
+        except Exception as e:
+            error = str(e)
+            job.add_event({'time': datetime.now().isoformat(timespec='seconds'),
+                           'level': 'error', 'message': f"❌ Error inesperado: {e}"})
+        finally:
+            # finished_at antes que status: un job terminado siempre tiene finished_at (_prune lo ordena)
+            job.url, job.error = url, error
+            job.finished_at = datetime.now()
+            job.status = ExportJob.DONE if url and not error else ExportJob.FAILED
+
+    def _prune(self):
+        finished = sorted((j for j in self.jobs.values() if j.finished),
+                          key=lambda j: j.finished_at or datetime.max)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+
+_manager: Optional[ExportJobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_export_manager() -> ExportJobManager:
+    """Manager único por proceso (sobrevive a los reruns de Streamlit)"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ExportJobManager()
+        return _manager
+
+
+def submit_export(query_title: str, df_data, triad_data: Dict, estadisticas: Dict = None,
+                  update_in_place: bool = False) -> ExportJob:
+    """Encolar la exportación de una búsqueda"""
+    df_data = df_data.copy()
+    triad_data = dict(triad_data)
+    if update_in_place:
+        task = lambda exporter: exporter.update_triad_data(query_title, df_data, triad_data)
+    else:
+        task = lambda exporter: exporter.export_triad_data(query_title, df_data, triad_data, estadisticas)
+    return get_export_manager().submit(query_title, task)
+
+
+def submit_export_all(queries_data: Dict[str, Dict], update_in_place: bool = False) -> ExportJob:
+    """Encolar la exportación consolidada de todas las búsquedas"""
+    queries_data = {query: dict(data, df_data=data['df_data'].copy()) for query, data in queries_data.items()}
+    task = lambda exporter: exporter.export_multiple_queries(queries_data, update_in_place=update_in_place)
+    return get_export_manager().submit(f"{len(queries_data)} búsquedas", task)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Fake Oxylabs push-pull server - Sourcing Triads
+Servidor HTTP local que imita los endpoints push-pull que usa OxylabsBatchClient
+(submit en lote, estado y resultados), para probar y medir el modo batch sin credenciales
+ni consumo del plan. Cada job queda 'pending' `delay` segundos y devuelve una página de
+búsqueda con tarjetas de producto que entiende extract_from_html.
+
+Uso: python fake_oxylabs.py --port 8765 [--delay 1.5] [--fail "query rota"]
+     OXYLABS_PUSH_PULL_URL=http://127.0.0.1:8765/v1 python alibaba_scraper.py batch --mode push-pull ...
+"""
+
+import argparse
+import html
+import itertools
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional
+
+_JOB_PATH = re.compile(r'^/v1/queries/([^/]+)(/results)?$')
+
+
+def search_page(query: str, cards: int = 5) -> str:
+    """Página de búsqueda mínima con `cards` tarjetas (mismo markup que las de Alibaba)"""
+    items = []
+    for i in range(cards):
+        product_id = 1600000000 + zlib.crc32(f'{query}|{i}'.encode('utf-8')) % 100000000
+        title = html.escape(f"{query.title()} model {i + 1}")
+        items.append(
+            '<div class="fy23-search-card m-gallery-product-item-v2 J-search-card-wrapper">'
+            f'<a class="search-card-e-detail-wrapper" href="//www.alibaba.com/product-detail/item_{product_id}.html"></a>'
+            f'<h2 class="search-card-e-title"><a>{title}</a></h2>'
+            f'<div class="search-card-e-price-main">${1 + i}.50-${3 + i}.00</div>'
+            '</div>')
+    return f"<html><body>{''.join(items)}</body></html>"
+
+
+class FakeOxylabsBackend:
+    """Estado compartido: jobs enviados, cuándo quedan listos y registro de llamadas
+
+    delay: segundos que un job queda 'pending' antes de pasar a 'done'.
+    fail: búsquedas cuyo job termina en 'faulted'.
+    """
+
+    def __init__(self, delay: float = 1.0, fail: Optional[Iterable[str]] = None, cards: int = 5):
+        self.delay = delay
+        self.fail = set(fail or ())
+        self.cards = cards
+        self.jobs: Dict[str, Dict] = {}
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(7000000000000000000)
+        self._lock = threading.Lock()
+
+    def submit(self, payload: Dict) -> Dict:
+        queries = payload.get('query') or []
+        if isinstance(queries, str):
+            queries = [queries]
+        created = []
+        with self._lock:
+            self.calls['submit'] += 1
+            for query in queries:
+                job_id = str(next(self._ids))
+                self.jobs[job_id] = {'id': job_id, 'query': query, 'source': payload.get('source'),
+                                     'ready_at': time.time() + self.delay}
+                created.append({'id': job_id, 'query': query, 'status': 'pending'})
+        return {'queries': created}
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            self.calls['status'] += 1
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if time.time() < job['ready_at']:
+            state = 'pending'
+        else:
+            state = 'faulted' if job['query'] in self.fail else 'done'
+        return {'id': job_id, 'query': job['query'], 'status': state}
+
+    def results(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            self.calls['results'] += 1
+            job = self.jobs.get(job_id)
+        if job is None or time.time() < job['ready_at'] or job['query'] in self.fail:
+            return None
+        return {'results': [{'content': search_page(job['query'], self.cards), 'status_code': 200,
+                             'job_id': job_id}]}
+
+
+def make_handler(backend: FakeOxylabsBackend):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, body: Optional[Dict]):
+            data = json.dumps(body if body is not None else {'message': 'Not found'}).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/v1/queries/batch':
+                return self._send(404, None)
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send(400, {'message': 'Invalid JSON'})
+            self._send(200, backend.submit(payload))
+
+        def do_GET(self):
+            match = _JOB_PATH.match(self.path)
+            if not match:
+                return self._send(404, None)
+            job_id, results = match.groups()
+            body = backend.results(job_id) if results else backend.status(job_id)
+            self._send(200 if body is not None else 404, body)
+
+        def log_message(self, format, *args):
+            pass  # Silencioso: el polling genera muchas líneas
+
+    return Handler
+
+
+def serve(backend: FakeOxylabsBackend, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Levantar el servidor en un thread de fondo (port=0 -> puerto libre); base URL en
+    f"http://{host}:{server.server_port}/v1". Detener con server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    threading.Thread(target=server.serve_forever, name='fake-oxylabs', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=1.0, help="Segundos que cada job queda 'pending'")
+    parser.add_argument('--cards', type=int, default=5, help='Tarjetas de producto por página')
+    parser.add_argument('--fail', action='append', default=[], help="Búsqueda cuyo job termina en 'faulted'")
+    args = parser.parse_args()
+
+    backend = FakeOxylabsBackend(delay=args.delay, fail=args.fail, cards=args.cards)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(backend))
+    print(f"Fake Oxylabs push-pull en http://{args.host}:{server.server_port}/v1 (Ctrl+C para salir)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Llamadas: {dict(backend.calls)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Fake Google Sheets backend - Sourcing Triads
+Backend en memoria con la misma interfaz de gspread que usa GoogleSheetsExporter.
+Registra cada llamada a la API, simula latencia y errores de cuota y cuenta round trips,
+para probar y medir exportaciones sin credenciales ni red.
+"""
+
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+
+class FakeQuotaError(Exception):
+    """Equivalente a un APIError 429 (RESOURCE_EXHAUSTED) de Google Sheets"""
+
+    def __init__(self, method: str):
+        super().__init__(f"[429] Quota exceeded for quota metric 'Write requests' ({method})")
+        self.code = 429
+        self.method = method
+
+
+class FakeCall:
+    """Una llamada registrada (una llamada = un round trip a la API)"""
+
+    def __init__(self, method: str, target: str, args: tuple, kwargs: dict):
+        self.method = method
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        return f"FakeCall({self.target}.{self.method})"
+
+
+class FakeSheetsBackend:
+    """Estado compartido: spreadsheets, registro de llamadas, latencia y errores simulados
+
+    latency: segundos de espera por llamada.
+    fail_on: {'append_row': [2, 5]} -> error de cuota en la 2da y 5ta llamada a append_row.
+    quota_error_rate: probabilidad de error de cuota en cualquier llamada (con seed fija).
+    """
+
+    def __init__(self, latency: float = 0.0, fail_on: Optional[Dict[str, Iterable[int]]] = None,
+                 quota_error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.fail_on = {method: set(calls) for method, calls in (fail_on or {}).items()}
+        self.quota_error_rate = quota_error_rate
+        self.random = random.Random(seed)
+        self.spreadsheets: Dict[str, 'FakeSpreadsheet'] = {}
+        self.calls: List[FakeCall] = []
+        self.quota_errors = 0
+
+    def record(self, target: str, method: str, *args, **kwargs):
+        """Registrar llamada, aplicar latencia y decidir si falla por cuota"""
+        self.calls.append(FakeCall(method, target, args, kwargs))
+        if self.latency:
+            time.sleep(self.latency)
+        method_calls = sum(1 for call in self.calls if call.method == method)
+        if method_calls in self.fail_on.get(method, ()) or (
+                self.quota_error_rate and self.random.random() < self.quota_error_rate):
+            self.quota_errors += 1
+            raise FakeQuotaError(method)
+
+    @property
+    def round_trips(self) -> int:
+        return len(self.calls)
+
+    def call_counts(self) -> Counter:
+        return Counter(call.method for call in self.calls)
+
+    def reset_calls(self):
+        self.calls = []
+        self.quota_errors = 0
+
+    def client(self) -> 'FakeClient':
+        return FakeClient(self)
+
+
+class FakeClient:
+    """Sustituto de gspread.Client"""
+
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+
+    def open_by_key(self, key: str) -> 'FakeSpreadsheet':
+        self.backend.record('client', 'open_by_key', key)
+        if key not in self.backend.spreadsheets:
+            self.backend.spreadsheets[key] = FakeSpreadsheet(self.backend, key)
+        return self.backend.spreadsheets[key]
+
+
+class FakeSpreadsheet:
+    """Sustituto de gspread.Spreadsheet"""
+
+    def __init__(self, backend: FakeSheetsBackend, key: str):
+        self.backend = backend
+        self.id = key
+        self._worksheets: List['FakeWorksheet'] = [FakeWorksheet(backend, self, 'Sheet1', 0, 1000, 26)]
+
+    def worksheets(self) -> List['FakeWorksheet']:
+        self.backend.record('spreadsheet', 'worksheets')
+        return list(self._worksheets)
+
+    def worksheet(self, title: str) -> 'FakeWorksheet':
+        self.backend.record('spreadsheet', 'worksheet', title)
+        ws = self._by_title(title)
+        if ws is None:
+            raise KeyError(f"Worksheet not found: {title}")
+        return ws
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> 'FakeWorksheet':
+        self.backend.record('spreadsheet', 'add_worksheet', title, rows=rows, cols=cols)
+        return self._add(title, None, rows, cols)
+
+    def batch_update(self, body: Dict) -> Dict:
+        self.backend.record('spreadsheet', 'batch_update', body)
+        replies = []
+        for request in body.get('requests', []):
+            if 'addSheet' in request:
+                props = request['addSheet']['properties']
+                grid = props.get('gridProperties', {})
+                ws = self._add(props['title'], props.get('sheetId'),
+                               grid.get('rowCount', 1000), grid.get('columnCount', 26))
+                replies.append({'addSheet': {'properties': {'title': ws.title, 'sheetId': ws.id}}})
+            elif 'appendDimension' in request:
+                append = request['appendDimension']
+                ws = self._by_id(append['sheetId'])
+                if ws is not None and append.get('dimension') == 'ROWS':
+                    ws.row_count += append['length']
+                replies.append({})
+            elif 'updateCells' in request:
+                ws = self._by_id(request['updateCells']['range']['sheetId'])
+                if ws is not None:
+                    ws.cells.clear()
+                replies.append({})
+            else:
+                # Formato/anchos: no afectan los valores del backend falso
+                replies.append({})
+        return {'spreadsheetId': self.id, 'replies': replies}
+
+    def values_batch_update(self, body: Dict) -> Dict:
+        self.backend.record('spreadsheet', 'values_batch_update', body)
+        for value_range in body.get('data', []):
+            title, cell_range = _split_range(value_range['range'])
+            ws = self._by_title(title)
+            if ws is None:
+                raise KeyError(f"Unable to parse range: {value_range['range']}")
+            ws._write(cell_range, value_range['values'])
+        return {'spreadsheetId': self.id, 'totalUpdatedRanges': len(body.get('data', []))}
+
+    def values_batch_get(self, ranges: List[str], params: Optional[Dict] = None) -> Dict:
+        """Solo rangos de hoja completa ("'Hoja'"), como los que usa el exportador"""
+        self.backend.record('spreadsheet', 'values_batch_get', ranges, params=params)
+        value_ranges = []
+        for range_name in ranges:
+            title, _ = _split_range(range_name + '!A1')
+            ws = self._by_title(title)
+            if ws is None:
+                raise KeyError(f"Unable to parse range: {range_name}")
+            value_ranges.append({'range': range_name, 'values': ws._values()})
+        return {'spreadsheetId': self.id, 'valueRanges': value_ranges}
+
+    def _add(self, title: str, sheet_id: Optional[int], rows: int, cols: int) -> 'FakeWorksheet':
+        if self._by_title(title) is not None:
+            raise ValueError(f'A sheet with the name "{title}" already exists.')
+        if sheet_id is None:
+            sheet_id = max(ws.id for ws in self._worksheets) + 1 if self._worksheets else 0
+        ws = FakeWorksheet(self.backend, self, title, sheet_id, rows, cols)
+        self._worksheets.append(ws)
+        return ws
+
+    def _by_title(self, title: str) -> Optional['FakeWorksheet']:
+        return next((ws for ws in self._worksheets if ws.title == title), None)
+
+    def _by_id(self, sheet_id: int) -> Optional['FakeWorksheet']:
+        return next((ws for ws in self._worksheets if ws.id == sheet_id), None)
+
+
+class FakeWorksheet:
+    """Sustituto de gspread.Worksheet con celdas en un dict {(fila, col): valor}"""
+
+    def __init__(self, backend: FakeSheetsBackend, spreadsheet: FakeSpreadsheet, title: str,
+                 sheet_id: int, rows: int, cols: int):
+        self.backend = backend
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.row_count = rows
+        self.col_count = cols
+        self.cells: Dict[tuple, object] = {}
+        self.formats: List[tuple] = []
+
+    def append_row(self, values: List, **kwargs):
+        self.backend.record(self.title, 'append_row', values, **kwargs)
+        next_row = max((row for row, _ in self.cells), default=0) + 1
+        self._write(f"A{next_row}", [values])
+
+    def update_cell(self, row: int, col: int, value):
+        self.backend.record(self.title, 'update_cell', row, col, value)
+        self._set(row, col, value)
+
+    def update(self, range_name: str, values=None, **kwargs):
+        self.backend.record(self.title, 'update', range_name, values, **kwargs)
+        if not isinstance(values, list):
+            values = [[values]]
+        elif values and not isinstance(values[0], list):
+            values = [values]
+        self._write(range_name, values)
+
+    def batch_update(self, data: List[Dict], **kwargs):
+        self.backend.record(self.title, 'batch_update', data, **kwargs)
+        for value_range in data:
+            self._write(value_range['range'], value_range['values'])
+
+    def get_all_values(self, **kwargs) -> List[List]:
+        self.backend.record(self.title, 'get_all_values', **kwargs)
+        return self._values()
+
+    def _values(self) -> List[List]:
+        if not self.cells:
+            return []
+        last_row = max(row for row, _ in self.cells)
+        last_col = max(col for _, col in self.cells)
+        return [[self.cells.get((row, col), "") for col in range(1, last_col + 1)]
+                for row in range(1, last_row + 1)]
+
+    def add_rows(self, rows: int):
+        self.backend.record(self.title, 'add_rows', rows)
+        self.row_count += rows
+
+    def format(self, range_name: str, cell_format: Dict):
+        self.backend.record(self.title, 'format', range_name, cell_format)
+        self.formats.append((range_name, cell_format))
+
+    def columns_auto_resize(self, start_column_index: int, end_column_index: int):
+        self.backend.record(self.title, 'columns_auto_resize', start_column_index, end_column_index)
+
+    def _write(self, range_name: str, values: List[List]):
+        _, cell_range = _split_range(range_name)
+        start_row, start_col = _parse_cell(cell_range.split(':')[0])
+        for row_offset, row_values in enumerate(values):
+            for col_offset, value in enumerate(row_values):
+                self._set(start_row + row_offset, start_col + col_offset, value)
+
+    def _set(self, row: int, col: int, value):
+        if row > self.row_count or col > self.col_count:
+            raise ValueError(f"Range exceeds grid limits of '{self.title}': row {row}, col {col}")
+        if value is None or value == "":
+            self.cells.pop((row, col), None)
+        else:
+            self.cells[(row, col)] = value
+
+
+def _split_range(range_name: str):
+    """"'Hoja 1'!A1:B2" -> ('Hoja 1', 'A1:B2'); 'A1' -> (None, 'A1')"""
+    if '!' not in range_name:
+        return None, range_name
+    title, cell_range = range_name.rsplit('!', 1)
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cell_range
+
+
+def _parse_cell(cell: str):
+    """'N12' -> (12, 14)"""
+    match = re.fullmatch(r'([A-Za-z]+)(\d+)', cell.strip())
+    if not match:
+        raise ValueError(f"Unable to parse cell: {cell}")
+    col = 0
+    for char in match.group(1).upper():
+        col = col * 26 + (ord(char) - 64)
+    return int(match.group(2)), col
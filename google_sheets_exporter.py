@@ -4,14 +4,15 @@ Google Sheets Exporter - Sourcing Triads
 Manejo dedicado de exportación a Google Sheets con fórmulas correctas
 """
 
-import gspread
-from gspread.exceptions import APIError, SpreadsheetNotFound
 from datetime import datetime
 from pathlib import Path
-import streamlit as st
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import pandas as pd
 import json
+import time
+from instrumentation import span
+from metrics import SHEETS_API_CALLS, SHEETS_API_SECONDS
+from product_record import product_id_from_url
 
 try:
     from config import get_google_sheets_spreadsheet_id, get_google_credentials
@@ -22,25 +23,81 @@ except ImportError:
     def get_google_credentials():
         return None
 
+# Layout de las hojas de tríada (columnas A-N)
+SHEET_HEADERS = [
+    "IMAGEN", "PRODUCTO", "PROVEEDOR", "VERIFICADO",
+    "PRECIO_USD", "VALOR_FINAL", "CANTIDAD_MINIMA_PEDIDO", "RATING_PROVEEDOR",
+    "REVIEWS_PROVEEDOR", "CERTIFICACIONES", "LINK_PROVEEDOR",
+    "LINK_PRODUCTO", "CANTIDAD", "COSTO_TOTAL"
+]
+
+SUMMARY_HEADERS = [
+    "BUSQUEDA", "HOJA", "PRODUCTOS", "PRECIO_PROMEDIO_USD", "MOQ_PROMEDIO",
+    "RATING_PROVEEDOR_PROMEDIO", "PROVEEDORES_VERIFICADOS",
+    "MAS_BARATO", "MEJOR_CALIDAD", "MEJOR_VALOR"
+]
+
+TRIAD_KEYS = ['cheapest', 'best_quality', 'best_value']
+
+# Anchos en píxeles (columna base 0 -> ancho) equivalentes a adjust_column_width_safe
+COLUMN_WIDTHS = {0: 150, 1: 300, 2: 200, 6: 200, 9: 200, 10: 200, 11: 200}
+
+MAX_SHEET_ROWS = 95
+
+# Columnas que el usuario edita a mano: nunca se sobrescriben al actualizar en el lugar
+PRESERVED_COLUMNS = ["CANTIDAD", "COSTO_TOTAL"]
+
 class GoogleSheetsExporter:
-    def __init__(self):
-        self.client = None
+    def __init__(self, client=None, spreadsheet_id: Optional[str] = None,
+                 on_event: Optional[Callable[[Dict], None]] = None):
+        """client: cliente ya autenticado con la interfaz de gspread (p.ej. fake_sheets.FakeClient)
+        spreadsheet_id: ID explícito; por defecto el configurado en secrets
+        on_event: callback que recibe cada evento de progreso (ver _log)"""
+        self.client = client
         self.spreadsheet = None
-        self.initialized = False
+        self.initialized = client is not None
+        self.spreadsheet_id = spreadsheet_id
+        self.on_event = on_event
+        self.events: List[Dict] = []
+
+    def _api(self, operation: str, fn: Callable, *args, **kwargs):
+        """Ejecutar una llamada a la API de Sheets medida como span 'sheets.<operation>' y en métricas"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            with span(f"sheets.{operation}"):
+                result = fn(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            SHEETS_API_CALLS.inc(operation=operation, outcome=outcome)
+            SHEETS_API_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    def _log(self, level: str, message: str):
+        """Registrar evento de progreso estructurado (sin llamadas a Streamlit)
+
+        level: 'info' | 'success' | 'warning' | 'error'. La UI decide cómo mostrarlos.
+        """
+        event = {'time': datetime.now().isoformat(timespec='seconds'), 'level': level, 'message': message}
+        self.events.append(event)
+        if self.on_event:
+            self.on_event(event)
         
     def initialize_client(self):
         """Inicializar cliente de Google Sheets con manejo robusto"""
         try:
+            # gspread/google-auth se cargan recién acá: importar el módulo no los paga
+            import gspread
             # Primero intentar usar credenciales desde Streamlit secrets
             credentials = get_google_credentials()
             if credentials:
                 try:
                     # Usar credenciales desde secrets.toml
-                    self.client = gspread.service_account_from_dict(credentials)
+                    self.client = self._api('service_account_from_dict', gspread.service_account_from_dict, credentials)
                     self.initialized = True
                     return True
                 except Exception as e:
-                    st.error(f"❌ Error con credenciales de Google: {e}")
+                    self._log('error', f"❌ Error con credenciales de Google: {e}")
                     return False
             
             # Fallback: buscar archivos de credenciales locales
@@ -59,14 +116,14 @@ class GoogleSheetsExporter:
                     break
                     
             if credentials_path:
-                self.client = gspread.service_account(filename=str(credentials_path))
+                self.client = self._api('service_account', gspread.service_account, filename=str(credentials_path))
                 self.initialized = True
                 return True
             else:
-                st.error("⚠️ No se encontraron credenciales de Google (ni en secrets.toml ni archivos locales)")
+                self._log('error', "⚠️ No se encontraron credenciales de Google (ni en secrets.toml ni archivos locales)")
                 return False
         except Exception as e:
-            st.error(f"❌ Error inicializando Google Sheets: {e}")
+            self._log('error', f"❌ Error inicializando Google Sheets: {e}")
             return False
             
     def get_spreadsheet(self):
@@ -74,67 +131,67 @@ class GoogleSheetsExporter:
         try:
             if not self.client:
                 return False
-            spreadsheet_id = get_google_sheets_spreadsheet_id()
-            self.spreadsheet = self.client.open_by_key(spreadsheet_id)
+            spreadsheet_id = self.spreadsheet_id or get_google_sheets_spreadsheet_id()
+            self.spreadsheet = self._api('open_by_key', self.client.open_by_key, spreadsheet_id)
             return True
         except Exception as e:
-            st.error(f"❌ Error abriendo spreadsheet: {e}")
+            self._log('error', f"❌ Error abriendo spreadsheet: {e}")
             return False
             
     def create_worksheet_safe(self, title: str, rows: int = 100, cols: int = 14):
         """Crear worksheet de manera segura"""
         try:
             # Intentar crear nuevo worksheet
-            worksheet = self.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+            worksheet = self._api('add_worksheet', self.spreadsheet.add_worksheet, title=title, rows=rows, cols=cols)
             return worksheet
         except Exception as e:
-            st.warning(f"⚠️ No se pudo crear worksheet '{title}': {e}")
+            self._log('warning', f"⚠️ No se pudo crear worksheet '{title}': {e}")
             # Usar worksheet existente o crear con nombre único
             try:
                 timestamp = datetime.now().strftime("%H%M%S")
                 fallback_title = f"{title}_{timestamp}"
-                worksheet = self.spreadsheet.add_worksheet(title=fallback_title, rows=rows, cols=cols)
-                st.info(f"✅ Creado worksheet alternativo: {fallback_title}")
+                worksheet = self._api('add_worksheet', self.spreadsheet.add_worksheet, title=fallback_title, rows=rows, cols=cols)
+                self._log('info', f"✅ Creado worksheet alternativo: {fallback_title}")
                 return worksheet
             except Exception as fallback_error:
-                st.error(f"❌ Error creando worksheet alternativo: {fallback_error}")
+                self._log('error', f"❌ Error creando worksheet alternativo: {fallback_error}")
                 return None
 
     def add_headers(self, worksheet, headers: List[str]):
         """Agregar headers de manera robusta"""
         try:
             # Método 1: Usar append_row (más confiable)
-            worksheet.append_row(headers)
-            st.info("📝 Headers agregados con append_row")
+            self._api('append_row', worksheet.append_row, headers)
+            self._log('info', "📝 Headers agregados con append_row")
             return True
         except Exception as e1:
             try:
                 # Método 2: Usar update_cell individual
-                st.warning(f"⚠️ append_row falló ({e1}), intentando update_cell...")
+                self._log('warning', f"⚠️ append_row falló ({e1}), intentando update_cell...")
                 for col, header in enumerate(headers, start=1):
-                    worksheet.update_cell(1, col, header)
-                st.info("📝 Headers agregados con update_cell")
+                    self._api('update_cell', worksheet.update_cell, 1, col, header)
+                self._log('info', "📝 Headers agregados con update_cell")
                 return True
             except Exception as e2:
-                st.error(f"❌ Error agregando headers: {e2}")
+                self._log('error', f"❌ Error agregando headers: {e2}")
                 return False
 
     def add_data_row(self, worksheet, row_data: List, row_number: int):
         """Agregar fila de datos de manera robusta"""
         try:
             # Método 1: Usar append_row
-            worksheet.append_row(row_data)
+            self._api('append_row', worksheet.append_row, row_data)
             return True
         except Exception as e1:
             try:
                 # Método 2: Usar update_cell individual
-                st.warning(f"⚠️ append_row falló, usando update_cell...")
+                self._log('warning', f"⚠️ append_row falló, usando update_cell...")
                 for col, value in enumerate(row_data, start=1):
                     if value is not None and value != "":
-                        worksheet.update_cell(row_number, col, value)
+                        self._api('update_cell', worksheet.update_cell, row_number, col, value)
                 return True
             except Exception as e2:
-                st.error(f"❌ Error agregando fila {row_number}: {e2}")
+                self._log('error', f"❌ Error agregando fila {row_number}: {e2}")
                 return False
 
     def add_formula_safe(self, worksheet, row: int, col: int, formula: str):
@@ -142,19 +199,19 @@ class GoogleSheetsExporter:
         try:
             # CRUCIAL: Usar update_cell directamente para evitar apóstrofe automático
             # Este es el método que Google Sheets reconoce como fórmula ejecutable
-            worksheet.update_cell(row, col, formula)
+            self._api('update_cell', worksheet.update_cell, row, col, formula)
             return True
         except Exception as e:
-            st.warning(f"⚠️ Error agregando fórmula en fila {row}, columna {col}: {e}")
+            self._log('warning', f"⚠️ Error agregando fórmula en fila {row}, columna {col}: {e}")
             # Intentar método alternativo si update_cell falla
             try:
                 # Fallback usando update con rango específico
                 cell_range = self._get_cell_reference(row, col)
-                worksheet.update(cell_range, formula)
-                st.info(f"✅ Fórmula insertada con método alternativo en {cell_range}")
+                self._api('update', worksheet.update, cell_range, formula)
+                self._log('info', f"✅ Fórmula insertada con método alternativo en {cell_range}")
                 return True
             except Exception as e2:
-                st.error(f"❌ Error con método alternativo: {e2}")
+                self._log('error', f"❌ Error con método alternativo: {e2}")
                 return False
 
     def _get_cell_reference(self, row: int, col: int) -> str:
@@ -169,57 +226,57 @@ class GoogleSheetsExporter:
     def format_headers_safe(self, worksheet, range_str: str):
         """Formatear headers de manera segura"""
         try:
-            worksheet.format(range_str, {
+            self._api('format', worksheet.format, range_str, {
                 'textFormat': {'bold': True}, 
                 'backgroundColor': {'red': 0.2, 'green': 0.7, 'blue': 0.9}
             })
             return True
         except Exception as e:
-            st.warning(f"⚠️ No se pudo formatear headers: {e}")
+            self._log('warning', f"⚠️ No se pudo formatear headers: {e}")
             return False
 
     def adjust_column_width_safe(self, worksheet, col_start: int, col_end: int, width: int):
         """Ajustar ancho de columnas de manera segura"""
         try:
             # Intentar método moderno primero
-            worksheet.columns_auto_resize(col_start, col_end)
+            self._api('columns_auto_resize', worksheet.columns_auto_resize, col_start, col_end)
             return True
         except Exception as e1:
             try:
                 # Método alternativo usando formato
                 range_str = f"{chr(64+col_start)}:{chr(64+col_end)}"  # A:B, etc
-                worksheet.format(range_str, {"columnWidth": width})
+                self._api('format', worksheet.format, range_str, {"columnWidth": width})
                 return True
             except Exception as e2:
-                st.warning(f"⚠️ No se pudieron ajustar columnas {col_start}-{col_end}: {e2}")
+                self._log('warning', f"⚠️ No se pudieron ajustar columnas {col_start}-{col_end}: {e2}")
                 return False
 
     def export_triad_data(self, query_title: str, df_data: pd.DataFrame, triad_data: Dict, estadisticas: Dict = None):
         """Exportar datos de tríada con manejo de errores mejorado"""
         try:
-            st.info(f"🔄 Iniciando exportación de '{query_title}' a Google Sheets...")
+            self._log('info', f"🔄 Iniciando exportación de '{query_title}' a Google Sheets...")
             
             if not self.initialized:
-                st.info("🔐 Inicializando conexión a Google Sheets...")
+                self._log('info', "🔐 Inicializando conexión a Google Sheets...")
                 if not self.initialize_client():
-                    st.error("❌ No se pudo inicializar Google Sheets")
+                    self._log('error', "❌ No se pudo inicializar Google Sheets")
                     return None
                     
-            st.info("📊 Conectando con el spreadsheet...")
+            self._log('info', "📊 Conectando con el spreadsheet...")
             if not self.get_spreadsheet():
-                st.error("❌ No se pudo acceder al spreadsheet")
+                self._log('error', "❌ No se pudo acceder al spreadsheet")
                 return None
                 
             # Crear nombre único para el worksheet
             sheet_name = f"{query_title}_{datetime.now().strftime('%m%d_%H%M')}"
             
             # Crear worksheet
-            st.info(f"🔄 Creando hoja: {sheet_name}")
+            self._log('info', f"🔄 Creando hoja: {sheet_name}")
             worksheet = self.create_worksheet_safe(sheet_name, rows=100, cols=14)
             if not worksheet:
                 return None
                 
-            st.success(f"✅ Hoja '{sheet_name}' creada exitosamente")
+            self._log('success', f"✅ Hoja '{sheet_name}' creada exitosamente")
             
             # Headers profesionales sin emojis
             headers = [
@@ -237,7 +294,7 @@ class GoogleSheetsExporter:
             triad_types = [('cheapest', '💰 MÁS BARATO'), ('best_quality', '⭐ MEJOR CALIDAD'), ('best_value', '💎 MEJOR VALOR')]
             current_row = 2
             
-            st.info("📊 Agregando datos de tríada...")
+            self._log('info', "📊 Agregando datos de tríada...")
             for key, title in triad_types:
                 product = triad_data.get(key)
                 if product is not None:
@@ -287,7 +344,7 @@ class GoogleSheetsExporter:
                         if image_formula and image_formula != "Sin imagen":
                             self.add_formula_safe(worksheet, current_row, 1, image_formula)  # Columna A = 1
                         else:
-                            worksheet.update_cell(current_row, 1, "Sin imagen")
+                            self._api('update_cell', worksheet.update_cell, current_row, 1, "Sin imagen")
                             
                         # Agregar fórmula de costo total = LANDED_USD * CANTIDAD (SIN apóstrofe)
                         formula_costo = f"=F{current_row}*M{current_row}"  # F = LANDED_USD, M = CANTIDAD
@@ -296,7 +353,7 @@ class GoogleSheetsExporter:
                     
             # Agregar productos adicionales
             if not df_data.empty:
-                st.info("📦 Agregando productos adicionales...")
+                self._log('info', "📦 Agregando productos adicionales...")
                 products_added = 0
                 max_products = min(len(df_data), 15)
                 
@@ -352,7 +409,7 @@ class GoogleSheetsExporter:
                         if image_formula and image_formula != "Sin imagen":
                             self.add_formula_safe(worksheet, current_row, 1, image_formula)  # Columna A = 1
                         else:
-                            worksheet.update_cell(current_row, 1, "Sin imagen")
+                            self._api('update_cell', worksheet.update_cell, current_row, 1, "Sin imagen")
                             
                         # Agregar fórmula de costo total = LANDED_USD * CANTIDAD (SIN apóstrofe)
                         formula_costo = f"=F{current_row}*M{current_row}"  # F = LANDED_USD, M = CANTIDAD
@@ -364,36 +421,452 @@ class GoogleSheetsExporter:
                         if current_row >= 95:
                             break
                 
-                st.info(f"📊 Agregados {products_added} productos adicionales")
+                self._log('info', f"📊 Agregados {products_added} productos adicionales")
             
             # Formatear headers
-            st.info("🎨 Aplicando formato...")
+            self._log('info', "🎨 Aplicando formato...")
             self.format_headers_safe(worksheet, 'A1:N1')
             
             # Ajustar dimensiones de columnas de manera segura
             try:
-                st.info("📏 Ajustando dimensiones de columnas...")
+                self._log('info', "📏 Ajustando dimensiones de columnas...")
                 self.adjust_column_width_safe(worksheet, 1, 1, 150)  # Columna A (IMAGEN)
                 self.adjust_column_width_safe(worksheet, 2, 2, 300)  # Columna B (PRODUCTO)  
                 self.adjust_column_width_safe(worksheet, 3, 3, 200)  # Columna C (PROVEEDOR)
                 self.adjust_column_width_safe(worksheet, 7, 7, 200)  # Columna G (CANTIDAD_MINIMA_PEDIDO)
                 self.adjust_column_width_safe(worksheet, 10, 12, 200)  # Columnas J-L (certificaciones y links)
             except Exception as dim_error:
-                st.warning(f"⚠️ Algunas dimensiones no se pudieron ajustar: {dim_error}")
+                self._log('warning', f"⚠️ Algunas dimensiones no se pudieron ajustar: {dim_error}")
             
-            st.success(f"✅ Hoja '{sheet_name}' creada exitosamente")
-            st.info("🖼️ Imágenes y fórmulas aplicadas correctamente")
+            self._log('success', f"✅ Hoja '{sheet_name}' creada exitosamente")
+            self._log('info', "🖼️ Imágenes y fórmulas aplicadas correctamente")
             
             # Obtener URL del spreadsheet completo
-            spreadsheet_url = f"https://docs.google.com/spreadsheets/d/{get_google_sheets_spreadsheet_id()}"
+            spreadsheet_url = self._spreadsheet_url()
             return spreadsheet_url
             
         except Exception as e:
-            st.error(f"❌ Error en exportación: {e}")
+            self._log('error', f"❌ Error en exportación: {e}")
             # Mostrar error específico sin traceback completo para no romper la UI
-            st.error(f"Detalles del error: {str(e)}")
+            self._log('error', f"Detalles del error: {str(e)}")
+            return None
+
+    def export_multiple_queries(self, queries_data: Dict[str, Dict], update_in_place: bool = False):
+        """Exportar todas las búsquedas en una sola operación sobre el spreadsheet
+
+        queries_data: {query: {'df_data': DataFrame, 'triad_data': Dict, 'estadisticas': Dict}}
+        Crea una hoja por búsqueda más una hoja RESUMEN con un único cliente autenticado:
+        1 batch_update (hojas + formato) y 1 values_batch_update (todas las filas).
+        Con update_in_place=True usa hojas estables (sin timestamp): las que ya existen
+        se leen juntas con un values_batch_get, se actualizan por diff dentro de los mismos
+        dos batches y solo se crean las que faltan.
+        """
+        try:
+            if not queries_data:
+                self._log('warning', "⚠️ No hay búsquedas analizadas para exportar")
+                return None
+
+            self._log('info', f"🔄 Iniciando exportación consolidada de {len(queries_data)} búsquedas...")
+
+            if not self.initialized:
+                self._log('info', "🔐 Inicializando conexión a Google Sheets...")
+                if not self.initialize_client():
+                    self._log('error', "❌ No se pudo inicializar Google Sheets")
+                    return None
+
+            self._log('info', "📊 Conectando con el spreadsheet...")
+            if not self.get_spreadsheet():
+                self._log('error', "❌ No se pudo acceder al spreadsheet")
+                return None
+
+            # Una sola lectura de metadatos para evitar colisiones de nombres e IDs
+            existing = self._api('worksheets', self.spreadsheet.worksheets)
+            existing_by_title = {ws.title: ws for ws in existing}
+            used_titles = set(existing_by_title)
+            next_id = max((ws.id for ws in existing), default=0) + 1
+
+            timestamp = datetime.now().strftime('%m%d_%H%M')
+            sheets = []     # (query, title, sheet_id, rows) hojas nuevas
+            in_place = []   # (query, worksheet, rows) hojas existentes a actualizar
+            summary_entries = []  # (query, title, sheet_id, rows)
+            for query, data in queries_data.items():
+                rows = self._collect_rows(data.get('df_data'), data.get('triad_data') or {})
+                if update_in_place and self._sheet_title(query) in existing_by_title:
+                    worksheet = existing_by_title[self._sheet_title(query)]
+                    in_place.append((query, worksheet, rows))
+                    summary_entries.append((query, worksheet.title, worksheet.id, rows))
+                    continue
+                if update_in_place:
+                    title = self._unique_sheet_title(self._sheet_title(query), used_titles)
+                else:
+                    title = self._unique_sheet_title(f"{query}_{timestamp}", used_titles)
+                sheets.append((query, title, next_id, rows))
+                summary_entries.append((query, title, next_id, rows))
+                next_id += 1
+
+            # 1) Crear hojas nuevas con formato y anchos en un solo batch_update
+            requests_body = []
+            for _, title, sheet_id, rows in sheets:
+                requests_body.extend(self._new_sheet_requests(title, sheet_id, len(rows)))
+
+            summary_ws = existing_by_title.get("RESUMEN") if update_in_place else None
+            if summary_ws is not None:
+                # Reescribir el resumen estable: limpiar valores previos en el mismo batch
+                summary_title, summary_id = summary_ws.title, summary_ws.id
+                requests_body.append({'updateCells': {'range': {'sheetId': summary_id},
+                                                      'fields': 'userEnteredValue'}})
+            else:
+                summary_title = self._unique_sheet_title(
+                    "RESUMEN" if update_in_place else f"RESUMEN_{timestamp}", used_titles)
+                summary_id = next_id
+                requests_body.append(self._add_sheet_request(summary_title, summary_id,
+                                                             rows=max(100, len(summary_entries) + 5),
+                                                             cols=len(SUMMARY_HEADERS)))
+                requests_body.append(self._header_format_request(summary_id, len(SUMMARY_HEADERS)))
+
+            # 2) Hojas existentes: una sola lectura de todas (con fórmulas) y diff por product ID;
+            #    las filas que faltan se agregan en el mismo batch_update y las celdas cambiadas
+            #    se escriben junto con el resto en el values_batch_update
+            value_ranges = []
+            if in_place:
+                response = self._api('values_batch_get', self.spreadsheet.values_batch_get,
+                                     [self._quote_sheet_title(ws.title) for _, ws, _ in in_place],
+                                     params={'valueRenderOption': 'FORMULA'})
+                existing_ranges = response.get('valueRanges', [])
+                for i, (query, worksheet, rows) in enumerate(in_place):
+                    existing_values = existing_ranges[i].get('values', []) if i < len(existing_ranges) else []
+                    updates, _, _, last_row = self._diff_rows(existing_values, rows)
+                    if last_row > worksheet.row_count:
+                        requests_body.append({'appendDimension': {'sheetId': worksheet.id, 'dimension': 'ROWS',
+                                                                  'length': last_row - worksheet.row_count}})
+                    sheet_ref = self._quote_sheet_title(worksheet.title)
+                    value_ranges.extend({'range': f"{sheet_ref}!{u['range']}", 'values': u['values']}
+                                        for u in updates)
+
+            self._log('info', f"🔄 Preparando {len(sheets)} hojas nuevas y {len(in_place)} existentes...")
+            self._api('batch_update', self.spreadsheet.batch_update, {'requests': requests_body})
+
+            # 3) Escribir todos los valores nuevos (con fórmulas) en un solo values_batch_update
+            for _, title, _, rows in sheets:
+                value_ranges.append({
+                    'range': f"{self._quote_sheet_title(title)}!A1",
+                    'values': [SHEET_HEADERS] + rows
+                })
+            summary_rows = [SUMMARY_HEADERS]
+            for query, title, sheet_id, rows in summary_entries:
+                summary_rows.append(self._build_summary_row(query, title, sheet_id, rows,
+                                                            queries_data[query]))
+            value_ranges.append({
+                'range': f"{self._quote_sheet_title(summary_title)}!A1",
+                'values': summary_rows
+            })
+
+            self._log('info', "📊 Escribiendo datos de todas las búsquedas...")
+            self._api('values_batch_update', self.spreadsheet.values_batch_update, {
+                'valueInputOption': 'USER_ENTERED',
+                'data': value_ranges
+            })
+
+            self._log('success', f"✅ Exportadas {len(summary_entries)} búsquedas + hoja '{summary_title}'")
+            spreadsheet_url = self._spreadsheet_url()
+            return f"{spreadsheet_url}#gid={summary_id}"
+
+        except Exception as e:
+            self._log('error', f"❌ Error en exportación consolidada: {e}")
             return None
 
+    def update_triad_data(self, query_title: str, df_data: pd.DataFrame, triad_data: Dict):
+        """Actualizar en el lugar la hoja estable de la búsqueda en vez de crear una nueva
+
+        Lee la hoja una vez, compara por product ID contra las filas nuevas y escribe
+        solo las celdas cambiadas en un único batch. Las columnas editadas por el
+        usuario (CANTIDAD, COSTO_TOTAL) nunca se pisan.
+        """
+        try:
+            self._log('info', f"🔄 Actualizando hoja de '{query_title}' en Google Sheets...")
+
+            if not self.initialized:
+                self._log('info', "🔐 Inicializando conexión a Google Sheets...")
+                if not self.initialize_client():
+                    self._log('error', "❌ No se pudo inicializar Google Sheets")
+                    return None
+
+            self._log('info', "📊 Conectando con el spreadsheet...")
+            if not self.get_spreadsheet():
+                self._log('error', "❌ No se pudo acceder al spreadsheet")
+                return None
+
+            sheet_name = self._sheet_title(query_title)
+            rows = self._collect_rows(df_data, triad_data)
+            existing = self._api('worksheets', self.spreadsheet.worksheets)
+            worksheet = next((ws for ws in existing if ws.title == sheet_name), None)
+
+            if worksheet is None:
+                # Primera exportación: crear la hoja estable y escribir todo de una vez
+                sheet_id = max((ws.id for ws in existing), default=0) + 1
+                self._log('info', f"🔄 Creando hoja: {sheet_name}")
+                self._api('batch_update', self.spreadsheet.batch_update,
+                          {'requests': self._new_sheet_requests(sheet_name, sheet_id, len(rows))})
+                self._api('values_batch_update', self.spreadsheet.values_batch_update, {
+                    'valueInputOption': 'USER_ENTERED',
+                    'data': [{'range': f"{self._quote_sheet_title(sheet_name)}!A1",
+                              'values': [SHEET_HEADERS] + rows}]
+                })
+                self._log('success', f"✅ Hoja '{sheet_name}' creada con {len(rows)} productos")
+            else:
+                sheet_id = worksheet.id
+                changed, added = self._update_worksheet_in_place(worksheet, rows)
+                self._log('success', f"✅ Hoja '{sheet_name}' actualizada: {changed} celdas modificadas, "
+                           f"{added} productos nuevos")
+
+            spreadsheet_url = self._spreadsheet_url()
+            return f"{spreadsheet_url}#gid={sheet_id}"
+
+        except Exception as e:
+            self._log('error', f"❌ Error actualizando hoja: {e}")
+            return None
+
+    def _update_worksheet_in_place(self, worksheet, rows: List[List]):
+        """Diff por product ID entre la hoja existente y las filas nuevas
+
+        Devuelve (celdas_modificadas, productos_agregados). Los productos que ya no
+        aparecen en la búsqueda se conservan tal cual en la hoja.
+        """
+        # Una sola lectura, con fórmulas para poder comparar IMAGE/COSTO_TOTAL
+        existing_values = self._api('get_all_values', worksheet.get_all_values, value_render_option='FORMULA')
+        updates, changed_cells, added, last_row = self._diff_rows(existing_values, rows)
+        if last_row > worksheet.row_count:
+            self._api('add_rows', worksheet.add_rows, last_row - worksheet.row_count)
+        if updates:
+            self._api('batch_update', worksheet.batch_update, updates, value_input_option='USER_ENTERED')
+        return changed_cells, added
+
+    def _diff_rows(self, existing_values: List[List], rows: List[List]):
+        """Celdas a escribir para llevar una hoja (valores leídos con fórmulas) a `rows`
+
+        Devuelve (updates [{'range', 'values'}] sin nombre de hoja, celdas_modificadas,
+        productos_agregados, última fila usada). Las columnas de PRESERVED_COLUMNS no se tocan y
+        las que no figuran en el header de la hoja se omiten.
+        """
+        header = existing_values[0] if existing_values else []
+        if not any(header) or 'LINK_PRODUCTO' not in header:
+            # Hoja vacía o sin columna de producto contra la que comparar: se reescribe entera
+            updates = [{'range': 'A1', 'values': [SHEET_HEADERS] + rows}]
+            return updates, len(rows) * len(SHEET_HEADERS), len(rows), len(rows) + 1
+
+        # Las columnas se ubican por nombre en el header real: la hoja puede tener columnas
+        # agregadas, reordenadas o borradas a mano y no se escribe sobre datos ajenos
+        columns = {}
+        for col, name in enumerate(header):
+            if name in SHEET_HEADERS and name not in columns:
+                columns[name] = col
+        width = len(header)
+        key_col = columns['LINK_PRODUCTO']
+        row_key_col = SHEET_HEADERS.index('LINK_PRODUCTO')
+
+        existing_index = {}
+        for row_number, values in enumerate(existing_values[1:], start=2):
+            key = self._product_key(values[key_col] if len(values) > key_col else '')
+            if key and key not in existing_index:
+                existing_index[key] = (row_number, values)
+
+        def column_letter(name: str) -> str:
+            return self._get_cell_reference(1, columns[name] + 1)[:-1]
+
+        updates = []
+        new_rows = []
+        next_row = len(existing_values) + 1
+        for row in rows:
+            key = self._product_key(row[row_key_col])
+            if key in existing_index:
+                row_number, current = existing_index[key]
+                for name, value in zip(SHEET_HEADERS, row):
+                    if name in PRESERVED_COLUMNS or name not in columns:
+                        continue
+                    col = columns[name]
+                    old_value = current[col] if col < len(current) else ""
+                    if not self._same_cell(old_value, value):
+                        updates.append({'range': self._get_cell_reference(row_number, col + 1),
+                                        'values': [[value]]})
+            else:
+                row_number = next_row + len(new_rows)
+                sheet_row = [""] * width
+                for name, value in zip(SHEET_HEADERS, row):
+                    if name in columns:
+                        sheet_row[columns[name]] = value
+                if all(name in columns for name in ('COSTO_TOTAL', 'VALOR_FINAL', 'CANTIDAD')):
+                    sheet_row[columns['COSTO_TOTAL']] = (f"={column_letter('VALOR_FINAL')}{row_number}"
+                                                         f"*{column_letter('CANTIDAD')}{row_number}")
+                new_rows.append(sheet_row)
+                if key:
+                    existing_index[key] = (row_number, sheet_row)
+
+        last_row = len(existing_values)
+        if new_rows:
+            last_row = next_row + len(new_rows) - 1
+            end_cell = self._get_cell_reference(last_row, width)
+            updates.append({'range': f"A{next_row}:{end_cell}", 'values': new_rows})
+
+        changed_cells = sum(len(u['values']) * len(u['values'][0]) for u in updates if u['values'])
+        return updates, changed_cells, len(new_rows), last_row
+
+    def _product_key(self, url) -> Optional[str]:
+        """Clave estable de producto: product ID de la URL (o la URL si no tiene ID)"""
+        if not url or not isinstance(url, str) or url in ('N/A', 'Link no disponible'):
+            return None
+        return product_id_from_url(url) or url.strip()
+
+    def _same_cell(self, old_value, new_value) -> bool:
+        """Comparar celda leída de Sheets con valor nuevo (números con tolerancia)"""
+        try:
+            return abs(float(old_value) - float(new_value)) < 1e-9
+        except (TypeError, ValueError):
+            return str(old_value).strip() == str(new_value).strip()
+
+    def _sheet_title(self, query_title: str) -> str:
+        """Nombre estable (sin timestamp) de la hoja de una búsqueda"""
+        import re
+        return re.sub(r'[\[\]\*\?/\\:]', '', query_title)[:90]
+
+    def _new_sheet_requests(self, title: str, sheet_id: int, data_rows: int) -> List[Dict]:
+        """Requests de batch_update para crear una hoja de tríada con formato y anchos"""
+        requests_body = [
+            self._add_sheet_request(title, sheet_id, rows=max(100, data_rows + 5), cols=len(SHEET_HEADERS)),
+            self._header_format_request(sheet_id, len(SHEET_HEADERS))
+        ]
+        for col, width in COLUMN_WIDTHS.items():
+            requests_body.append(self._column_width_request(sheet_id, col, width))
+        return requests_body
+
+    def _collect_rows(self, df_data: Optional[pd.DataFrame], triad_data: Dict) -> List[List]:
+        """Filas de datos (tríada primero, luego adicionales) con fórmulas ya incluidas"""
+        rows = []
+        triad_urls = set()
+        for key in TRIAD_KEYS:
+            product = triad_data.get(key)
+            if product is not None:
+                triad_urls.add(product.get('productUrl'))
+                rows.append(self._build_product_row(product, len(rows) + 2))
+
+        if df_data is not None and not df_data.empty:
+            for _, row in df_data.head(min(len(df_data), 15)).iterrows():
+                # Evitar duplicados de la tríada
+                if row.get('productUrl') in triad_urls:
+                    continue
+                rows.append(self._build_product_row(row, len(rows) + 2))
+                # Limitar para no exceder capacidad
+                if len(rows) + 2 >= MAX_SHEET_ROWS:
+                    break
+        return rows
+
+    def _build_product_row(self, product, row_number: int) -> List:
+        """Fila completa A-N para un producto, con fórmulas IMAGE y COSTO_TOTAL"""
+        image_url = product.get('image_link', '')
+        if image_url and isinstance(image_url, str) and image_url.startswith('http'):
+            image_cell = f'=IMAGE("{image_url}"; 4; 100; 100)'
+        else:
+            image_cell = "Sin imagen"
+
+        certifications = product.get('product_certifications', [])
+        if isinstance(certifications, list) and len(certifications) > 0:
+            cert_text = ', '.join(certifications[:3])
+        else:
+            cert_text = "Sin certificaciones"
+
+        supplier_url = product.get('supplier_profile_url', '')
+        if not supplier_url or supplier_url == 'N/A':
+            supplier_url = ""
+
+        return [
+            image_cell,                                                   # A: IMAGEN
+            str(product.get('title', '')),                                # B: PRODUCTO
+            str(product.get('companyName', '')),                          # C: PROVEEDOR
+            "Sí" if product.get('verified_supplier') else "No",           # D: VERIFICADO
+            self._cell_value(product.get('unit_price_norm_usd', 0)),      # E: PRECIO_USD
+            self._cell_value(product.get('landed_est_usd', 0)),           # F: VALOR_FINAL
+            self._cell_value(product.get('moq', 0)),                      # G: CANTIDAD_MINIMA_PEDIDO
+            self._cell_value(product.get('supplier_rating', 0)),          # H: RATING_PROVEEDOR
+            self._cell_value(product.get('supplier_reviews_count', 0)),   # I: REVIEWS_PROVEEDOR
+            cert_text,                                                    # J: CERTIFICACIONES
+            supplier_url,                                                 # K: LINK_PROVEEDOR
+            self._fix_alibaba_link(product.get('productUrl', '')),        # L: LINK_PRODUCTO
+            1,                                                            # M: CANTIDAD
+            f"=F{row_number}*M{row_number}"                               # N: COSTO_TOTAL
+        ]
+
+    def _build_summary_row(self, query: str, title: str, sheet_id: int, rows: List[List], data: Dict) -> List:
+        """Fila de la hoja RESUMEN con link interno a la hoja de la búsqueda"""
+        estadisticas = data.get('estadisticas') or {}
+        triad_data = data.get('triad_data') or {}
+        triad_titles = []
+        for key in TRIAD_KEYS:
+            product = triad_data.get(key)
+            triad_titles.append(str(product.get('title', '')) if product is not None else "")
+        return [
+            query,
+            f'=HYPERLINK("#gid={sheet_id}"; "{title}")',
+            len(rows),
+            self._cell_value(estadisticas.get('precio_promedio', 0)),
+            self._cell_value(estadisticas.get('moq_promedio', 0)),
+            self._cell_value(estadisticas.get('rating_proveedor_promedio', 0)),
+            self._cell_value(estadisticas.get('proveedores_verificados', 0)),
+        ] + triad_titles
+
+    def _cell_value(self, value):
+        """Convertir escalares numpy/NaN a tipos serializables por la API"""
+        if value is None:
+            return ""
+        if hasattr(value, 'item'):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            return ""
+        return value
+
+    def _unique_sheet_title(self, title: str, used_titles: set) -> str:
+        """Título válido para Sheets (sin []*?/\\:) y no usado en el spreadsheet"""
+        base = self._sheet_title(title)
+        candidate = base
+        suffix = 2
+        while candidate in used_titles:
+            candidate = f"{base}_{suffix}"
+            suffix += 1
+        used_titles.add(candidate)
+        return candidate
+
+    def _quote_sheet_title(self, title: str) -> str:
+        """Citar título para notación A1 ('Hoja'!A1)"""
+        return "'" + title.replace("'", "''") + "'"
+
+    def _add_sheet_request(self, title: str, sheet_id: int, rows: int, cols: int) -> Dict:
+        return {'addSheet': {'properties': {
+            'title': title,
+            'sheetId': sheet_id,
+            'gridProperties': {'rowCount': rows, 'columnCount': cols}
+        }}}
+
+    def _header_format_request(self, sheet_id: int, cols: int) -> Dict:
+        return {'repeatCell': {
+            'range': {'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 1,
+                      'startColumnIndex': 0, 'endColumnIndex': cols},
+            'cell': {'userEnteredFormat': {
+                'textFormat': {'bold': True},
+                'backgroundColor': {'red': 0.2, 'green': 0.7, 'blue': 0.9}
+            }},
+            'fields': 'userEnteredFormat(textFormat,backgroundColor)'
+        }}
+
+    def _column_width_request(self, sheet_id: int, col: int, width: int) -> Dict:
+        return {'updateDimensionProperties': {
+            'range': {'sheetId': sheet_id, 'dimension': 'COLUMNS',
+                      'startIndex': col, 'endIndex': col + 1},
+            'properties': {'pixelSize': width},
+            'fields': 'pixelSize'
+        }}
+
+    def _spreadsheet_url(self) -> str:
+        spreadsheet_id = self.spreadsheet_id or get_google_sheets_spreadsheet_id()
+        return f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}"
+
     def _fix_alibaba_link(self, original_url: str) -> str:
         """Arreglar links para que funcionen en formato Alibaba correcto"""
         if not original_url or original_url == 'N/A':
@@ -417,11 +890,19 @@ class GoogleSheetsExporter:
         return original_url
 
 # Función de conveniencia para usar desde el script principal
-def export_to_google_sheets(query_title: str, df_data: pd.DataFrame, triad_data: Dict, estadisticas: Dict = None):
+def export_to_google_sheets(query_title: str, df_data: pd.DataFrame, triad_data: Dict, estadisticas: Dict = None,
+                            update_in_place: bool = False):
     """Función de conveniencia para exportar a Google Sheets"""
     exporter = GoogleSheetsExporter()
+    if update_in_place:
+        return exporter.update_triad_data(query_title, df_data, triad_data)
     return exporter.export_triad_data(query_title, df_data, triad_data, estadisticas)
 
+def export_all_to_google_sheets(queries_data: Dict[str, Dict], update_in_place: bool = False):
+    """Función de conveniencia para exportar todas las búsquedas en una operación"""
+    exporter = GoogleSheetsExporter()
+    return exporter.export_multiple_queries(queries_data, update_in_place=update_in_place)
+
 if __name__ == "__main__":
     print("🧪 Google Sheets Exporter - Prueba")
     print("Este script debe ser importado desde el script principal")
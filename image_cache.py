@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Image Cache - Sourcing Triads
+Proxy local de imágenes de producto: cada URL remota se descarga una sola vez, se guarda
+como miniatura en disco (Pillow) y se sirve a st.image / ImageColumn desde ahí.
+- Espacio acotado con desalojo LRU (por fecha de último acceso)
+- Descargas en un pool de threads acotado; una misma URL no se descarga dos veces en paralelo
+- URLs muertas (404, timeout, no-imagen) se recuerdan con TTL para no reintentarlas en cada rerun
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from instrumentation import span
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_ENV = 'SOURCING_IMAGE_CACHE_DIR'
+DEFAULT_CACHE_DIR = Path("data") / "thumbnails"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+THUMBNAIL_SIZE = (220, 220)
+THUMBNAIL_QUALITY = 80
+FETCH_TIMEOUT = 8
+FETCH_WORKERS = 8
+# Tamaño máximo de la imagen original que se acepta descargar
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+# Tiempo que una URL muerta queda sin reintentar
+DEAD_URL_TTL = 24 * 3600
+DEAD_URLS_FILE = 'dead_urls.json'
+
+
+def _cache_key(url: str) -> str:
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def make_thumbnail(data: bytes, size=THUMBNAIL_SIZE) -> bytes:
+    """Reducir una imagen a JPEG de a lo sumo `size`; sin Pillow se guarda el original"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', size)  # JPEG: decodificar ya reducida (mucho más rápido)
+        image.thumbnail(size)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        out = io.BytesIO()
+        image.save(out, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+class ImageCache:
+    """Miniaturas en disco con LRU + memoria de URLs muertas (seguro entre threads)"""
+
+    def __init__(self, cache_dir=None, max_bytes: int = DEFAULT_MAX_BYTES, max_workers: int = FETCH_WORKERS,
+                 dead_ttl: float = DEAD_URL_TTL, timeout: float = FETCH_TIMEOUT):
+        self.cache_dir = Path(cache_dir or os.getenv(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.dead_ttl = dead_ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-fetch')
+        self._inflight: Dict[str, Future] = {}
+        self._session = None
+        # clave -> bytes en disco, del menos al más recientemente usado
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        self._dead: Dict[str, float] = {}
+        self._load()
+
+    # -------------------------
+    # Estado en disco
+    # -------------------------
+    def _load(self):
+        files = sorted(self.cache_dir.glob('*.jpg'), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+        dead_path = self.cache_dir / DEAD_URLS_FILE
+        if dead_path.exists():
+            try:
+                now = time.time()
+                self._dead = {url: until for url, until in json.loads(dead_path.read_text()).items() if until > now}
+            except (OSError, ValueError):
+                self._dead = {}
+
+    def _save_dead(self):
+        try:
+            tmp = self.cache_dir / (DEAD_URLS_FILE + '.tmp')
+            tmp.write_text(json.dumps(self._dead))
+            tmp.replace(self.cache_dir / DEAD_URLS_FILE)
+        except OSError as e:
+            logger.warning(f"Could not persist dead image URLs: {e}")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.jpg"
+
+    # -------------------------
+    # API
+    # -------------------------
+    def is_dead(self, url: str) -> bool:
+        with self._lock:
+            until = self._dead.get(url)
+            if until is None:
+                return False
+            if until <= time.time():
+                del self._dead[url]
+                return False
+            return True
+
+    def cached_path(self, url: str) -> Optional[str]:
+        """Ruta local de la miniatura si ya está en cache (la marca como usada)"""
+        if not url:
+            return None
+        key = _cache_key(url)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            os.utime(path)  # El mtime es el orden LRU entre reinicios
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+        return str(path)
+
+    def get(self, url: str) -> Optional[str]:
+        """Ruta local de la miniatura, descargándola si hace falta (None si la URL está muerta)"""
+        return self.prefetch([url]).get(url)
+
+    def prefetch(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Resolver varias URLs a la vez: las que faltan se descargan en el pool acotado"""
+        results: Dict[str, Optional[str]] = {}
+        pending: Dict[str, Future] = {}
+        for url in dict.fromkeys(u for u in urls if isinstance(u, str) and u.startswith('http')):
+            path = self.cached_path(url)
+            if path or self.is_dead(url):
+                record_cache('image', True)
+                results[url] = path
+                continue
+            record_cache('image', False)
+            with self._lock:
+                future = self._inflight.get(url)
+                if future is None:
+                    future = self._executor.submit(self._fetch, url)
+                    self._inflight[url] = future
+            pending[url] = future
+        if pending:
+            with span('images.prefetch', urls=len(pending)):
+                for url, future in pending.items():
+                    try:
+                        results[url] = future.result()
+                    except Exception as e:
+                        logger.warning(f"Image fetch failed for {url}: {e}")
+                        results[url] = None
+        return results
+
+    def data_uri(self, url: str) -> Optional[str]:
+        """Miniatura como data URI (para ImageColumn: el navegador no vuelve a pedir la original)"""
+        path = self.cached_path(url)
+        if not path:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii')
+        except OSError:
+            return None  # Desalojada entre medio
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total_bytes,
+                    'max_bytes': self.max_bytes, 'dead_urls': len(self._dead)}
+
+    # -------------------------
+    # Descarga y desalojo
+    # -------------------------
+    def _http(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+                self._session.headers['User-Agent'] = 'Mozilla/5.0 (sourcing-triads thumbnail cache)'
+            return self._session
+
+    def _fetch(self, url: str) -> Optional[str]:
+        key = _cache_key(url)
+        try:
+            with span('images.fetch'):
+                resp = self._http().get(url, timeout=self.timeout, stream=True)
+                try:
+                    content_type = resp.headers.get('Content-Type', '')
+                    if resp.status_code != 200 or not content_type.startswith('image/'):
+                        raise ValueError(f"HTTP {resp.status_code} {content_type or 'sin Content-Type'}")
+                    data = resp.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+                finally:
+                    resp.close()
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise ValueError("imagen demasiado grande")
+                thumbnail = make_thumbnail(data)
+        except Exception as e:
+            logger.info(f"Dead image URL {url}: {e}")
+            with self._lock:
+                self._dead[url] = time.time() + self.dead_ttl
+                self._inflight.pop(url, None)
+                self._save_dead()
+            return None
+
+        path = self._path(key)
+        tmp = path.with_suffix('.tmp')
+        stored = False
+        try:
+            tmp.write_bytes(thumbnail)
+            tmp.replace(path)
+            stored = True
+        except OSError as e:
+            # Disco lleno / permisos: no es una URL muerta, se reintenta en el próximo pedido
+            logger.warning(f"Could not store thumbnail for {url}: {e}")
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                if stored:
+                    self._total_bytes += len(thumbnail) - self._entries.pop(key, 0)
+                    self._entries[key] = len(thumbnail)
+                    self._evict()
+                self._inflight.pop(url, None)
+        return str(path) if stored else None
+
+    def _evict(self):
+        # Llamar con el lock tomado: borrar las menos usadas hasta entrar en el presupuesto
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+
+_cache: Optional[ImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Cache único por proceso (compartido entre sesiones y reruns de Streamlit)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache()
+        return _cache
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Image URL Validator - Sourcing Triads
+Verifica en lote las URLs candidatas de imagen (HEAD con timeout corto) y elige la primera
+viva por producto, en lugar de devolver URLs de alicdn adivinadas sin comprobar.
+- Todas las URLs de una ronda se verifican en paralelo, con un límite de conexiones por host
+- Los resultados se cachean con TTL (vivas y muertas)
+- Ronda 1: primer candidato de cada producto; ronda 2: segundo candidato solo de los que
+  siguen sin imagen; etc. Así no se verifican candidatos que no hacen falta
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from instrumentation import span
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+VALIDATE_ENV = 'SOURCING_VALIDATE_IMAGES'
+HEAD_TIMEOUT = 3
+PER_HOST_LIMIT = 4
+MAX_WORKERS = 16
+# Las URLs vivas cambian poco; las muertas se reintentan antes por si fue un error transitorio
+LIVE_TTL = 6 * 3600
+DEAD_TTL = 3600
+
+
+def validation_enabled() -> bool:
+    return os.getenv(VALIDATE_ENV, '1').lower() not in ('0', 'false', 'no')
+
+
+class ImageURLValidator:
+    """HEAD concurrente con límite por host y cache TTL (seguro entre threads)"""
+
+    def __init__(self, timeout: float = HEAD_TIMEOUT, per_host: int = PER_HOST_LIMIT,
+                 max_workers: int = MAX_WORKERS, live_ttl: float = LIVE_TTL, dead_ttl: float = DEAD_TTL):
+        self.timeout = timeout
+        self.per_host = per_host
+        self.live_ttl = live_ttl
+        self.dead_ttl = dead_ttl
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-head')
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # url -> (viva, vence)
+        self._results: Dict[str, tuple] = {}
+        self._session = None
+
+    def _http(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=32, pool_maxsize=self.per_host)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def cached(self, url: str) -> Optional[bool]:
+        with self._lock:
+            entry = self._results.get(url)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    def _store(self, url: str, live: bool):
+        with self._lock:
+            self._results[url] = (live, time.time() + (self.live_ttl if live else self.dead_ttl))
+
+    def check(self, url: str) -> bool:
+        """¿La URL responde 200 con Content-Type image/*? (HEAD; GET si el servidor no acepta HEAD)"""
+        cached = self.cached(url)
+        if cached is not None:
+            record_cache('image_url', True)
+            return cached
+        record_cache('image_url', False)
+        live = False
+        try:
+            with self._slot(url):
+                session = self._http()
+                resp = session.head(url, timeout=self.timeout, allow_redirects=True)
+                if resp.status_code in (403, 405, 501):
+                    resp = session.get(url, timeout=self.timeout, stream=True)
+                    resp.close()
+                live = resp.status_code == 200 and resp.headers.get('Content-Type', '').startswith('image/')
+        except Exception as e:
+            logger.debug(f"Image URL check failed for {url}: {e}")
+        self._store(url, live)
+        return live
+
+    def validate(self, urls: Iterable[str]) -> Dict[str, bool]:
+        """Verificar varias URLs en paralelo -> {url: viva}"""
+        urls = [u for u in dict.fromkeys(urls) if isinstance(u, str) and u.startswith('http')]
+        return dict(zip(urls, self._executor.map(self.check, urls)))
+
+    def first_live(self, candidates: Sequence[Sequence[str]]) -> List[Optional[str]]:
+        """Primera URL viva de cada lista de candidatos (None si ninguna responde)"""
+        chosen: List[Optional[str]] = [None] * len(candidates)
+        unresolved = [i for i, urls in enumerate(candidates) if urls]
+        depth = 0
+        with span('images.validate', products=len(unresolved)):
+            while unresolved:
+                round_urls = {i: candidates[i][depth] for i in unresolved if depth < len(candidates[i])}
+                if not round_urls:
+                    break
+                live = self.validate(round_urls.values())
+                for i, url in round_urls.items():
+                    if live.get(url):
+                        chosen[i] = url
+                unresolved = [i for i in round_urls if chosen[i] is None]
+                depth += 1
+        return chosen
+
+
+_validator: Optional[ImageURLValidator] = None
+_validator_lock = threading.Lock()
+
+
+def get_image_validator() -> ImageURLValidator:
+    """Validador único por proceso (el cache TTL se comparte entre sesiones)"""
+    global _validator
+    with _validator_lock:
+        if _validator is None:
+            _validator = ImageURLValidator()
+        return _validator
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Instrumentation - Sourcing Triads
+Spans de tiempo livianos (sin servicios externos) para scrape → parse → normalize → triad → export.
+Cada span terminado se emite como una línea JSON (archivo SOURCING_TRACE_FILE o logger DEBUG)
+y queda en un buffer en memoria que la UI resume en el panel de debug.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE_ENV = 'SOURCING_TRACE_FILE'
+MAX_RECENT_SPANS = 5000
+# Atributos de contexto que los spans hijos heredan del padre
+INHERITED_ATTRS = ('query', 'session')
+
+_recent = deque(maxlen=MAX_RECENT_SPANS)
+_local = threading.local()
+_sink_lock = threading.Lock()
+_trace_file: Optional[str] = os.getenv(TRACE_FILE_ENV) or None
+
+
+class Span:
+    """Un tramo de trabajo medido; los hijos heredan trace_id y los atributos 'query' y 'session'
+    (los spans raíz los toman del contexto del thread, ver set_context)"""
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attrs: Optional[Dict] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = dict(attrs or {})
+        if parent:
+            for key in INHERITED_ATTRS:
+                if key in parent.attrs:
+                    self.attrs.setdefault(key, parent.attrs[key])
+        else:
+            for key, value in getattr(_local, 'context', {}).items():
+                self.attrs.setdefault(key, value)
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        """Agregar atributos al span en curso (status, bytes, count, ...)"""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'attrs': self.attrs,
+            'error': self.error,
+        }
+
+
+def _stack() -> List[Span]:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span() -> Optional[Span]:
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Medir un bloque: `with span('parse.cards') as s: ...; s.set(count=n)`"""
+    stack = _stack()
+    current = Span(name, stack[-1] if stack else None, attrs)
+    stack.append(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        stack.pop()
+        _emit(current)
+
+
+def set_context(**attrs):
+    """Atributos por defecto (p.ej. query, session) para los spans raíz de este thread"""
+    _local.context = attrs
+
+
+def clear_context():
+    _local.context = {}
+
+
+def traced(name: str):
+    """Decorador equivalente a envolver toda la función en span(name)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure(trace_file: Optional[str] = None):
+    """Cambiar el archivo JSON lines de salida (None = solo logger DEBUG)"""
+    global _trace_file
+    _trace_file = trace_file
+
+
+def _emit(finished: Span):
+    record = finished.to_dict()
+    _recent.append(record)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    if _trace_file:
+        try:
+            with _sink_lock, open(_trace_file, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write trace file {_trace_file}: {e}")
+    else:
+        logger.debug(line)
+
+
+def recent_spans(query: Optional[str] = None, session: Optional[str] = None) -> List[Dict]:
+    """Spans terminados en este proceso, opcionalmente filtrados por búsqueda y por sesión
+    (el buffer es de todo el proceso: sin `session` incluye los spans de otros usuarios)"""
+    spans = list(_recent)
+    if query is not None:
+        spans = [s for s in spans if s['attrs'].get('query') == query]
+    if session is not None:
+        spans = [s for s in spans if s['attrs'].get('session') == session]
+    return spans
+
+
+def clear_recent():
+    _recent.clear()
+
+
+def summarize(spans: List[Dict]) -> List[Dict]:
+    """Agregar por nombre de span: llamadas, total, promedio, máximo y errores (ms)"""
+    by_name: Dict[str, Dict] = {}
+    for s in spans:
+        entry = by_name.setdefault(s['name'], {'span': s['name'], 'count': 0, 'total_ms': 0.0,
+                                               'max_ms': 0.0, 'errors': 0})
+        duration = s['duration_ms'] or 0.0
+        entry['count'] += 1
+        entry['total_ms'] += duration
+        entry['max_ms'] = max(entry['max_ms'], duration)
+        entry['errors'] += 1 if s['error'] else 0
+    summary = sorted(by_name.values(), key=lambda e: e['total_ms'], reverse=True)
+    for entry in summary:
+        entry['mean_ms'] = entry['total_ms'] / entry['count']
+    return summary
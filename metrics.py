@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Metrics - Sourcing Triads
+Registro de métricas en memoria con exposición en formato de texto Prometheus,
+vía un endpoint HTTP local (SOURCING_METRICS_PORT) o un archivo (SOURCING_METRICS_FILE).
+Cada actualización es un incremento bajo lock: barato para dejarlo siempre activo.
+"""
+
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT_ENV = 'SOURCING_METRICS_PORT'
+METRICS_FILE_ENV = 'SOURCING_METRICS_FILE'
+
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Valor con precisión completa (`:g` corta a 6 dígitos: 12345679 -> 1.23457e+07)"""
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Contador monótono por combinación de labels"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Valor instantáneo (puede subir y bajar)"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos (acumulados al renderizar)"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [conteos por bucket (+Inf al final), suma]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(_label_key(self.labelnames, labels))
+            return sum(state[0]) if state else 0
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = _format_value(bound)
+                    labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Texto en formato de exposición Prometheus (text/plain; version=0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write_to_file(self, path: str):
+        """Sink de archivo (p.ej. para node_exporter textfile collector); escritura atómica"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+# -------------------------
+# Métricas de la aplicación
+# -------------------------
+OXYLABS_REQUEST_SECONDS = REGISTRY.histogram(
+    'oxylabs_request_duration_seconds', 'Latency of Oxylabs realtime requests', ['source'])
+OXYLABS_RESPONSES = REGISTRY.counter(
+    'oxylabs_responses_total', 'Oxylabs responses by HTTP status code', ['status'])
+OXYLABS_RESPONSE_BYTES = REGISTRY.counter(
+    'oxylabs_response_bytes_total', 'Bytes received from Oxylabs')
+CARDS_FOUND = REGISTRY.histogram(
+    'alibaba_cards_per_page', 'Product cards found per page by CARD_SELECTORS entry', ['selector'],
+    buckets=(0, 10, 20, 30, 40, 50, 60, 80, 100))
+PRODUCTS_EXTRACTED = REGISTRY.counter(
+    'alibaba_products_extracted_total', 'Products extracted by extraction path', ['path'])
+PRODUCTS_DROPPED = REGISTRY.counter(
+    'alibaba_products_dropped_total', 'Cards/offers dropped during extraction by reason', ['reason'])
+EXTRACTION_PATH = REGISTRY.counter(
+    'alibaba_extraction_path_total', 'extract_from_html outcome per page (cards, json_fallback, failed)', ['path'])
+OXYLABS_QUEUE_SECONDS = REGISTRY.histogram(
+    'oxylabs_queue_wait_seconds', 'Time waiting for an Oxylabs slot (rate limit / concurrency)',
+    buckets=(0, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+OXYLABS_IN_FLIGHT = REGISTRY.gauge(
+    'oxylabs_requests_in_flight', 'Oxylabs requests currently in flight')
+OXYLABS_BUDGET_REMAINING = REGISTRY.gauge(
+    'oxylabs_daily_budget_remaining', 'Oxylabs requests left in the daily budget (-1 = unlimited)')
+OXYLABS_REJECTED = REGISTRY.counter(
+    'oxylabs_requests_rejected_total', 'Requests refused by the limiter by reason', ['reason'])
+CACHE_REQUESTS = REGISTRY.counter(
+    'sourcing_cache_requests_total', 'Cache lookups by cache name and result (hit/miss)', ['cache', 'result'])
+CACHE_EVICTIONS = REGISTRY.counter(
+    'sourcing_cache_evictions_total', 'Entries evicted from bounded caches by cache name', ['cache'])
+SHEETS_API_CALLS = REGISTRY.counter(
+    'sheets_api_calls_total', 'Google Sheets API calls by operation and outcome', ['operation', 'outcome'])
+SHEETS_API_SECONDS = REGISTRY.histogram(
+    'sheets_api_call_duration_seconds', 'Latency of Google Sheets API calls', ['operation'])
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int, addr: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Servir /metrics en un thread daemon (idempotente por proceso)"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+            thread = threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True)
+            thread.start()
+            logger.info(f"Metrics endpoint listening on http://{addr}:{port}/metrics")
+        return _server
+
+
+def start_from_env():
+    """Levantar el endpoint si SOURCING_METRICS_PORT está definido (no falla si el puerto está ocupado)"""
+    port = os.getenv(METRICS_PORT_ENV)
+    if not port:
+        return None
+    try:
+        return start_http_server(int(port))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not start metrics endpoint on port {port}: {e}")
+        return None
+
+
+def flush_to_file_from_env():
+    """Escribir el snapshot al archivo SOURCING_METRICS_FILE si está definido"""
+    path = os.getenv(METRICS_FILE_ENV)
+    if path:
+        try:
+            REGISTRY.write_to_file(path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {path}: {e}")
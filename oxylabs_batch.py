@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Oxylabs Batch - Sourcing Triads
+Cliente push-pull de Oxylabs para corridas grandes (p.ej. cientos de búsquedas nocturnas):
+en lugar de mantener una conexión abierta por render (realtime), se envían los jobs en lote,
+se consulta su estado con concurrencia acotada y los resultados se pasan por el mismo
+parse_response del scraper.
+
+Endpoints (base configurable con OXYLABS_PUSH_PULL_URL; ver fake_oxylabs.py para probar local):
+    POST {base}/queries/batch          -> {"queries": [{"id": ..., "query": ...}, ...]}
+    GET  {base}/queries/{id}           -> {"status": "pending" | "done" | "faulted", ...}
+    GET  {base}/queries/{id}/results   -> {"results": [{"content": "<html>..."}]}
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import span
+from metrics import OXYLABS_REQUEST_SECONDS, OXYLABS_RESPONSES, OXYLABS_RESPONSE_BYTES
+
+logger = logging.getLogger(__name__)
+
+PUSH_PULL_URL_ENV = 'OXYLABS_PUSH_PULL_URL'
+DEFAULT_PUSH_PULL_URL = "https://data.oxylabs.io/v1"
+# Máximo de búsquedas por POST /queries/batch
+SUBMIT_CHUNK = 1000
+POLL_INTERVAL = 5.0
+POLL_WORKERS = 8
+JOB_TIMEOUT = 30 * 60
+REQUEST_TIMEOUT = 60
+
+DONE = 'done'
+FAULTED = 'faulted'
+
+
+class BatchJobError(RuntimeError):
+    """Un job terminó en 'faulted' o no terminó dentro del timeout"""
+
+
+class OxylabsBatchClient:
+    """Submit en lote + polling/resultados con un pool acotado (seguro entre threads)"""
+
+    def __init__(self, username: str, password: str, base_url: Optional[str] = None,
+                 poll_interval: float = POLL_INTERVAL, max_workers: int = POLL_WORKERS,
+                 job_timeout: float = JOB_TIMEOUT):
+        self.base_url = (base_url or os.getenv(PUSH_PULL_URL_ENV) or DEFAULT_PUSH_PULL_URL).rstrip('/')
+        self.auth = (username, password)
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.job_timeout = job_timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _http(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                self._session.auth = self.auth
+                self._session.mount('http://', HTTPAdapter(pool_maxsize=self.max_workers))
+                self._session.mount('https://', HTTPAdapter(pool_maxsize=self.max_workers))
+            return self._session
+
+    def _request(self, method: str, path: str, source: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = self._http().request(method, f"{self.base_url}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+        except Exception:
+            OXYLABS_RESPONSES.inc(status='error')
+            raise
+        finally:
+            OXYLABS_REQUEST_SECONDS.observe(time.perf_counter() - started, source=source)
+        OXYLABS_RESPONSES.inc(status=resp.status_code)
+        OXYLABS_RESPONSE_BYTES.inc(len(resp.content))
+        resp.raise_for_status()
+        return resp.json()
+
+    # -------------------------
+    # Endpoints
+    # -------------------------
+    def submit(self, queries: List[str], payload: Dict) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """Enviar las búsquedas en lotes -> ({job_id: query}, {query: error de envío})
+        payload: parámetros comunes (source, render, ...) como en el modo realtime.
+        Las búsquedas que no entran en el presupuesto diario no se envían ni figuran en el resultado.
+        Si falla el POST de un lote, su reserva vuelve al presupuesto y sus búsquedas quedan
+        como error; los jobs de los lotes ya enviados se devuelven igual (ya están pagos)."""
+        from rate_limiter import get_oxylabs_limiter
+        limiter = get_oxylabs_limiter()
+        jobs: Dict[str, str] = {}
+        failed: Dict[str, Exception] = {}
+        for start in range(0, len(queries), SUBMIT_CHUNK):
+            chunk = queries[start:start + SUBMIT_CHUNK]
+            # Cada job es un request pago: se descuenta del presupuesto diario antes de enviarlo
+            chunk = chunk[:limiter.reserve(len(chunk))]
+            if not chunk:
+                break
+            try:
+                with span('oxylabs.batch_submit', queries=len(chunk)):
+                    data = self._request('POST', '/queries/batch', 'batch_submit', json={**payload, 'query': chunk})
+            except Exception as e:
+                logger.error(f"Oxylabs batch submit of {len(chunk)} queries failed: {e}")
+                limiter.refund(len(chunk))
+                failed.update((query, e) for query in chunk)
+                continue
+            # La respuesta lista los jobs en el mismo orden que las búsquedas enviadas
+            for query, job in zip(chunk, data.get('queries', [])):
+                jobs[str(job['id'])] = job.get('query') or query
+        logger.info(f"Submitted {len(jobs)} Oxylabs batch jobs")
+        skipped = len(queries) - len(jobs) - len(failed)
+        if skipped > 0:
+            logger.warning(f"Oxylabs daily budget exhausted: {skipped} queries not submitted")
+        return jobs, failed
+
+    def status(self, job_id: str) -> str:
+        return self._request('GET', f"/queries/{job_id}", 'batch_status').get('status', '')
+
+    def results(self, job_id: str) -> Dict:
+        """Resultado del job con la misma forma que la respuesta realtime ({'results': [...]})"""
+        with span('oxylabs.batch_results'):
+            return self._request('GET', f"/queries/{job_id}/results", 'batch_results')
+
+    def wait(self, job_id: str, stop: Optional[threading.Event] = None) -> Dict:
+        """Consultar el estado hasta que el job termine y devolver su resultado
+        stop: al activarse se deja de consultar (BatchJobError) sin esperar al timeout"""
+        stop = stop or threading.Event()
+        deadline = time.monotonic() + self.job_timeout
+        while True:
+            status = self.status(job_id)
+            if status == DONE:
+                return self.results(job_id)
+            if status == FAULTED:
+                raise BatchJobError(f"Oxylabs job {job_id} faulted")
+            if time.monotonic() > deadline:
+                raise BatchJobError(f"Oxylabs job {job_id} still '{status}' after {self.job_timeout:.0f}s")
+            if stop.wait(self.poll_interval):
+                raise BatchJobError(f"Stopped polling Oxylabs job {job_id}")
+
+    def collect(self, jobs: Dict[str, str]) -> Iterator[Tuple[str, Optional[Dict], Optional[Exception]]]:
+        """(query, respuesta, error) a medida que terminan los jobs; a lo sumo max_workers en polling"""
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='oxylabs-poll')
+        futures = {executor.submit(self.wait, job_id, stop): query for job_id, query in jobs.items()}
+        try:
+            for future in as_completed(futures):
+                try:
+                    response_data, error = future.result(), None
+                except Exception as e:
+                    logger.error(f"Batch job for '{futures[future]}' failed: {e}")
+                    response_data, error = None, e
+                yield futures[future], response_data, error
+        finally:
+            # Interrupción o generador abandonado: cancelar los pendientes y cortar el polling
+            # de los que ya están corriendo (si no, siguen hasta job_timeout)
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, queries: List[str], payload: Dict,
+            on_result: Callable[[str, Optional[Dict], Optional[Exception]], None]) -> int:
+        """submit + collect; on_result se llama una vez por búsqueda enviada. Devuelve los jobs enviados"""
+        jobs, failed = self.submit(queries, payload)
+        for query, error in failed.items():
+            on_result(query, None, error)
+        for query, response_data, error in self.collect(jobs):
+            on_result(query, response_data, error)
+        return len(jobs)
+
+
+def client_for(scraper, **kwargs) -> OxylabsBatchClient:
+    """Cliente con las mismas credenciales que el scraper realtime"""
+    return OxylabsBatchClient(scraper.username, scraper.password, **kwargs)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Price Trends - Sourcing Triads
+Analítica sobre el historial de observaciones (product_store): variación y volatilidad
+de precio y velocidad de reviews/ventas por producto dentro de una ventana de tiempo.
+Todo se calcula con operaciones agrupadas de pandas (sin loops por producto).
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+TREND_WINDOW_DAYS = 30
+# Percentil de trend_score a partir del cual un producto se marca como "trending"
+TRENDING_THRESHOLD = 0.75
+# Pesos del trend_score (rankings percentiles entre productos con historial)
+REVIEW_VELOCITY_WEIGHT = 0.4
+SALES_VELOCITY_WEIGHT = 0.4
+PRICE_DROP_WEIGHT = 0.2
+
+TREND_COLUMNS = [
+    'trend_obs', 'first_seen', 'last_seen', 'price_first', 'price_last', 'price_delta',
+    'price_delta_pct', 'price_volatility', 'review_velocity', 'sales_velocity',
+    'trend_score', 'trending',
+]
+
+
+def compute_trends(observations: pd.DataFrame, window_days: Optional[int] = TREND_WINDOW_DAYS,
+                   now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Métricas de tendencia por producto (índice product_id)
+
+    observations: columnas de product_store (product_id, observed_at, price_min, price_max,
+    product_review_count, sold_quantity). Velocidades en unidades por día.
+    """
+    if observations is None or observations.empty:
+        return pd.DataFrame(columns=TREND_COLUMNS, index=pd.Index([], name='product_id'))
+
+    obs = observations[observations['product_id'].notna()].copy()
+    obs['observed_at'] = pd.to_datetime(obs['observed_at'], utc=True)
+    if window_days:
+        end = now if now is not None else obs['observed_at'].max()
+        obs = obs[obs['observed_at'] >= end - pd.Timedelta(days=window_days)]
+
+    obs['price'] = obs['price_max'].fillna(obs['price_min'])
+    obs = obs.sort_values(['product_id', 'observed_at'])
+    grouped = obs.groupby('product_id', sort=False)
+    obs['price_change'] = grouped['price'].pct_change(fill_method=None)
+
+    trends = grouped.agg(
+        trend_obs=('observed_at', 'size'),
+        first_seen=('observed_at', 'first'),
+        last_seen=('observed_at', 'last'),
+        price_first=('price', 'first'),
+        price_last=('price', 'last'),
+        reviews_first=('product_review_count', 'first'),
+        reviews_last=('product_review_count', 'last'),
+        sold_first=('sold_quantity', 'first'),
+        sold_last=('sold_quantity', 'last'),
+    )
+    trends['price_volatility'] = obs.groupby('product_id', sort=False)['price_change'].std()
+
+    days = (trends['last_seen'] - trends['first_seen']).dt.total_seconds() / 86400
+    days = days.where(days > 0)
+    trends['price_delta'] = trends['price_last'] - trends['price_first']
+    trends['price_delta_pct'] = trends['price_delta'] / trends['price_first'].where(trends['price_first'] > 0)
+    trends['review_velocity'] = (trends['reviews_last'] - trends['reviews_first']) / days
+    trends['sales_velocity'] = (trends['sold_last'] - trends['sold_first']) / days
+
+    # Score: solo comparable entre productos con al menos dos observaciones
+    has_history = days.notna()
+    ranked = trends[has_history]
+    score = (
+        REVIEW_VELOCITY_WEIGHT * ranked['review_velocity'].fillna(0).rank(pct=True) +
+        SALES_VELOCITY_WEIGHT * ranked['sales_velocity'].fillna(0).rank(pct=True) +
+        PRICE_DROP_WEIGHT * (-ranked['price_delta_pct'].fillna(0)).rank(pct=True)
+    )
+    trends['trend_score'] = score.reindex(trends.index).fillna(0.0)
+    growing = (trends['review_velocity'].fillna(0) > 0) | (trends['sales_velocity'].fillna(0) > 0)
+    trends['trending'] = has_history & growing & (trends['trend_score'] >= TRENDING_THRESHOLD)
+    return trends[TREND_COLUMNS]
+
+
+def attach_trends(df: pd.DataFrame, trends: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Agregar trend_score/trending/price_delta_pct al DataFrame normalizado (join por product_id)"""
+    df = df.copy()
+    if trends is None or trends.empty or 'product_id' not in df.columns:
+        df['trend_score'] = 0.0
+        df['trending'] = False
+        df['price_delta_pct'] = np.nan
+        return df
+    product_ids = df['product_id'].astype(str)
+    df['trend_score'] = product_ids.map(trends['trend_score']).fillna(0.0).astype(float)
+    df['trending'] = product_ids.map(trends['trending']).fillna(False).astype(bool)
+    df['price_delta_pct'] = product_ids.map(trends['price_delta_pct']).astype(float)
+    return df
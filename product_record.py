@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Product record - Sourcing Triads
+Registro compacto (dataclass con __slots__) para un producto scrapeado.
+Cada valor se guarda una sola vez con su nombre canónico; los nombres del sistema
+anterior (title, product_link, seller_name, minimum_order, ...) son alias de solo lectura.
+Incluye el schema Arrow estable para guardar/leer lotes de productos en Parquet (pyarrow opcional).
+"""
+
+import re
+import sys
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, List, Optional
+
+
+@dataclass(slots=True)
+class Product:
+    product_id: Optional[str] = None
+    product_title: Optional[str] = None
+    product_url: Optional[str] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    moq_value: Optional[float] = None
+    moq_unit: Optional[str] = None
+    sold_quantity: Optional[int] = None
+    product_review_avg: Optional[float] = None
+    product_review_count: Optional[int] = None
+    product_certifications: List[str] = field(default_factory=list)
+    product_cert_icon_urls: List[str] = field(default_factory=list)
+    est_delivery_by: Optional[str] = None
+    has_easy_return: bool = False
+    has_add_to_cart: bool = False
+    has_chat_now: bool = False
+    has_add_to_compare: bool = False
+    has_add_to_favorites: bool = False
+    supplier_name: Optional[str] = None
+    supplier_profile_url: Optional[str] = None
+    supplier_verified: bool = False
+    supplier_gold_level: int = 0
+    supplier_years: Optional[int] = None
+    supplier_country_code: Optional[str] = None
+    # Reviews del PROVEEDOR: nunca se mezclan con las del producto
+    supplier_review_count: Optional[int] = None
+    supplier_review_avg: Optional[float] = None
+    image_link: Optional[str] = None
+
+    # -------------------------
+    # Alias de compatibilidad (solo lectura)
+    # -------------------------
+    @property
+    def title(self):
+        return self.product_title
+
+    @property
+    def product_link(self):
+        return self.product_url
+
+    @property
+    def seller_name(self):
+        return self.supplier_name
+
+    @property
+    def seller_link(self):
+        return self.supplier_profile_url
+
+    @property
+    def minimum_order(self):
+        return self.moq_value
+
+    @property
+    def amount_sold(self):
+        return float(self.sold_quantity) if self.sold_quantity is not None else None
+
+    @property
+    def amount_of_reviews(self):
+        return self.product_review_count
+
+    @property
+    def review_average(self):
+        return self.product_review_avg
+
+    @property
+    def is_supplier_verified(self):
+        return self.supplier_verified
+
+    def intern_fields(self) -> 'Product':
+        """Internar strings categóricos (moneda, unidad, país, proveedor, certificaciones)
+        para que miles de productos compartan el mismo objeto en vez de una copia por tarjeta"""
+        for name in INTERNED_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, str):
+                setattr(self, name, sys.intern(str(value)))
+        if self.product_certifications:
+            self.product_certifications = [sys.intern(str(cert)) for cert in self.product_certifications]
+        return self
+
+    # -------------------------
+    # Acceso estilo dict (para el código que todavía usa product.get(...))
+    # -------------------------
+    def get(self, key: str, default=None):
+        if key in FIELD_NAMES or key in LEGACY_ALIASES:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str):
+        if key in FIELD_NAMES or key in LEGACY_ALIASES:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def items(self):
+        """Pares (campo canónico, valor), sin duplicar los alias"""
+        return ((name, getattr(self, name)) for name in FIELD_NAMES)
+
+    def to_dict(self) -> Dict:
+        """Dict plano con los nombres canónicos (para JSON/CSV/DataFrame)"""
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Product':
+        """Construir desde un dict guardado, aceptando también los nombres del sistema anterior"""
+        if isinstance(data, cls):
+            return data
+        values = {name: data[name] for name in FIELD_NAMES if name in data and not _is_missing(data[name])}
+        for alias, canonical in LEGACY_ALIASES.items():
+            if canonical not in values and not _is_missing(data.get(alias)):
+                values[canonical] = data[alias]
+        if 'image_link' not in values:
+            for key in LEGACY_IMAGE_KEYS:
+                if isinstance(data.get(key), str) and data[key]:
+                    values['image_link'] = data[key]
+                    break
+        for name in INT_FIELDS:
+            if values.get(name) is not None:
+                try:
+                    values[name] = int(float(values[name]))
+                except (TypeError, ValueError):
+                    values[name] = None
+        for name in ('product_certifications', 'product_cert_icon_urls'):
+            if not isinstance(values.get(name, []), list):
+                # Parquet devuelve listas; CSV las aplana a texto y se descartan
+                values[name] = list(values[name]) if hasattr(values[name], 'tolist') else []
+        return cls(**values).intern_fields()
+
+
+def _is_missing(value) -> bool:
+    # CSV → NaN; JSON → None
+    return value is None or (isinstance(value, float) and value != value)
+
+
+FIELD_NAMES = tuple(f.name for f in fields(Product))
+
+# ID de producto de Alibaba dentro de una URL (el scraper, el índice de la app y el diff
+# de Google Sheets tienen que coincidir en qué es "el mismo producto")
+PRODUCT_ID_PATTERN = re.compile(r'(\d{8,})')
+
+
+def product_id_from_url(url) -> Optional[str]:
+    """Product ID de Alibaba contenido en la URL (None si no tiene)"""
+    if not url or not isinstance(url, str):
+        return None
+    match = PRODUCT_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def product_fingerprint(product: 'Product') -> int:
+    """Huella de todos los campos del registro: cambia si cambia precio, proveedor, imagen, ..."""
+    return hash(tuple(tuple(value) if isinstance(value, list) else value
+                      for value in (getattr(product, name) for name in FIELD_NAMES)))
+
+
+# Campos con pocos valores distintos que se repiten en miles de productos
+INTERNED_FIELDS = ('currency', 'moq_unit', 'supplier_country_code', 'supplier_name')
+
+# Campos enteros (CSV los devuelve como float)
+INT_FIELDS = ('sold_quantity', 'product_review_count', 'supplier_gold_level', 'supplier_years',
+              'supplier_review_count')
+
+# nombre anterior -> campo canónico
+LEGACY_ALIASES = {
+    'title': 'product_title',
+    'product_link': 'product_url',
+    'seller_name': 'supplier_name',
+    'seller_link': 'supplier_profile_url',
+    'minimum_order': 'moq_value',
+    'amount_sold': 'sold_quantity',
+    'amount_of_reviews': 'product_review_count',
+    'review_average': 'product_review_avg',
+    'is_supplier_verified': 'supplier_verified',
+}
+
+# Campos de imagen que usaban otros scrapers/archivos viejos
+LEGACY_IMAGE_KEYS = ('product_image', 'image_url', 'thumb_url', 'main_image',
+                     'first_image', 'thumbnail', 'preview_image')
+
+
+# -------------------------
+# Parquet / Arrow
+# -------------------------
+PARQUET_COMPRESSION = 'zstd'
+
+
+def arrow_schema():
+    """Schema estable de un lote de productos (listas reales para certificaciones,
+    diccionario para los campos categóricos)"""
+    import pyarrow as pa
+    category = pa.dictionary(pa.int32(), pa.string())
+    string_list = pa.list_(pa.string())
+    types = {
+        'product_certifications': string_list,
+        'product_cert_icon_urls': string_list,
+        **{name: category for name in INTERNED_FIELDS},
+        **{name: pa.int64() for name in INT_FIELDS},
+    }
+    field_types = {f.name: f.type for f in fields(Product)}
+    for name in FIELD_NAMES:
+        if name not in types:
+            annotation = field_types[name]
+            if annotation is bool:
+                types[name] = pa.bool_()
+            elif annotation == Optional[float]:
+                types[name] = pa.float64()
+            else:
+                types[name] = pa.string()
+    return pa.schema([(name, types[name]) for name in FIELD_NAMES])
+
+
+def to_arrow_table(products: Iterable):
+    """Productos (Product o dicts) -> pyarrow.Table con arrow_schema()"""
+    import pyarrow as pa
+    records = [Product.from_dict(p) for p in products]
+    schema = arrow_schema()
+    columns = {}
+    for name in FIELD_NAMES:
+        values = [getattr(p, name) for p in records]
+        if pa.types.is_floating(schema.field(name).type):
+            values = [_as_float(v) for v in values]
+        columns[name] = values
+    return pa.table(columns, schema=schema)
+
+
+def _as_float(value) -> Optional[float]:
+    # Registros viejos pueden traer precios como texto
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def write_parquet(products: Iterable, path) -> None:
+    import pyarrow.parquet as pq
+    pq.write_table(to_arrow_table(products), str(path), compression=PARQUET_COMPRESSION)
+
+
+def read_parquet(path, columns: Optional[List[str]] = None) -> List[Dict]:
+    """Leer un archivo de productos; `columns` limita la lectura a esas columnas"""
+    import pyarrow.parquet as pq
+    return pq.read_table(str(path), columns=columns).to_pylist()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Product Store - Sourcing Triads
+Historial de productos y precios en SQLite (modo WAL).
+Cada búsqueda agrega una observación por producto en lugar de pisar el JSON de data/,
+así se puede consultar la evolución de precio de un producto o todo lo de un proveedor.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from product_record import Product
+
+logger = logging.getLogger(__name__)
+
+DB_PATH_ENV = 'SOURCING_DB_PATH'
+DEFAULT_DB_PATH = Path("data") / "products.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    query TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    product_id TEXT,
+    product_title TEXT,
+    product_url TEXT,
+    supplier_name TEXT,
+    supplier_profile_url TEXT,
+    supplier_verified INTEGER,
+    price_min REAL,
+    price_max REAL,
+    currency TEXT,
+    moq_value REAL,
+    moq_unit TEXT,
+    product_review_count INTEGER,
+    product_review_avg REAL,
+    sold_quantity INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_observations_product ON observations (product_id, observed_at);
+CREATE INDEX IF NOT EXISTS idx_observations_supplier ON observations (supplier_name, observed_at);
+CREATE INDEX IF NOT EXISTS idx_observations_query ON observations (query, observed_at);
+"""
+
+# Columnas de Product que se guardan en cada observación (mismo nombre en la tabla)
+OBSERVED_FIELDS = (
+    'product_id', 'product_title', 'product_url', 'supplier_name', 'supplier_profile_url',
+    'supplier_verified', 'price_min', 'price_max', 'currency', 'moq_value', 'moq_unit',
+    'product_review_count', 'product_review_avg', 'sold_quantity',
+)
+
+_INSERT_SQL = (
+    f"INSERT INTO observations (query, observed_at, {', '.join(OBSERVED_FIELDS)}) "
+    f"VALUES (?, ?, {', '.join('?' for _ in OBSERVED_FIELDS)})"
+)
+
+
+class ProductStore:
+    """Conexión SQLite compartida entre threads (lecturas y escrituras se serializan con un lock:
+    un objeto sqlite3.Connection no admite cursores concurrentes)"""
+
+    def __init__(self, path=None):
+        self.path = str(path or os.getenv(DB_PATH_ENV) or DEFAULT_DB_PATH)
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def record_observations(self, query: str, products: Iterable, observed_at: Optional[str] = None) -> int:
+        """Insertar una observación por producto (un solo executemany en una transacción)"""
+        observed_at = observed_at or datetime.now(timezone.utc).isoformat(timespec='seconds')
+        rows = []
+        for product in products:
+            product = Product.from_dict(product)
+            values = [getattr(product, name) for name in OBSERVED_FIELDS]
+            rows.append((query, observed_at, *values))
+        if not rows:
+            return 0
+        with self._lock, self.conn:
+            self.conn.executemany(_INSERT_SQL, rows)
+        logger.info(f"Stored {len(rows)} observations for '{query}' in {self.path}")
+        return len(rows)
+
+    def price_trend(self, product_id: str) -> List[Dict]:
+        """Observaciones de un producto en orden cronológico"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT observed_at, query, price_min, price_max, currency, moq_value, "
+                "product_review_count, product_review_avg, sold_quantity "
+                "FROM observations WHERE product_id = ? ORDER BY observed_at",
+                (str(product_id),))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def products_by_supplier(self, supplier_name: str) -> List[Dict]:
+        """Última observación de cada producto de un proveedor"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT o.* FROM observations o "
+                "JOIN (SELECT product_id, MAX(observed_at) AS last_seen FROM observations "
+                "      WHERE supplier_name = ? GROUP BY product_id) latest "
+                "ON o.product_id = latest.product_id AND o.observed_at = latest.last_seen "
+                "WHERE o.supplier_name = ? ORDER BY o.price_max",
+                (supplier_name, supplier_name))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def observations(self, query: Optional[str] = None, since: Optional[str] = None):
+        """Observaciones como DataFrame (opcionalmente de una búsqueda y desde una fecha ISO)"""
+        import pandas as pd
+        sql = "SELECT * FROM observations"
+        clauses, params = [], []
+        if query is not None:
+            clauses.append("query = ?")
+            params.append(query)
+        if since is not None:
+            clauses.append("observed_at >= ?")
+            params.append(since)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return pd.read_sql_query(sql + " ORDER BY observed_at", self.conn, params=params)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_store: Optional[ProductStore] = None
+_store_lock = threading.Lock()
+
+
+def get_product_store() -> ProductStore:
+    """Store único por proceso (sobrevive a los reruns de Streamlit)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProductStore()
+        return _store
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter - Sourcing Triads
+Limitador de uso de Oxylabs compartido por todo el proceso (app, batch, async):
+- Máximo de requests en vuelo (concurrencia del plan)
+- Token bucket de requests por segundo (con ráfaga)
+- Presupuesto diario de requests (persistido en disco para sobrevivir reinicios)
+Los llamadores esperan su turno (backpressure) en lugar de recibir 429; solo el presupuesto
+agotado se rechaza con BudgetExhausted.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Dict, Optional
+
+from metrics import OXYLABS_BUDGET_REMAINING, OXYLABS_IN_FLIGHT, OXYLABS_QUEUE_SECONDS, OXYLABS_REJECTED
+
+logger = logging.getLogger(__name__)
+
+USAGE_FILE_ENV = 'OXYLABS_USAGE_FILE'
+DEFAULT_USAGE_FILE = Path("data") / "oxylabs_usage.json"
+
+
+class BudgetExhausted(RuntimeError):
+    """Se usaron todos los requests del presupuesto diario"""
+
+
+class LimiterTimeout(TimeoutError):
+    """No se obtuvo un turno dentro del timeout pedido"""
+
+
+class RateLimiter:
+    """Concurrencia + token bucket + presupuesto diario (seguro entre threads)"""
+
+    def __init__(self, max_concurrency: int = 5, requests_per_second: float = 2.0, burst: Optional[int] = None,
+                 daily_budget: int = 0, usage_file=None, clock=time.monotonic):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rate = float(requests_per_second)
+        self.burst = float(burst if burst is not None else max(1, self.max_concurrency))
+        self.daily_budget = int(daily_budget)
+        self.usage_file = Path(usage_file) if usage_file else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._tokens = self.burst
+        self._last_refill = clock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._total_wait = 0.0
+        self._acquired = 0
+        self._last_wait = 0.0
+        self._day = date.today().isoformat()
+        self._used_today = 0
+        self._load_usage()
+        OXYLABS_BUDGET_REMAINING.set(self._remaining())
+
+    # -------------------------
+    # Presupuesto diario
+    # -------------------------
+    def _load_usage(self):
+        if self.usage_file is None or not self.usage_file.exists():
+            return
+        try:
+            usage = json.loads(self.usage_file.read_text())
+            if usage.get('day') == self._day:
+                self._used_today = int(usage.get('used', 0))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read Oxylabs usage file {self.usage_file}: {e}")
+
+    def _save_usage(self):
+        # Llamar con el lock tomado
+        if self.usage_file is None:
+            return
+        try:
+            self.usage_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.usage_file.with_suffix('.tmp')
+            tmp.write_text(json.dumps({'day': self._day, 'used': self._used_today}))
+            tmp.replace(self.usage_file)
+        except OSError as e:
+            logger.warning(f"Could not write Oxylabs usage file {self.usage_file}: {e}")
+
+    def _roll_day(self):
+        # Llamar con el lock tomado
+        today = date.today().isoformat()
+        if today != self._day:
+            self._day, self._used_today = today, 0
+
+    def _remaining(self) -> int:
+        return -1 if self.daily_budget <= 0 else max(0, self.daily_budget - self._used_today)
+
+    def remaining_budget(self) -> Optional[int]:
+        """Requests que quedan hoy (None = sin límite)"""
+        with self._lock:
+            self._roll_day()
+            remaining = self._remaining()
+        return None if remaining < 0 else remaining
+
+    # -------------------------
+    # Turnos
+    # -------------------------
+    def _take_token(self) -> float:
+        """Consumir un token si hay; si no, devolver cuántos segundos faltan (con el lock tomado)"""
+        if self.rate <= 0:
+            return 0.0
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Esperar un turno (concurrencia + rate) y descontarlo del presupuesto -> segundos esperados"""
+        started = self._clock()
+        deadline = None if timeout is None else started + timeout
+        with self._lock:
+            self._roll_day()
+            if self._remaining() == 0:
+                OXYLABS_REJECTED.inc(reason='daily_budget')
+                raise BudgetExhausted(f"Oxylabs daily budget of {self.daily_budget} requests exhausted")
+            self._waiting += 1
+        try:
+            if not self._slots.acquire(timeout=None if deadline is None else max(0.0, deadline - self._clock())):
+                OXYLABS_REJECTED.inc(reason='timeout')
+                raise LimiterTimeout("Timed out waiting for an Oxylabs concurrency slot")
+            try:
+                while True:
+                    with self._lock:
+                        wait = self._take_token()
+                        if wait == 0.0:
+                            self._roll_day()
+                            if self._remaining() == 0:
+                                OXYLABS_REJECTED.inc(reason='daily_budget')
+                                raise BudgetExhausted(
+                                    f"Oxylabs daily budget of {self.daily_budget} requests exhausted")
+                            self._used_today += 1
+                            self._in_flight += 1
+                            self._save_usage()
+                            break
+                    if deadline is not None and self._clock() + wait > deadline:
+                        OXYLABS_REJECTED.inc(reason='timeout')
+                        raise LimiterTimeout("Timed out waiting for the Oxylabs rate limit")
+                    time.sleep(wait)
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        waited = self._clock() - started
+        with self._lock:
+            self._acquired += 1
+            self._total_wait += waited
+            self._last_wait = waited
+            OXYLABS_IN_FLIGHT.set(self._in_flight)
+            OXYLABS_BUDGET_REMAINING.set(self._remaining())
+        OXYLABS_QUEUE_SECONDS.observe(waited)
+        return waited
+
+    def reserve(self, count: int) -> int:
+        """Descontar `count` requests del presupuesto sin pedir turno (jobs push-pull, que no
+        mantienen una conexión abierta) -> cuántos se concedieron (puede ser menos que count)"""
+        with self._lock:
+            self._roll_day()
+            remaining = self._remaining()
+            granted = count if remaining < 0 else min(count, remaining)
+            if granted < count:
+                OXYLABS_REJECTED.inc(count - granted, reason='daily_budget')
+            if granted:
+                self._used_today += granted
+                self._save_usage()
+            OXYLABS_BUDGET_REMAINING.set(self._remaining())
+        return granted
+
+    def refund(self, count: int):
+        """Devolver al presupuesto requests reservados que no llegaron a enviarse"""
+        if count <= 0:
+            return
+        with self._lock:
+            self._roll_day()
+            self._used_today = max(0, self._used_today - count)
+            self._save_usage()
+            OXYLABS_BUDGET_REMAINING.set(self._remaining())
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            OXYLABS_IN_FLIGHT.set(self._in_flight)
+        self._slots.release()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """with limiter.slot() as waited: requests.post(...)"""
+        waited = self.acquire(timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._roll_day()
+            remaining = self._remaining()
+            return {
+                'in_flight': self._in_flight, 'waiting': self._waiting,
+                'max_concurrency': self.max_concurrency, 'requests_per_second': self.rate,
+                'requests_total': self._acquired, 'used_today': self._used_today,
+                'daily_budget': self.daily_budget or None,
+                'remaining_budget': None if remaining < 0 else remaining,
+                'avg_wait_s': self._total_wait / self._acquired if self._acquired else 0.0,
+                'last_wait_s': self._last_wait,
+            }
+
+
+def limits_from_config() -> Dict:
+    try:
+        from config import get_oxylabs_limits
+        return get_oxylabs_limits()
+    except ImportError:
+        # Fallback para desarrollo local
+        return {
+            'max_concurrency': int(os.getenv('OXYLABS_MAX_CONCURRENCY', '5')),
+            'requests_per_second': float(os.getenv('OXYLABS_REQUESTS_PER_SECOND', '2')),
+            'daily_budget': int(os.getenv('OXYLABS_DAILY_BUDGET', '0')),
+        }
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_oxylabs_limiter() -> RateLimiter:
+    """Limitador único por proceso (configurado con config.get_oxylabs_limits)"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(**limits_from_config(),
+                                   usage_file=os.getenv(USAGE_FILE_ENV) or DEFAULT_USAGE_FILE)
+        return _limiter
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Session Cache - Sourcing Triads
+Cache de artefactos por sesión de Streamlit con presupuesto de memoria.
+Cada entrada guarda su tamaño estimado (DataFrames con memory_usage(deep=True)); al pasar
+el presupuesto se desalojan primero los artefactos derivados (landed, top-N, tríada, tabla)
+menos usados y recién después los base (DataFrames normalizados), también por LRU.
+Las claves son tuplas (búsqueda, tipo, parámetros...) para poder descartar una búsqueda exacta.
+El presupuesto cubre solo lo guardado acá: los resultados crudos de session_state.search_results
+(no se pueden desalojar sin volver a scrapear) y las filas del ProductIndex (acotadas por
+cantidad en la app) no se cuentan.
+"""
+
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from metrics import CACHE_EVICTIONS
+
+BUDGET_ENV = 'SOURCING_SESSION_CACHE_MB'
+DEFAULT_BUDGET_MB = 256
+
+
+def estimate_size(value: Any) -> int:
+    """Bytes aproximados de un artefacto (DataFrame/Series/ndarray/contenedores)"""
+    if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+        return int(value.memory_usage(deep=True).sum())  # DataFrame
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True))  # Series / Index
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)  # ndarray
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ArtifactCache:
+    """LRU con presupuesto en bytes; las entradas base se desalojan después de las derivadas"""
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        if budget_bytes is None:
+            budget_bytes = int(float(os.getenv(BUDGET_ENV, DEFAULT_BUDGET_MB)) * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        # clave -> (valor, bytes, base)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, base: bool = False) -> Any:
+        """Guardar (o reemplazar) un artefacto y desalojar hasta entrar en el presupuesto"""
+        self.discard(key)
+        size = estimate_size(value)
+        self._entries[key] = (value, size, base)
+        self.total_bytes += size
+        self._evict(keep=key)
+        return value
+
+    def discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def discard_query(self, query: str) -> int:
+        """Eliminar todos los artefactos de una búsqueda (claves (query, ...); coincidencia exacta)"""
+        keys = [key for key in self._entries if isinstance(key, tuple) and key and key[0] == query]
+        for key in keys:
+            self.discard(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _evict(self, keep: Optional[Hashable] = None) -> None:
+        for evict_base in (False, True):
+            if self.total_bytes <= self.budget_bytes:
+                return
+            for key in [k for k, entry in self._entries.items() if entry[2] == evict_base and k != keep]:
+                if self.total_bytes <= self.budget_bytes:
+                    return
+                self.discard(key)
+                self.evictions += 1
+                CACHE_EVICTIONS.inc(cache='session')
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        base = sum(1 for entry in self._entries.values() if entry[2])
+        return {
+            'entries': len(self._entries), 'base_entries': base, 'derived_entries': len(self._entries) - base,
+            'bytes': self.total_bytes, 'budget_bytes': self.budget_bytes, 'hits': self.hits,
+            'misses': self.misses, 'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Shared Cache - Sourcing Triads
+Cache de resultados compartido por todas las sesiones del proceso de Streamlit (y
+opcionalmente en disco), con TTL y clave por búsqueda normalizada. Los cálculos
+concurrentes de la misma clave se coalescen con SingleFlight: N usuarios que buscan lo
+mismo a la vez disparan un solo scrape.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from metrics import CACHE_EVICTIONS, record_cache
+from session_cache import estimate_size
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TTL_ENV = 'SOURCING_SHARED_CACHE_TTL'
+DISK_DIR_ENV = 'SOURCING_SHARED_CACHE_DIR'
+DEFAULT_TTL = 6 * 3600
+MAX_MB_ENV = 'SOURCING_SHARED_CACHE_MB'
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_MB = 512
+
+
+def normalize_query(query: str) -> str:
+    """Misma clave para 'Licuadoras ', 'licuadoras' y 'LICUADORAS'"""
+    return ' '.join(str(query).lower().split())
+
+
+def fingerprint_products(products: Iterable) -> str:
+    """Huella de un lote de productos crudos (para cachear lo que se deriva de ellos)"""
+    digest = hashlib.sha1()
+    for product in products:
+        get = product.get
+        digest.update(f"{get('product_url') or get('product_link')}|{get('price_max') or get('price')}|"
+                      f"{get('supplier_name') or get('seller_name')}|{get('image_link')}\n"
+                      .encode('utf-8', 'replace'))
+    return digest.hexdigest()
+
+
+class SharedCache:
+    """TTL + LRU en memoria (acotado por cantidad de entradas y por bytes estimados),
+    con respaldo opcional en disco (pickle por entrada)"""
+
+    def __init__(self, ttl: Optional[float] = None, disk_dir=None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: Optional[int] = None):
+        self.ttl = float(ttl if ttl is not None else os.getenv(TTL_ENV, DEFAULT_TTL))
+        disk_dir = disk_dir or os.getenv(DISK_DIR_ENV)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv(MAX_MB_ENV, DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # (namespace, clave) -> (valor, guardado, vence)
+        self._entries: 'OrderedDict[Tuple[str, str], tuple]' = OrderedDict()
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self.total_bytes = 0
+        self.flight = SingleFlight()
+
+    # -------------------------
+    # Lectura / escritura
+    # -------------------------
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(valor, antigüedad en segundos) o None si no está o venció"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                if entry[2] > now:
+                    self._entries.move_to_end((namespace, key))
+                    return entry[0], now - entry[1]
+                self._remove((namespace, key))
+        entry = self._read_disk(namespace, key)
+        if entry is None or entry[2] <= now:
+            return None
+        size = estimate_size(entry[0])
+        with self._lock:
+            self._store(namespace, key, entry, size)
+        return entry[0], now - entry[1]
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        entry = (value, now, now + (ttl if ttl is not None else self.ttl))
+        size = estimate_size(value)  # Fuera del lock: memory_usage(deep=True) recorre los objetos
+        with self._lock:
+            self._store(namespace, key, entry, size)
+        self._write_disk(namespace, key, entry)
+
+    def _store(self, namespace: str, key: str, entry: tuple, size: int) -> None:
+        # Llamar con el lock tomado
+        self._remove((namespace, key))
+        self._entries[(namespace, key)] = entry
+        self._sizes[(namespace, key)] = size
+        self.total_bytes += size
+        # La entrada recién guardada no se desaloja aunque sola pase el presupuesto
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                          or self.total_bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            CACHE_EVICTIONS.inc(cache='shared')
+
+    def _remove(self, entry_key: Tuple[str, str]) -> None:
+        # Llamar con el lock tomado
+        if self._entries.pop(entry_key, None) is not None:
+            self.total_bytes -= self._sizes.pop(entry_key, 0)
+
+    def invalidate(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._remove((namespace, key))
+        path = self._disk_path(namespace, key)
+        if path is not None and path.exists():
+            path.unlink(missing_ok=True)
+
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], Any], ttl: Optional[float] = None,
+                       cache_if: Callable[[Any], bool] = bool) -> Tuple[Any, str, float]:
+        """Valor cacheado o calculado una sola vez entre todos los llamadores concurrentes
+        -> (valor, origen, antigüedad); origen: 'cache', 'shared' (esperó al líder) o 'computed'.
+        Solo se guardan los valores que cumplen cache_if (por defecto: no vacíos)."""
+        cached = self.get(namespace, key)
+        record_cache(f"shared_{namespace}", cached is not None)
+        if cached is not None:
+            return cached[0], 'cache', cached[1]
+
+        def compute_and_store():
+            # Otro líder pudo terminar entre el get y el do
+            again = self.get(namespace, key)
+            if again is not None:
+                return again[0]
+            value = compute()
+            if cache_if(value):
+                self.put(namespace, key, value, ttl)
+            return value
+
+        value, shared = self.flight.do((namespace, key), compute_and_store)
+        return value, 'shared' if shared else 'computed', 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            namespaces: Dict[str, int] = {}
+            for namespace, _ in self._entries:
+                namespaces[namespace] = namespaces.get(namespace, 0) + 1
+            return {'entries': len(self._entries), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes,
+                    'by_namespace': namespaces,
+                    'in_flight': self.flight.in_flight(), 'coalesced': self.flight.coalesced,
+                    'disk': str(self.disk_dir) if self.disk_dir else None}
+
+    # -------------------------
+    # Disco (opcional)
+    # -------------------------
+    def _disk_path(self, namespace: str, key: str) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        return self.disk_dir / namespace / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.pkl"
+
+    def _read_disk(self, namespace: str, key: str) -> Optional[tuple]:
+        path = self._disk_path(namespace, key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                stored_key, entry = pickle.load(f)
+            return entry if stored_key == key else None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable shared cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _write_disk(self, namespace: str, key: str, entry: tuple) -> None:
+        path = self._disk_path(namespace, key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp, 'wb') as f:
+                pickle.dump((key, entry), f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(path)
+        except Exception as e:
+            logger.warning(f"Could not write shared cache entry {path}: {e}")
+
+
+_cache: Optional[SharedCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """Cache único por proceso: lo comparten todas las sesiones de Streamlit"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache()
+        return _cache
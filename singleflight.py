@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Single-flight - Sourcing Triads
+Coalescencia de llamadas idénticas concurrentes: mientras hay una llamada en vuelo para
+una clave, las demás esperan ese mismo resultado en lugar de repetir el trabajo
+(p.ej. dos usuarios buscando "licuadoras" a la vez pagan un solo render de Oxylabs).
+Sirve tanto para llamadores con threads (do) como para asyncio (do_async): ambos comparten
+el mismo Future, así un thread y una corrutina que piden lo mismo esperan una sola llamada.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Una llamada en vuelo por clave; los demás llamadores comparten su Future"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """Ejecutar fn (o esperar la ejecución en vuelo) -> (resultado, compartido)
+        Las excepciones del líder se propagan a todos los que esperaban."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """Versión asyncio de do(): fn puede ser una corrutina o una función bloqueante
+        (se corre en un thread para no frenar el event loop)"""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                result = await fn(*args, **kwargs)
+            else:
+                result = await asyncio.to_thread(fn, *args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            # RUNNING: un seguidor asyncio cancelado no puede cancelar la llamada del líder
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            return future, True
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -6,13 +6,23 @@ Solo Google Sheets, código eficiente y limpio
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
 import sys
+import uuid
 from pathlib import Path
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import List, Dict, Optional, Set, Tuple
 from datetime import datetime
-from google_sheets_exporter import export_to_google_sheets
-import requests
+from instrumentation import span, traced, set_context, clear_context
+from metrics import record_cache, start_from_env, flush_to_file_from_env
+from product_record import Product, product_fingerprint, product_id_from_url, read_parquet, write_parquet
+from supplier_index import build_supplier_index, attach_supplier_scores, best_suppliers
+from image_cache import get_image_cache
+from session_cache import ArtifactCache
+from shared_cache import get_shared_cache, normalize_query, fingerprint_products
+from rate_limiter import BudgetExhausted, get_oxylabs_limiter
+from image_validator import get_image_validator, validation_enabled
 
 # Configuración
 st.set_page_config(
@@ -193,9 +203,224 @@ def fix_alibaba_link(original_url: str) -> str:
     # Si no se puede arreglar, devolver el original
     return original_url
 
+def fix_alibaba_links(urls: pd.Series) -> pd.Series:
+    """fix_alibaba_link para una columna entera (operaciones de string vectorizadas);
+    los links no disponibles quedan como string vacío"""
+    urls = urls.fillna('').astype(str)
+    missing = (urls == '') | (urls == 'N/A')
+    canonical = (urls.str.contains('alibaba.com/product-detail/', regex=False) &
+                 urls.str.contains('.html', regex=False))
+    product_ids = urls.str.extract(r'(\d{10,})', expand=False)
+    rebuilt = 'https://www.alibaba.com/product-detail/Product_' + product_ids.fillna('') + '.html?s=p'
+    fixed = np.where(canonical, urls, np.where(product_ids.notna(), rebuilt, urls))
+    return pd.Series(np.where(missing, '', fixed), index=urls.index)
+
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/100x100?text=Sin+Imagen"
+
+DISPLAY_COLUMNS = [
+    '📷 Imagen', '📦 Producto', '🏭 Proveedor', '✅ Verificado',
+    '💰 Precio USD', '💰 Valor Final', '📦 MOQ',
+    '⭐ Rating Proveedor', '📝 Reviews Proveedor', '🏷️ Certificaciones',
+    '🏭 Link Proveedor', '🔗 Link Producto'
+]
+
+
+# Opciones de orden de la tabla -> columna del DataFrame normalizado (se ordena sobre
+# los valores crudos, no sobre el texto formateado)
+TABLE_SORT_OPTIONS = {
+    '💰 Precio USD': 'unit_price_norm_usd',
+    '💰 Valor Final': 'landed_est_usd',
+    '⭐ Rating Proveedor': 'supplier_rating',
+    '📝 Reviews Proveedor': 'supplier_reviews_count',
+    '📦 MOQ': 'moq',
+    '🏭 Proveedor': 'companyName',
+}
+PAGE_SIZES = [25, 50, 100]
+
+
+def table_view_positions(df: pd.DataFrame, search: str = '', sort_by: str = 'unit_price_norm_usd',
+                         ascending: bool = True) -> np.ndarray:
+    """Posiciones (iloc) de las filas que pasan la búsqueda, en el orden pedido"""
+    mask = np.ones(len(df), dtype=bool)
+    search = (search or '').strip()
+    if search:
+        mask = (df['title'].astype(str).str.contains(search, case=False, regex=False) |
+                df['companyName'].astype(str).str.contains(search, case=False, regex=False)).to_numpy()
+    positions = np.flatnonzero(mask)
+    if sort_by in df.columns and len(positions):
+        values = df[sort_by].iloc[positions]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(str)
+        order = values.reset_index(drop=True).sort_values(ascending=ascending, kind='stable',
+                                                           na_position='last').index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def build_display_table(df: pd.DataFrame, image_uris: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Tabla de presentación del Top-N con operaciones por columna (sin apply por fila)
+
+    image_uris: URL original -> miniatura (data URI); las que no están usan el placeholder.
+    """
+    n = len(df)
+    
+    def column(name, default):
+        return df[name] if name in df.columns else pd.Series([default] * n, index=df.index)
+    
+    image_links = column('image_link', '').astype(str)
+    rating = column('supplier_rating', 0).fillna(0).astype(float)
+    reviews = column('supplier_reviews_count', 0).fillna(0).astype(int)
+    certs = column('product_certifications', None)
+    # Listas -> primeras 3 separadas por coma (el accessor .str trabaja sobre listas)
+    cert_text = certs.where(certs.map(lambda c: isinstance(c, list)), None).str[:3].str.join(', ')
+    supplier_urls = column('supplier_profile_url', '').fillna('').astype(str)
+    
+    table = pd.DataFrame({
+        '📷 Imagen': image_links.map(image_uris or {}).fillna(PLACEHOLDER_IMAGE),
+        '📦 Producto': df['title'].astype(str),  # TÍTULO COMPLETO SIN TRUNCAR
+        '🏭 Proveedor': df['companyName'].astype(str),
+        '✅ Verificado': np.where(df['verified_supplier'].fillna(False).astype(bool), '✅ Sí', '❌ No'),
+        '💰 Precio USD': '$' + df['unit_price_norm_usd'].map('{:,.2f}'.format),
+        '💰 Valor Final': '$' + df['landed_est_usd'].map('{:,.2f}'.format),
+        '📦 MOQ': df['moq'].fillna(1).astype(int).map('{:,}'.format),
+        '⭐ Rating Proveedor': np.where(rating > 0, rating.map('{:.1f}/5'.format), 'Sin rating'),
+        '📝 Reviews Proveedor': np.where(reviews > 0, reviews.map('{:,}'.format) + ' reviews', 'Sin reviews'),
+        '🏷️ Certificaciones': cert_text.where(cert_text.fillna('') != '', 'Sin certificaciones'),
+        '🏭 Link Proveedor': supplier_urls.where(supplier_urls != 'N/A', ''),
+        '🔗 Link Producto': fix_alibaba_links(column('productUrl', '')),
+    }, index=df.index)
+    return table[DISPLAY_COLUMNS]
+
+
 # Clase GoogleSheetsManager removida - ahora se usa google_sheets_exporter.py
 
 
+# Filas normalizadas que guarda el ProductIndex de cada sesión
+MAX_INDEXED_ROWS = 5000
+
+
+class ProductIndex:
+    """Índice de deduplicación de la sesión: un producto (por product_id o por URL
+    normalizada con fix_alibaba_link) se normaliza una sola vez aunque aparezca en
+    varias búsquedas, y se registra en cuáles fue visto.
+    Una fila se reutiliza solo si el registro crudo es idéntico (misma huella): un
+    re-scrape con otro precio, proveedor o imagen se vuelve a normalizar. Las filas
+    se desalojan por LRU a partir de max_rows."""
+
+    def __init__(self, max_rows: int = MAX_INDEXED_ROWS):
+        self.max_rows = max_rows
+        # clave -> (huella del registro crudo, fila normalizada), del menos al más usado
+        self.rows: 'OrderedDict[str, Tuple[int, Dict]]' = OrderedDict()
+        self.queries: Dict[str, Set[str]] = {}
+        self.reused = 0
+
+    @staticmethod
+    def key_for(product: Product) -> Optional[str]:
+        if product.product_id:
+            return f"id:{product.product_id}"
+        fixed = fix_alibaba_link(product.product_url or '')
+        if fixed == "Link no disponible":
+            return None
+        product_id = product_id_from_url(fixed)
+        return f"id:{product_id}" if product_id else f"url:{fixed.split('?')[0].lower()}"
+
+    def row_for(self, key: str, fingerprint: int) -> Optional[Dict]:
+        """Fila ya normalizada del mismo registro crudo (None si no está o cambió)"""
+        entry = self.rows.get(key)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        self.rows.move_to_end(key)
+        return entry[1]
+
+    def remember(self, key: str, fingerprint: int, row: Dict) -> None:
+        self.rows[key] = (fingerprint, row)
+        self.rows.move_to_end(key)
+        while len(self.rows) > self.max_rows:
+            self.rows.popitem(last=False)
+
+    def observe(self, query: str, raw_products: List) -> None:
+        """Registrar en qué búsqueda aparece cada producto (sin normalizar)"""
+        for product in raw_products:
+            key = self.key_for(Product.from_dict(product))
+            if key:
+                self.queries.setdefault(key, set()).add(query)
+
+    def discard_query(self, query: str) -> None:
+        """Olvidar una búsqueda re-scrapeada: sus productos que no aparecen en otra se desalojan"""
+        for key, found_in in list(self.queries.items()):
+            found_in.discard(query)
+            if not found_in:
+                del self.queries[key]
+                self.rows.pop(key, None)
+
+    def query_count(self, key: Optional[str]) -> int:
+        """En cuántas búsquedas de la sesión apareció el producto"""
+        return len(self.queries.get(key, ())) if key else 1
+
+    def shared_in(self, query: str) -> int:
+        """Productos de `query` que también aparecen en otras búsquedas"""
+        return sum(1 for found_in in self.queries.values() if query in found_in and len(found_in) > 1)
+
+
+def get_product_index() -> ProductIndex:
+    if 'product_index' not in st.session_state:
+        st.session_state.product_index = ProductIndex()
+    return st.session_state.product_index
+
+
+BUDGET_EXHAUSTED_MESSAGE = ("⛔ Se agotó el presupuesto diario de requests de Oxylabs - "
+                            "probá mañana o usá resultados guardados")
+
+
+def get_artifact_cache() -> ArtifactCache:
+    """Cache de artefactos de la sesión (normalizados, landed, top-N, tríada, tabla).
+    Los resultados crudos (search_results) y el ProductIndex (acotado aparte) no cuentan para su presupuesto."""
+    if 'artifact_cache' not in st.session_state:
+        st.session_state.artifact_cache = ArtifactCache()
+    return st.session_state.artifact_cache
+
+
+def render_oxylabs_usage():
+    """Uso del limitador de Oxylabs (compartido por todas las sesiones) en el sidebar"""
+    stats = get_oxylabs_limiter().stats()
+    with st.sidebar.expander("📡 Uso de Oxylabs", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("En vuelo", f"{stats['in_flight']}/{stats['max_concurrency']}")
+        col2.metric("En cola", stats['waiting'])
+        col1.metric("Espera prom.", f"{stats['avg_wait_s']:.1f}s")
+        if stats['remaining_budget'] is None:
+            col2.metric("Hoy", f"{stats['used_today']} req")
+        else:
+            col2.metric("Restantes hoy", f"{stats['remaining_budget']}/{stats['daily_budget']}")
+        st.caption(f"Límite: {stats['requests_per_second']:g} req/s · {stats['max_concurrency']} en paralelo")
+
+
+def render_cache_stats(artifacts: ArtifactCache):
+    """Uso de memoria del cache de la sesión en el sidebar"""
+    stats = artifacts.stats()
+    with st.sidebar.expander("🧠 Caché de sesión", expanded=False):
+        used_mb = stats['bytes'] / 1024 / 1024
+        budget_mb = stats['budget_bytes'] / 1024 / 1024
+        st.progress(min(used_mb / budget_mb, 1.0) if budget_mb else 0.0,
+                    text=f"{used_mb:,.1f} / {budget_mb:,.0f} MB")
+        st.caption(f"{stats['entries']} artefactos ({stats['base_entries']} base, "
+                   f"{stats['derived_entries']} derivados) · hit rate {stats['hit_rate']:.0%} · "
+                   f"{stats['evictions']} desalojados")
+        st.caption(f"Sin contar {len(st.session_state.get('search_results', {}))} resultados crudos "
+                   "ni el índice de productos (fuera del presupuesto)")
+        shared = get_shared_cache().stats()
+        st.caption(f"🌐 Compartido entre sesiones: {shared['entries']} resultados "
+                   f"({shared['bytes'] / 1024 / 1024:,.1f} / {shared['max_bytes'] / 1024 / 1024:,.0f} MB) · "
+                   f"{shared['coalesced']} búsquedas coalescidas · {shared['in_flight']} en curso")
+
+# Columnas con pocos valores distintos: se guardan como Categorical (menos memoria, groupby/filtros más rápidos)
+CATEGORICAL_COLUMNS = ['currency', 'moq_unit', 'supplier_country', 'companyName']
+
+# Peso de la señal de tendencia histórica (price_trends) en los scores de la tríada
+TREND_SCORE_WEIGHT = 0.1
+
+
 class SourcingAnalyzer:
     def __init__(self):
         self.data_path = Path("data")
@@ -221,21 +446,34 @@ class SourcingAnalyzer:
                 self.scraper = None
                 print("❌ No se pudo cargar ningún scraper")
         
-    def load_scraper_data(self, query: str) -> Optional[List[Dict]]:
-        """Cargar datos desde JSON o CSV"""
+    def load_scraper_data(self, query: str, columns: Optional[List[str]] = None) -> Optional[List[Dict]]:
+        """Cargar datos desde Parquet, JSON o CSV (columns: leer solo esas columnas)"""
+        parquet_file = self.data_path / f"{query}.parquet"
         json_file = self.data_path / f"{query}.json"
         csv_file = self.data_path / f"{query}.csv"
         
+        if parquet_file.exists():
+            try:
+                return read_parquet(parquet_file, columns=columns)
+            except ImportError:
+                pass  # Sin pyarrow: probar JSON/CSV
+            except Exception as e:
+                st.error(f"Error leyendo Parquet: {e}")
+        
         if json_file.exists():
             try:
                 with open(json_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    records = json.load(f)
+                if columns:
+                    records = [{col: record.get(col) for col in columns} for record in records]
+                return records
             except Exception as e:
                 st.error(f"Error leyendo JSON: {e}")
                 
         if csv_file.exists():
             try:
-                df = pd.read_csv(csv_file, encoding='utf-8')
+                df = pd.read_csv(csv_file, encoding='utf-8',
+                                 usecols=(lambda col: col in columns) if columns else None)
                 # Si hay columnas de precios, normalizarlas
                 price_columns = ['price', 'unit_price', 'unit_price_norm_usd', 'precio']
                 for col in price_columns:
@@ -248,33 +486,70 @@ class SourcingAnalyzer:
                 
         return None
         
-    def search_products_direct(self, query: str) -> Optional[List[Dict]]:
-        """Buscar productos directamente usando el scraper"""
+    def search_products_direct(self, query: str, refresh: bool = False) -> Optional[List[Dict]]:
+        """Buscar productos directamente usando el scraper
+        
+        Los resultados se comparten entre sesiones (cache del proceso con TTL) y las búsquedas
+        idénticas simultáneas esperan al mismo scrape. refresh=True ignora el cache.
+        """
         if not self.scraper:
             st.error("❌ Scraper no disponible")
             return None
             
+        shared = get_shared_cache()
+        shared_key = normalize_query(query)
+        if refresh:
+            shared.invalidate('scrape', shared_key)
         st.info(f"🔍 Buscando '{query}' en Alibaba...")
-        with st.spinner("Scrapeando productos..."):
+        with st.spinner("Scrapeando productos..."), span('scrape.search_products_direct', query=query):
             try:
-                products = self.scraper.search_products(query)
-                if products:
-                    # Guardar datos en caché
-                    try:
-                        filename = self.data_path / f"{query}.json"
-                        with open(filename, 'w', encoding='utf-8') as f:
-                            json.dump(products, f, indent=2, ensure_ascii=False)
-                        st.success(f"✅ Encontrados {len(products)} productos (guardado en caché)")
-                    except Exception as e:
-                        st.warning(f"⚠️ No se pudo guardar caché: {e}")
-                        st.success(f"✅ Encontrados {len(products)} productos")
-                    return products
+                products, source, age = shared.get_or_compute(
+                    'scrape', shared_key, lambda: self._scrape_and_persist(query))
+                if products and source == 'cache':
+                    st.success(f"♻️ {len(products)} productos de una búsqueda reciente "
+                               f"(hace {age / 60:.0f} min, sin costo de Oxylabs)")
+                elif products and source == 'shared':
+                    st.success(f"♻️ {len(products)} productos de la misma búsqueda en curso de otro usuario")
+                return products or None
+            except BudgetExhausted:
+                # Otra sesión/worker gastó el último request mientras esperábamos turno
+                st.error(BUDGET_EXHAUSTED_MESSAGE)
             except Exception as e:
                 st.error(f"❌ Error durante scraping: {e}")
         return None
+    
+    def _scrape_and_persist(self, query: str) -> Optional[List[Dict]]:
+        """Scrape real + caché en data/ + historial de precios (lo ejecuta un solo llamador)"""
+        if get_oxylabs_limiter().remaining_budget() == 0:
+            st.error(BUDGET_EXHAUSTED_MESSAGE)
+            return None
+        products = self.scraper.search_products(query)
+        if products:
+            # Guardar datos en caché (Parquet si hay pyarrow, si no JSON)
+            try:
+                try:
+                    write_parquet(products, self.data_path / f"{query}.parquet")
+                except ImportError:
+                    filename = self.data_path / f"{query}.json"
+                    with open(filename, 'w', encoding='utf-8') as f:
+                        json.dump([Product.from_dict(p).to_dict() for p in products], f, indent=2, ensure_ascii=False)
+                st.success(f"✅ Encontrados {len(products)} productos (guardado en caché)")
+            except Exception as e:
+                st.warning(f"⚠️ No se pudo guardar caché: {e}")
+                st.success(f"✅ Encontrados {len(products)} productos")
+            # Historial de precios: una observación por producto y búsqueda
+            try:
+                from product_store import get_product_store
+                with span('store.record_observations', query=query):
+                    get_product_store().record_observations(query, products)
+            except Exception as e:
+                st.warning(f"⚠️ No se pudo guardar el historial de precios: {e}")
+        return products
         
-    def _extract_product_image(self, product: Dict) -> str:
-        """Extraer imagen del producto desde diferentes fuentes posibles - MEJORADO"""
+    def _image_candidates(self, product: Dict) -> List[str]:
+        """URLs de imagen posibles en orden de preferencia: primero las que vinieron del
+        scraper y después las construidas desde product_id/título (sin verificar)"""
+        candidates = []
         # Intentar desde diferentes campos de imagen
         image_sources = [
             'image_link', 'product_image', 'image_url', 'thumb_url', 'main_image',
@@ -293,65 +568,122 @@ class SourcingAnalyzer:
                 
                 # Validar que sea una URL de imagen válida
                 if img_url.startswith('http') and not 'placeholder' in img_url.lower() and not 'data:' in img_url:
-                    return img_url
+                    candidates.append(img_url)
         
-        # MÉTODO MEJORADO: Construir URL desde product_id con múltiples patrones
+        # Construir URL desde product_id con múltiples patrones de Alibaba
         product_id = product.get('product_id')
         if product_id:
-            # Probar diferentes patrones de URL de Alibaba
-            url_patterns = [
+            candidates += [
                 f"https://s.alicdn.com/@sc04/kf/H{product_id}_220x220.jpg",
                 f"https://s.alicdn.com/@sc01/kf/H{product_id}.jpg",
                 f"https://sc01.alicdn.com/kf/H{product_id}.jpg",
                 f"https://sc04.alicdn.com/kf/H{product_id}_220x220.jpg"
             ]
-            # Devolver el primer patrón (el más común)
-            return url_patterns[0]
         
-        # NUEVO: Intentar construir desde título del producto
+        # Último recurso: hash del título del producto
         title = product.get('product_title', '')
         if title:
-            # Hash simple del título para generar URL consistente
             import hashlib
             title_hash = hashlib.md5(title.encode()).hexdigest()[:8]
-            return f"https://s.alicdn.com/@sc04/kf/H{title_hash}_220x220.jpg"
+            candidates.append(f"https://s.alicdn.com/@sc04/kf/H{title_hash}_220x220.jpg")
         
-        return ''  # Sin imagen
+        return list(dict.fromkeys(candidates))
+    
+    def _extract_product_image(self, product: Dict) -> str:
+        """Primera imagen candidata sin verificar (ver resolve_images para la versión validada)"""
+        candidates = self._image_candidates(product)
+        return candidates[0] if candidates else ''  # Sin imagen
+    
+    def resolve_images(self, candidates: List[List[str]]) -> List[str]:
+        """Primera URL viva de cada producto (HEAD concurrente con cache TTL);
+        con SOURCING_VALIDATE_IMAGES=0 se usa el primer candidato sin verificar"""
+        if not validation_enabled():
+            return [urls[0] if urls else '' for urls in candidates]
+        return [url or '' for url in get_image_validator().first_live(candidates)]
+
+    def resolve_row_images(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """Copia de `rows` con image_link validado: solo para las filas que se muestran
+        (página visible de la tabla), no para todo el resultado normalizado"""
+        if 'image_candidates' not in rows.columns or len(rows) == 0:
+            return rows
+        candidates = [list(urls) if isinstance(urls, (list, tuple)) else [] for urls in rows['image_candidates']]
+        return rows.assign(image_link=self.resolve_images(candidates))
+
+    def resolve_triad_images(self, triad: Dict) -> Dict:
+        """Tríada con image_link validado (copias: las filas vienen de DataFrames compartidos)"""
+        keys = [key for key, product in triad.items() if product is not None]
+        candidates = [list(triad[key].get('image_candidates') or ()) for key in keys]
+        resolved = dict(triad)
+        for key, image_link in zip(keys, self.resolve_images(candidates)):
+            resolved[key] = triad[key].copy()
+            resolved[key]['image_link'] = image_link
+        return resolved
 
-    def normalize_data(self, raw_products: List[Dict], fx_usd_ars: float = 0) -> pd.DataFrame:
-        """Normalizar datos del scraper mejorado con nuevos campos"""
+    @traced('analyze.normalize_data')
+    def normalize_data(self, raw_products: List[Dict], fx_usd_ars: float = 0,
+                       index: Optional[ProductIndex] = None, query: Optional[str] = None) -> pd.DataFrame:
+        """Normalizar datos del scraper mejorado con nuevos campos
+        
+        index: si se pasa, las filas ya normalizadas en otra búsqueda a partir del mismo
+        registro crudo se reutilizan (precio, candidatos de imagen y certificaciones se resuelven una vez
+        por producto único).
+        """
         normalized = []
         
         for product in raw_products:
+            # Datos en caché (JSON/CSV) llegan como dict: convertir al registro canónico
+            product = Product.from_dict(product)
+            
+            dedup_key = ProductIndex.key_for(product)
+            fingerprint = product_fingerprint(product) if index is not None and dedup_key else None
+            if fingerprint is not None:
+                if query:
+                    index.queries.setdefault(dedup_key, set()).add(query)
+                reused = index.row_for(dedup_key, fingerprint)
+                if reused is not None:
+                    index.reused += 1
+                    normalized.append(reused)
+                    continue
+            
             # Normalizar precio - usar nuevos campos si están disponibles
-            raw_price = (product.get('price_max') or product.get('price') or 0)
+            raw_price = (product.price_max or product.price or 0)
             normalized_price = normalize_price(raw_price)
             
-            # Mapear campos usando nuevos campos del scraper mejorado - DEFENSIVO
+            candidates = self._image_candidates(product)
+            
+            # Mapear campos canónicos del registro Product - DEFENSIVO
             mapped = {
-                'title': product.get('product_title') or product.get('title', ''),
-                'productUrl': product.get('product_url') or product.get('product_link', ''),
-                'companyName': product.get('supplier_name') or product.get('seller_name', ''),
+                'product_id': product.product_id,
+                'title': product.product_title or '',
+                'productUrl': product.product_url or '',
+                'companyName': product.supplier_name or '',
                 'unit_price_norm_usd': normalized_price,
-                'currency': product.get('currency', 'USD'),
-                'moq': product.get('moq_value') or product.get('minimum_order', 1),
-                'verified_supplier': product.get('supplier_verified') or product.get('is_supplier_verified', False),
-                'supplier_rating': product.get('product_review_avg') or product.get('review_average', 0),  # RATING DEL PROVEEDOR
-                'supplier_reviews_count': product.get('product_review_count') or product.get('amount_of_reviews', 0),  # REVIEWS DEL PROVEEDOR
-                'image_link': self._extract_product_image(product),  # EXTRAER IMAGEN CORRECTAMENTE
-                'amount_sold': product.get('sold_quantity') or product.get('amount_sold', 0),
+                'currency': product.currency or 'USD',
+                'moq': product.moq_value or 1,
+                'verified_supplier': product.supplier_verified,
+                'supplier_rating': product.product_review_avg or 0,  # RATING DEL PROVEEDOR
+                'supplier_reviews_count': product.product_review_count or 0,  # REVIEWS DEL PROVEEDOR
+                # Sin verificar: se validan solo las filas que se muestran (resolve_row_images)
+                'image_link': candidates[0] if candidates else '',
+                'image_candidates': tuple(candidates),
+                'amount_sold': product.sold_quantity or 0,
                 # Nuevos campos adicionales - DEFENSIVOS
-                'price_min': product.get('price_min', normalized_price),
-                'price_max': product.get('price_max', normalized_price),
-                'moq_unit': product.get('moq_unit', 'piece'),
-                'supplier_gold_level': product.get('supplier_gold_level', 0),
-                'supplier_years': product.get('supplier_years', 0),
-                'supplier_country': product.get('supplier_country_code', ''),
-                'product_certifications': product.get('product_certifications', []),
-                'est_delivery': product.get('est_delivery_by', ''),
+                'price_min': product.price_min if product.price_min is not None else normalized_price,
+                'price_max': product.price_max if product.price_max is not None else normalized_price,
+                'moq_unit': product.moq_unit or 'piece',
+                'supplier_gold_level': product.supplier_gold_level,
+                'supplier_years': product.supplier_years or 0,
+                'supplier_country': product.supplier_country_code or '',
+                'product_certifications': product.product_certifications,
+                'est_delivery': product.est_delivery_by or '',
                 # CAMPOS ADICIONALES QUE PUEDEN EXISTIR O NO
-                'supplier_profile_url': product.get('supplier_profile_url') or product.get('seller_link', ''),
+                'supplier_profile_url': product.supplier_profile_url or '',
+                # Score de certificaciones (no depende de la búsqueda): se calcula una vez
+                'cert_score': min(len(product.product_certifications) / 3.0, 1.0),
+                'dedup_key': dedup_key,
             }
+            if fingerprint is not None:
+                index.remember(dedup_key, fingerprint, mapped)
             normalized.append(mapped)
             
         df = pd.DataFrame(normalized)
@@ -367,6 +699,9 @@ class SourcingAnalyzer:
         df['productUrl'] = df['productUrl'].fillna('')  # Manejar URLs faltantes
         df['image_link'] = df['image_link'].fillna('')  # Manejar imágenes faltantes
         
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        
         return df
         
     def calculate_landed_price(self, df: pd.DataFrame, multiplier: float = 3.0, fx_usd_ars: float = 0) -> pd.DataFrame:
@@ -379,10 +714,35 @@ class SourcingAnalyzer:
             
         return df
         
-    def calculate_triad(self, df: pd.DataFrame, min_reviews: int = 5) -> Dict:
-        """Calcular tríada: Cheapest, Best Quality, Best Value - MEJORADO CON EVALUACIÓN DE PROVEEDOR"""
+    @traced('analyze.price_trends')
+    def load_price_trends(self, query: str) -> Optional[pd.DataFrame]:
+        """Tendencias de la búsqueda desde el historial de product_store (None si no hay historial)"""
+        try:
+            from product_store import get_product_store
+            from price_trends import compute_trends
+            trends = compute_trends(get_product_store().observations(query))
+        except Exception as e:
+            print(f"⚠️ No se pudieron calcular tendencias: {e}")
+            return None
+        return trends if (trends['trend_obs'] > 1).any() else None
+
+    @traced('analyze.calculate_triad')
+    def calculate_triad(self, df: pd.DataFrame, min_reviews: int = 5, trends: Optional[pd.DataFrame] = None) -> Dict:
+        """Calcular tríada: Cheapest, Best Quality, Best Value - MEJORADO CON EVALUACIÓN DE PROVEEDOR
+        
+        trends: salida de price_trends.compute_trends; si se pasa, la señal de tendencia
+        (reviews/ventas en alza, precio en baja) suma a los scores de calidad y valor.
+        """
         if len(df) == 0:
             return {'cheapest': None, 'best_quality': None, 'best_value': None}
+        
+        if trends is not None:
+            from price_trends import attach_trends
+            df = attach_trends(df, trends)
+        
+        # Score de proveedor: una vez por proveedor (supplier_index) y join a las filas
+        if 'supplier_score' not in df.columns:
+            df = attach_supplier_scores(df)
             
         used_indices = set()
         
@@ -398,29 +758,15 @@ class SourcingAnalyzer:
         # BEST QUALITY - MEJORADO: Evaluar calidad del proveedor, no solo reviews del producto
         df_quality = df.copy()
         
-        # Score de calidad del proveedor - USANDO RATING REAL DEL PROVEEDOR
-        supplier_scores = df_quality['verified_supplier'].astype(int) * 0.2  # Verificación
-        supplier_scores += (df_quality['supplier_rating'].fillna(0) / 5.0) * 0.5  # RATING REAL DEL PROVEEDOR (0-5)
-        
-        # Reviews del proveedor (cantidad)
-        if df_quality['supplier_reviews_count'].max() > 0:
-            supplier_scores += (df_quality['supplier_reviews_count'].fillna(0) / df_quality['supplier_reviews_count'].max()) * 0.3
-        
-        # Agregar años de experiencia si está disponible
-        if 'supplier_years' in df_quality.columns:
-            supplier_scores += (df_quality['supplier_years'].fillna(0) / 20.0).clip(0, 1) * 0.2
-            
-        # Agregar cantidad vendida si está disponible  
-        if 'amount_sold' in df_quality.columns and df_quality['amount_sold'].max() > 0:
-            supplier_scores += (df_quality['amount_sold'].fillna(0) / df_quality['amount_sold'].max()) * 0.1
-            
-        df_quality['supplier_score'] = supplier_scores
+        # Score de calidad del proveedor - precalculado por proveedor (verificación, rating, reviews, años, vendidos)
         
         # Score del producto - SOLO CERTIFICACIONES (no hay reviews del producto, solo del proveedor)
         df_quality['product_score'] = 0.0  # Inicializar en 0
         
         # Score de certificaciones - DEFENSIVO
-        if 'product_certifications' in df_quality.columns:
+        if 'cert_score' in df_quality.columns:
+            df_quality['cert_score'] = df_quality['cert_score'].fillna(0)  # Precalculado en normalize_data
+        elif 'product_certifications' in df_quality.columns:
             df_quality['cert_score'] = df_quality['product_certifications'].apply(
                 lambda x: min(len(x) / 3.0, 1.0) if isinstance(x, list) else 0
             )
@@ -433,6 +779,8 @@ class SourcingAnalyzer:
             0.3 * df_quality['product_score'] +
             0.1 * df_quality['cert_score']
         )
+        if 'trend_score' in df_quality.columns:
+            df_quality['total_quality_score'] += TREND_SCORE_WEIGHT * df_quality['trend_score']
         
         quality_candidates = df_quality.nlargest(len(df_quality), 'total_quality_score')
         best_quality = None
@@ -454,25 +802,13 @@ class SourcingAnalyzer:
         else:
             df_value['price_score'] = 1.0
         
-        # RATING REAL DEL PROVEEDOR para BEST VALUE
-        supplier_scores_value = df_value['verified_supplier'].astype(int) * 0.2  # Verificación
-        supplier_scores_value += (df_value['supplier_rating'].fillna(0) / 5.0) * 0.5  # RATING REAL DEL PROVEEDOR (0-5)
-        
-        # Reviews del proveedor
-        if df_value['supplier_reviews_count'].max() > 0:
-            supplier_scores_value += (df_value['supplier_reviews_count'].fillna(0) / df_value['supplier_reviews_count'].max()) * 0.3
-        
-        # Agregar campos opcionales si están disponibles
-        if 'supplier_years' in df_value.columns:
-            supplier_scores_value += (df_value['supplier_years'].fillna(0) / 20.0).clip(0, 1) * 0.2
-        if 'amount_sold' in df_value.columns and df_value['amount_sold'].max() > 0:
-            supplier_scores_value += (df_value['amount_sold'].fillna(0) / df_value['amount_sold'].max()) * 0.1
-            
-        df_value['supplier_score'] = supplier_scores_value
+        # RATING REAL DEL PROVEEDOR para BEST VALUE: mismo supplier_score precalculado
         
         df_value['product_quality_score'] = 0.0  # Sin reviews del producto, solo del proveedor
         
-        if 'product_certifications' in df_value.columns:
+        if 'cert_score' in df_value.columns:
+            df_value['cert_score'] = df_value['cert_score'].fillna(0)  # Precalculado en normalize_data
+        elif 'product_certifications' in df_value.columns:
             df_value['cert_score'] = df_value['product_certifications'].apply(
                 lambda x: min(len(x) / 3.0, 1.0) if isinstance(x, list) else 0
             )
@@ -486,6 +822,8 @@ class SourcingAnalyzer:
             0.15 * df_value['product_quality_score'] +
             0.05 * df_value['cert_score']
         )
+        if 'trend_score' in df_value.columns:
+            df_value['value_score'] += TREND_SCORE_WEIGHT * df_value['trend_score']
         
         value_candidates = df_value.nlargest(len(df_value), 'value_score')
         best_value = None
@@ -500,10 +838,71 @@ class SourcingAnalyzer:
             'best_value': best_value
         }
 
+def render_export_job(job_id: str, link_text: str):
+    """Mostrar estado de una exportación en segundo plano con su log de progreso"""
+    from export_jobs import get_export_manager, ExportJob
+    job = get_export_manager().get(job_id)
+    if job is None:
+        return
+    
+    if not job.finished:
+        last_event = job.last_event
+        st.info(f"⏳ Exportando '{job.label}' a Google Sheets... "
+                f"{last_event['message'] if last_event else ''}")
+        st.button("🔄 Actualizar estado", key=f"refresh_{job.id}")
+    elif job.status == ExportJob.DONE:
+        # Globos solo la primera vez que se muestra el resultado
+        if not st.session_state.get(f"celebrated_{job.id}"):
+            st.balloons()
+            st.session_state[f"celebrated_{job.id}"] = True
+        st.success("✅ ¡Datos exportados exitosamente a Google Sheets!")
+        st.markdown(f"🔗 **[{link_text}]({job.url})**", unsafe_allow_html=True)
+    else:
+        st.error(f"❌ Error durante la exportación a Google Sheets: {job.error or ''}")
+    
+    events = job.events
+    if events:
+        with st.expander(f"📜 Log de exportación ({len(events)} eventos)", expanded=False):
+            icons = {'info': 'ℹ️', 'success': '✅', 'warning': '⚠️', 'error': '❌'}
+            for event in events:
+                st.text(f"{event['time']} {icons.get(event['level'], '')} {event['message']}")
+
+def render_debug_panel(queries: List[str], session_id: Optional[str] = None):
+    """Panel de debug en el sidebar: dónde se van los segundos de cada búsqueda (de esta sesión)"""
+    from instrumentation import recent_spans, summarize
+    with st.sidebar:
+        with st.expander("🛠️ Debug: tiempos por etapa", expanded=False):
+            for query in queries:
+                summary = summarize(recent_spans(query, session=session_id))
+                if not summary:
+                    continue
+                st.markdown(f"**{query}**")
+                summary_df = pd.DataFrame(summary)[['span', 'count', 'total_ms', 'mean_ms', 'max_ms', 'errors']]
+                st.dataframe(summary_df.round(1), use_container_width=True, hide_index=True)
+
+def check_google_sheets() -> Dict:
+    """Probar las credenciales de Google Sheets: {'enabled', 'messages', 'error'}"""
+    try:
+        from google_sheets_exporter import GoogleSheetsExporter
+        exporter = GoogleSheetsExporter()
+        enabled = exporter.initialize_client()
+        return {'enabled': bool(enabled), 'messages': [event['message'] for event in exporter.events],
+                'error': None}
+    except Exception as e:
+        return {'enabled': False, 'messages': [], 'error': str(e)}
+
+
 def main_streamlit():
+    start_from_env()
     # Inicializar session_state para persistir datos
     if 'search_results' not in st.session_state:
         st.session_state.search_results = {}
+    # Identifica los spans de esta sesión en el buffer del proceso (panel de debug)
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:12]
+    if 'export_jobs' not in st.session_state:
+        st.session_state.export_jobs = {}
+    product_index = get_product_index()
     
     analyzer = SourcingAnalyzer()
     # sheets_manager reemplazado por google_sheets_exporter.py
@@ -562,20 +961,32 @@ def main_streamlit():
         min_reviews_quality = st.slider("Mín. reviews para Best Quality", 1, 50, 5,
                                         help="Mínimo de reviews para considerar en Best Quality")
         
-        # Verificar Google Sheets (modo simplificado)
-        try:
-            # Verificar si existe archivo de credenciales
-            from google_sheets_exporter import GoogleSheetsExporter
-            test_exporter = GoogleSheetsExporter()
-            sheets_enabled = test_exporter.initialize_client()
-            
-            if sheets_enabled:
-                st.success("✅ Google Sheets conectado correctamente")
-            else:
-                st.warning("⚠️ Google Sheets no configurado - funcionando en modo solo lectura")
-        except Exception as e:
-            st.error(f"❌ Error Google Sheets: {e}")
-            sheets_enabled = False
+        force_refresh = st.checkbox("Forzar búsqueda nueva", False,
+                                    help="Ignora los resultados compartidos recientes (de cualquier usuario) "
+                                         "y vuelve a scrapear; consume un request de Oxylabs")
+        
+        # Verificar Google Sheets una vez por sesión (autenticar carga gspread/google-auth
+        # y hace un request); el resultado queda en session_state para los reruns
+        if 'sheets_status' not in st.session_state or st.session_state.sheets_status['enabled'] is None:
+            st.session_state.sheets_status = check_google_sheets()
+        sheets_status = st.session_state.sheets_status
+        sheets_enabled = sheets_status['enabled']
+        if sheets_status['error']:
+            st.error(f"❌ Error Google Sheets: {sheets_status['error']}")
+        elif sheets_enabled:
+            st.success("✅ Google Sheets conectado correctamente")
+        else:
+            st.warning("⚠️ Google Sheets no configurado - funcionando en modo solo lectura")
+            for message in sheets_status['messages']:
+                st.caption(message)
+        if not sheets_enabled and st.button("🔄 Reintentar conexión", key="sheets_retry"):
+            st.session_state.sheets_status['enabled'] = None
+            st.rerun()
+        
+        update_in_place = st.checkbox("Actualizar hojas existentes", False,
+                                      disabled=not sheets_enabled,
+                                      help="Reutiliza la hoja de cada búsqueda y escribe solo las celdas que cambiaron "
+                                           "(conserva CANTIDAD editada a mano) en lugar de crear una hoja nueva")
         
         st.subheader("📊 Información")
         st.info("🔍 **Búsqueda directa en Alibaba** - Scraping en tiempo real con Oxylabs")
@@ -598,17 +1009,33 @@ def main_streamlit():
         
     st.header("📊 Resultados de Análisis")
     
+    # Búsquedas analizadas disponibles para la exportación consolidada
+    exportable_queries = {}
+    
+    # Artefactos derivados con presupuesto de memoria (LRU) en lugar de claves sueltas en session_state
+    artifacts = get_artifact_cache()
+    
+    # Registrar todas las búsquedas guardadas antes de mostrar "visto en N búsquedas"
+    for saved_query, saved_products in st.session_state.search_results.items():
+        product_index.observe(saved_query, saved_products)
+    
     # Procesar cada query
     for query in queries:
+        # Los spans de esta iteración (normalize, triad, ...) quedan asociados a la búsqueda
+        set_context(query=query, session=st.session_state.session_id)
         with st.expander(f"🔍 **{query.title()}**", expanded=True):
             
             # Búsqueda directa en Alibaba - CON PERSISTENCIA
             if st.button(f"🔍 Buscar '{query}' en Alibaba", key=f"search_{query}"):
                 with st.spinner(f"🔍 Buscando '{query}' en Alibaba..."):
-                    raw_data = analyzer.search_products_direct(query)
+                    raw_data = analyzer.search_products_direct(query, refresh=force_refresh)
                     if raw_data:
                         # Guardar en session_state para persistir
                         st.session_state.search_results[query] = raw_data
+                        # Los artefactos y filas de la búsqueda anterior quedaron obsoletos
+                        product_index.discard_query(query)
+                        product_index.observe(query, raw_data)
+                        artifacts.discard_query(query)
                         st.success(f"✅ Encontrados {len(raw_data)} productos")
             
             # Verificar si hay datos en session_state
@@ -624,19 +1051,37 @@ def main_streamlit():
             st.info(f"📊 Analizando {len(raw_data)} productos de '{query}'...")
             
             # Normalizar datos - CACHEAR RESULTADOS
-            cache_key = f"{query}_normalized"
-            if cache_key not in st.session_state or len(raw_data) != st.session_state.get(f"{query}_raw_count", 0):
-                st.info("🔧 Normalizando formatos de precios y extrayendo imágenes...")
-                df = analyzer.normalize_data(raw_data, fx_usd_ars=fx_usd_ars)
-                # Guardar en cache
-                st.session_state[cache_key] = df
-                st.session_state[f"{query}_raw_count"] = len(raw_data)
-            else:
-                df = st.session_state[cache_key]
+            cache_key = (query, 'normalized')
+            df = artifacts.get(cache_key)
+            normalized_hit = df is not None and len(raw_data) == artifacts.get((query, 'raw_count'), 0)
+            record_cache('normalized', normalized_hit)
+            if not normalized_hit:
+                def normalize():
+                    # Sin el ProductIndex de la sesión (se actualiza afuera, en observe): el resultado
+                    # lo reciben otras sesiones y solo puede depender de los productos crudos
+                    normalized_df = analyzer.normalize_data(raw_data, fx_usd_ars=fx_usd_ars)
+                    # Índice de proveedores de la búsqueda: score una vez por proveedor
+                    supplier_index = build_supplier_index(normalized_df)
+                    return attach_supplier_scores(normalized_df, supplier_index), supplier_index
+                
+                # Compartido entre sesiones: los mismos productos crudos se normalizan una vez
+                # (los DataFrames compartidos no se modifican: todo lo derivado trabaja sobre copias)
+                normalized_key = f"{normalize_query(query)}|{fx_usd_ars}|{fingerprint_products(raw_data)}"
+                with st.spinner("🔧 Normalizando formatos de precios y extrayendo imágenes..."):
+                    (df, suppliers), _, _ = get_shared_cache().get_or_compute(
+                        'normalized', normalized_key, normalize, cache_if=lambda result: len(result[0]) > 0)
+                # Guardar en cache (base: se desalojan después de los derivados)
+                artifacts.put(cache_key, df, base=True)
+                artifacts.put((query, 'suppliers'), suppliers, base=True)
+                artifacts.put((query, 'raw_count'), len(raw_data), base=True)
             
             if len(df) == 0:
                 st.error("❌ No hay productos válidos")
                 continue
+            
+            shared_products = product_index.shared_in(query)
+            if shared_products:
+                st.caption(f"🔁 {shared_products} productos de esta búsqueda también aparecen en otras búsquedas")
                 
             # APLICAR FILTROS MEJORADOS
             original_count = len(df)
@@ -699,28 +1144,28 @@ def main_streamlit():
                 st.info("📋 No se aplicaron filtros - mostrando todos los productos")
                 
             # Calcular precios landed - CACHEAR CON PARÁMETROS
-            landed_cache_key = f"{query}_landed_{landed_multiplier}_{fx_usd_ars}_{len(df_filtered)}"
-            if landed_cache_key not in st.session_state:
-                df_final = analyzer.calculate_landed_price(df_filtered, landed_multiplier, fx_usd_ars)
-                st.session_state[landed_cache_key] = df_final
-            else:
-                df_final = st.session_state[landed_cache_key]
+            landed_cache_key = (query, 'landed', landed_multiplier, fx_usd_ars, len(df_filtered))
+            df_final = artifacts.get(landed_cache_key)
+            record_cache('landed', df_final is not None)
+            if df_final is None:
+                df_final = artifacts.put(landed_cache_key,
+                                         analyzer.calculate_landed_price(df_filtered, landed_multiplier, fx_usd_ars))
             
             # Top-N para análisis - CACHEAR
-            topn_cache_key = f"{query}_topn_{top_n}_{len(df_final)}"
-            if topn_cache_key not in st.session_state:
-                df_top_n = df_final.nsmallest(top_n, 'unit_price_norm_usd')
-                st.session_state[topn_cache_key] = df_top_n
-            else:
-                df_top_n = st.session_state[topn_cache_key]
+            topn_cache_key = (query, 'topn', top_n, len(df_final))
+            df_top_n = artifacts.get(topn_cache_key)
+            record_cache('topn', df_top_n is not None)
+            if df_top_n is None:
+                df_top_n = artifacts.put(topn_cache_key, df_final.nsmallest(top_n, 'unit_price_norm_usd'))
             
             # Calcular tríada - CACHEAR
-            triad_cache_key = f"{query}_triad_{min_reviews_quality}_{len(df_top_n)}"
-            if triad_cache_key not in st.session_state:
-                triad = analyzer.calculate_triad(df_top_n, min_reviews_quality)
-                st.session_state[triad_cache_key] = triad
-            else:
-                triad = st.session_state[triad_cache_key]
+            triad_cache_key = (query, 'triad', min_reviews_quality, len(df_top_n))
+            triad = artifacts.get(triad_cache_key)
+            record_cache('triad', triad is not None)
+            if triad is None:
+                # Imágenes validadas solo para los 3 productos de la tríada (una vez por tríada cacheada)
+                triad = artifacts.put(triad_cache_key, analyzer.resolve_triad_images(analyzer.calculate_triad(
+                    df_top_n, min_reviews_quality, trends=analyzer.load_price_trends(query))))
             
             # Calcular estadísticas simples - CON RATING REAL DEL PROVEEDOR
             precio_promedio = df_final['unit_price_norm_usd'].mean()
@@ -743,6 +1188,34 @@ def main_streamlit():
             with col4:
                 st.metric("📝 Con Reviews", f"{proveedores_con_reviews}/{total_productos}")
             
+            # Estadísticas básicas para Google Sheets
+            estadisticas_sheets = {
+                'precio_promedio': precio_promedio,
+                'moq_promedio': moq_promedio,
+                'rating_proveedor_promedio': rating_prov_promedio,
+                'proveedores_con_reviews': proveedores_con_reviews,
+                'proveedores_verificados': proveedores_verificados,
+                'total_productos': total_productos
+            }
+            exportable_queries[query] = {
+                'df_data': df_top_n,
+                'triad_data': triad,
+                'estadisticas': estadisticas_sheets
+            }
+            
+            suppliers = artifacts.get((query, 'suppliers'))
+            if suppliers is not None and len(suppliers) > 0 and st.checkbox(
+                    f"🏭 Ver mejores proveedores ({len(suppliers)})", key=f"suppliers_{query}"):
+                top_suppliers = best_suppliers(suppliers, n=10, verified_only=require_verified)
+                st.dataframe(
+                    top_suppliers.reset_index().rename(columns={
+                        'companyName': 'Proveedor', 'product_count': 'Productos', 'price_min': 'Precio mín',
+                        'price_max': 'Precio máx', 'supplier_gold_level': 'Gold', 'supplier_years': 'Años',
+                        'verified_supplier': 'Verificado', 'amount_sold': 'Vendidos', 'supplier_score': 'Score',
+                    })[['Proveedor', 'Score', 'Productos', 'Precio mín', 'Precio máx', 'Gold', 'Años',
+                        'Verificado', 'Vendidos']],
+                    hide_index=True, use_container_width=True)
+            
             # HEADER SIMPLIFICADO DE LA TRÍADA
             st.markdown("""
             <div style="text-align: center; margin: 1.5rem 0;">
@@ -751,6 +1224,13 @@ def main_streamlit():
             </div>
             """, unsafe_allow_html=True)
             
+            # Miniaturas locales: cada imagen se descarga una vez (pool acotado) y se sirve
+            # desde disco; las URLs muertas quedan recordadas y no se reintentan
+            image_cache = get_image_cache()
+            triad_urls = [triad[key].get('image_link', '') for key in ('cheapest', 'best_quality', 'best_value')
+                          if triad.get(key) is not None]
+            thumbnails = image_cache.prefetch(triad_urls)
+            
             cols = st.columns(3)
             triad_types = [
                 ('cheapest', '💰 MÁS BARATO', '#28a745', 'Precio más bajo del mercado'),
@@ -775,24 +1255,17 @@ def main_streamlit():
                         </div>
                         """, unsafe_allow_html=True)
                         
-                        # IMÁGENES - SISTEMA MEJORADO CON FALLBACKS
+                        # IMÁGENES - MINIATURA LOCAL DEL CACHE
                         img_url = product.get('image_link', '')
                         image_displayed = False
                         
-                        if img_url and isinstance(img_url, str) and img_url.startswith('http'):
+                        thumbnail_path = thumbnails.get(img_url) if isinstance(img_url, str) else None
+                        if thumbnail_path:
                             try:
-                                st.image(img_url, width=180, caption="Imagen del producto")
+                                st.image(thumbnail_path, width=180, caption="Imagen del producto")
                                 image_displayed = True
-                            except Exception as e:
-                                # Intentar construir URL alternativa desde product_id
-                                product_id = product.get('product_id')
-                                if product_id:
-                                    alt_url = f"https://s.alicdn.com/@sc04/kf/H{product_id}_220x220.jpg"
-                                    try:
-                                        st.image(alt_url, width=180, caption="Imagen del producto")
-                                        image_displayed = True
-                                    except:
-                                        pass
+                            except Exception:
+                                pass  # Miniatura desalojada del cache: se muestra el placeholder
                         
                         if not image_displayed:
                             # Mostrar placeholder informativo
@@ -836,6 +1309,12 @@ def main_streamlit():
                         
                         # INFO DEL PROVEEDOR ELIMINADA POR SOLICITUD DEL USUARIO
                         
+                        seen_in = product_index.query_count(product.get('dedup_key'))
+                        if seen_in > 1:
+                            st.markdown(f"""
+                            <div style="margin-bottom: 0.3rem;"><strong>🔁 Visto en:</strong> {seen_in} búsquedas</div>
+                            """, unsafe_allow_html=True)
+                        
                         # Certificaciones si existen
                         certifications = product.get('product_certifications', [])
                         if isinstance(certifications, list) and len(certifications) > 0:
@@ -866,96 +1345,62 @@ def main_streamlit():
                         """, unsafe_allow_html=True)
             
             # Tabla de productos con imágenes - TÍTULOS COMPLETOS
-            st.subheader(f"📋 Top {len(df_top_n)} Productos")
+            # Paginada del lado del servidor: filtro y orden sobre el DataFrame cacheado,
+            # solo la página visible se formatea, se envía al navegador y carga imágenes
+            show_all = st.checkbox(f"Mostrar todos los productos filtrados ({len(df_final)})", False,
+                                   key=f"show_all_{query}")
+            table_source = df_final if show_all else df_top_n
+            st.subheader(f"📋 {'Todos los' if show_all else f'Top {len(df_top_n)}'} Productos")
             
-            # TABLA CON RATING Y REVIEWS DEL PROVEEDOR
-            required_cols = ['image_link', 'title', 'companyName', 'unit_price_norm_usd', 'landed_est_usd', 
-                           'moq', 'supplier_rating', 'supplier_reviews_count', 'verified_supplier', 'productUrl']
-            optional_cols = ['product_certifications', 'supplier_profile_url']
+            search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+            with search_col:
+                table_search = st.text_input("🔎 Buscar producto o proveedor", "", key=f"table_search_{query}")
+            with sort_col:
+                sort_label = st.selectbox("Ordenar por", list(TABLE_SORT_OPTIONS), key=f"table_sort_{query}")
+            with order_col:
+                descending = st.checkbox("Desc.", False, key=f"table_desc_{query}")
+            with size_col:
+                page_size = st.selectbox("Filas", PAGE_SIZES, key=f"table_page_size_{query}")
             
-            # Solo usar columnas que realmente existen
-            available_cols = required_cols.copy()
-            for col in optional_cols:
-                if col in df_top_n.columns:
-                    available_cols.append(col)
-                    
-            display_df = df_top_n[available_cols].copy()
+            # Filas visibles (posiciones) cacheadas por filtros + búsqueda + orden
+            filter_state = (require_verified, min_reviews_filter, require_certifications,
+                            landed_multiplier, fx_usd_ars, top_n, len(table_source), show_all)
+            view_cache_key = (query, 'view', filter_state, table_search, sort_label, descending)
+            positions = artifacts.get(view_cache_key)
+            record_cache('table_view', positions is not None)
+            if positions is None:
+                positions = artifacts.put(view_cache_key, table_view_positions(
+                    table_source, table_search, TABLE_SORT_OPTIONS[sort_label], not descending))
             
-            # Agregar columnas faltantes como vacías si no existen
-            if 'product_certifications' not in display_df.columns:
-                display_df['product_certifications'] = [[] for _ in range(len(display_df))]
-            if 'supplier_profile_url' not in display_df.columns:
-                display_df['supplier_profile_url'] = ''
-            if 'supplier_reviews_count' not in display_df.columns:
-                display_df['supplier_reviews_count'] = 0
+            total_pages = max(1, -(-len(positions) // page_size))
+            page = 1
+            page_key = f"table_page_{query}"
+            if st.session_state.get(page_key, 1) > total_pages:
+                st.session_state[page_key] = 1  # La búsqueda/filtros dejaron menos páginas
+            if total_pages > 1:
+                page = int(st.number_input(f"Página (de {total_pages})", 1, total_pages, 1, key=page_key))
+            page_rows = table_source.iloc[positions[(page - 1) * page_size:page * page_size]]
+            st.caption(f"{len(positions)} productos · mostrando {len(page_rows)} · página {page}/{total_pages}")
             
-            # MANEJO DE IMÁGENES - MEJORADO PARA MOSTRAR DISPONIBLES
-            def fix_image_url(row):
-                img_url = row.get('image_link', '')
-                if img_url and isinstance(img_url, str) and img_url.startswith('http') and 'placeholder' not in img_url.lower():
-                    return img_url
-                else:
-                    return "https://via.placeholder.com/100x100?text=Sin+Imagen"  # Placeholder visible
-            
-            display_df['image_link'] = display_df.apply(fix_image_url, axis=1)
-            
-            # Crear títulos COMPLETOS sin truncar
-            def create_full_title(row):
-                title = str(row['title'])  # TÍTULO COMPLETO SIN TRUNCAR - ARREGLADO POR SOLICITUD DEL USUARIO
-                return title
-                
-            display_df['📦 Producto'] = display_df.apply(create_full_title, axis=1)
-            display_df['🏭 Proveedor'] = display_df['companyName']
-            display_df['💰 Precio USD'] = display_df['unit_price_norm_usd'].apply(lambda x: f"${x:,.2f}")
-            display_df['💰 Valor Final'] = display_df['landed_est_usd'].apply(lambda x: f"${x:,.2f}")
-            display_df['📦 MOQ'] = display_df['moq'].astype(int).apply(lambda x: f"{x:,}")
-            display_df['⭐ Rating Proveedor'] = display_df['supplier_rating'].apply(lambda x: f"{x:.1f}/5" if x > 0 else "Sin rating")
-            display_df['📝 Reviews Proveedor'] = display_df['supplier_reviews_count'].astype(int).apply(lambda x: f"{x:,} reviews" if x > 0 else "Sin reviews")
-            display_df['✅ Verificado'] = display_df['verified_supplier'].map({True: '✅ Sí', False: '❌ No'})
-            
-            # Crear columna de certificaciones
-            def format_certifications(row):
-                certs = row.get('product_certifications', [])
-                if isinstance(certs, list) and len(certs) > 0:
-                    return ', '.join(certs[:3])  # Mostrar máximo 3 certificaciones
-                return "Sin certificaciones"
-            
-            display_df['🏷️ Certificaciones'] = display_df.apply(format_certifications, axis=1)
-            
-            # Crear columna de link del proveedor
-            def create_supplier_link_column(row):
-                url = row.get('supplier_profile_url', '')
-                if url and url != 'N/A':
-                    return url
-                return ""
-                
-            display_df['🏭 Link Proveedor'] = display_df.apply(create_supplier_link_column, axis=1)
-            
-            # Crear columna de link del producto
-            def create_link_column(row):
-                # Usar el campo correcto de URL del producto
-                url = row.get('productUrl') or row.get('product_url') or row.get('product_link', '')
-                url = fix_alibaba_link(url)
-                if url and "Link no disponible" not in url:
-                    return url  # Devolver solo la URL, no markdown
-                return ""  # String vacío para links no disponibles
-                
-            display_df['🔗 Link Producto'] = display_df.apply(create_link_column, axis=1)
-            
-            # DataFrame final - CON RATING Y REVIEWS DEL PROVEEDOR CORRECTO
-            final_df = display_df[[
-                'image_link', '📦 Producto', '🏭 Proveedor', '✅ Verificado',
-                '💰 Precio USD', '💰 Valor Final', '📦 MOQ', 
-                '⭐ Rating Proveedor', '📝 Reviews Proveedor', '🏷️ Certificaciones',
-                '🏭 Link Proveedor', '🔗 Link Producto'
-            ]].copy()
-            final_df = final_df.rename(columns={'image_link': '📷 Imagen'})
+            # TABLA CON RATING Y REVIEWS DEL PROVEEDOR - vectorizada y cacheada por página
+            display_cache_key = (*view_cache_key, 'display', page, page_size)
+            final_df = artifacts.get(display_cache_key)
+            record_cache('display', final_df is not None)
+            if final_df is None:
+                # Imágenes validadas y miniaturas solo de las filas visibles, como data URI
+                # en lugar de la imagen remota
+                page_rows = analyzer.resolve_row_images(page_rows)
+                page_thumbnails = image_cache.prefetch(page_rows['image_link'].tolist())
+                image_uris = {url: image_cache.data_uri(url) for url, path in page_thumbnails.items() if path}
+                final_df = artifacts.put(display_cache_key, build_display_table(
+                    page_rows, {url: uri for url, uri in image_uris.items() if uri}))
             
             # Mostrar tabla - SIMPLIFICADA Y CLARIFICADA
             st.dataframe(
                 final_df, 
                 use_container_width=True,
-                height=450,
+                height=min(450, 35 * (len(final_df) + 1) + 3),
+                hide_index=True,
                 column_config={
                     "📷 Imagen": st.column_config.ImageColumn(
                         "📷 Imagen",
@@ -1004,32 +1449,14 @@ def main_streamlit():
                                         type="primary")
                 
                 if export_button:
-                    try:
-                        with st.spinner("🔄 Creando análisis profesional en Google Sheets..."):
-                            # Estadísticas básicas para Google Sheets
-                            estadisticas_sheets = {
-                                'precio_promedio': precio_promedio,
-                                'moq_promedio': moq_promedio,
-                                'rating_proveedor_promedio': rating_prov_promedio,
-                                'proveedores_con_reviews': proveedores_con_reviews,
-                                'proveedores_verificados': proveedores_verificados,
-                                'total_productos': total_productos
-                            }
-                            
-                            # Llamar función de exportación
-                            from google_sheets_exporter import export_to_google_sheets
-                            url = export_to_google_sheets(query, df_top_n, triad, estadisticas_sheets)
-                            
-                            if url:
-                                st.balloons()
-                                st.success("✅ ¡Datos exportados exitosamente a Google Sheets!")
-                                st.markdown(f"🔗 **[Ver hoja creada]({url})**", unsafe_allow_html=True)
-                                st.info(f"📊 Precio promedio: ${precio_promedio:,.2f} | 📦 MOQ promedio: {moq_promedio:,.0f} pcs | ⭐ Rating proveedor: {rating_prov_promedio:.1f}/5")
-                            else:
-                                st.error("❌ Error durante la exportación a Google Sheets")
-                                
-                    except Exception as e:
-                        st.error(f"❌ Error exportando a Google Sheets: {str(e)}")
+                    # Encolar en segundo plano: el handler retorna al instante
+                    from export_jobs import submit_export
+                    job = submit_export(query, df_top_n, triad, estadisticas_sheets,
+                                        update_in_place=update_in_place)
+                    st.session_state.export_jobs[query] = job.id
+                
+                if query in st.session_state.export_jobs:
+                    render_export_job(st.session_state.export_jobs[query], link_text="Ver hoja creada")
                         
             else:
                 st.markdown("""
@@ -1043,5 +1470,24 @@ def main_streamlit():
                 """, unsafe_allow_html=True)
             st.markdown("</div>", unsafe_allow_html=True)
     
+    # Exportación consolidada: todas las búsquedas + hoja resumen en una sola operación
+    if sheets_enabled and exportable_queries:
+        st.markdown("---")
+        if st.button(f"📚 Exportar todas las búsquedas ({len(exportable_queries)}) a Google Sheets",
+                     key="sheets_all", type="primary",
+                     help="Crea una hoja por búsqueda y una hoja RESUMEN en una sola operación"):
+            from export_jobs import submit_export_all
+            job = submit_export_all(exportable_queries, update_in_place=update_in_place)
+            st.session_state.export_jobs['__all__'] = job.id
+        
+        if '__all__' in st.session_state.export_jobs:
+            render_export_job(st.session_state.export_jobs['__all__'], link_text="Ver resumen")
+    
+    clear_context()
+    render_cache_stats(artifacts)
+    render_oxylabs_usage()
+    render_debug_panel(queries, st.session_state.session_id)
+    flush_to_file_from_env()
+    
 if __name__ == "__main__":
     main_streamlit()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Supplier Index - Sourcing Triads
+Agregado por proveedor de una búsqueda normalizada: cantidad de productos, rango de precios,
+nivel Gold, años, verificación y vendidos. El score del proveedor se calcula una vez por
+proveedor y las filas de productos lo reciben por join (companyName).
+"""
+
+from typing import Optional
+
+import pandas as pd
+
+# Pesos del score de proveedor (los mismos que usaba calculate_triad por fila)
+VERIFIED_WEIGHT = 0.2
+RATING_WEIGHT = 0.5
+REVIEWS_WEIGHT = 0.3
+YEARS_WEIGHT = 0.2
+SOLD_WEIGHT = 0.1
+# Años de experiencia que valen el puntaje completo
+YEARS_CAP = 20.0
+
+SUPPLIER_KEY = 'companyName'
+
+
+def build_supplier_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Una fila por proveedor (índice companyName), ordenada por supplier_score"""
+    named = df[df[SUPPLIER_KEY].astype(str).str.strip() != '']
+    if named.empty:
+        return pd.DataFrame(columns=['product_count', 'price_min', 'price_max', 'price_spread',
+                                     'supplier_gold_level', 'supplier_years', 'verified_supplier',
+                                     'supplier_rating', 'supplier_reviews_count', 'amount_sold',
+                                     'supplier_score'])
+    index = named.groupby(SUPPLIER_KEY, observed=True, sort=False).agg(
+        product_count=('unit_price_norm_usd', 'size'),
+        price_min=('unit_price_norm_usd', 'min'),
+        price_max=('unit_price_norm_usd', 'max'),
+        supplier_gold_level=('supplier_gold_level', 'max'),
+        supplier_years=('supplier_years', 'max'),
+        verified_supplier=('verified_supplier', 'any'),
+        supplier_rating=('supplier_rating', 'max'),
+        supplier_reviews_count=('supplier_reviews_count', 'max'),
+        amount_sold=('amount_sold', 'sum'),
+    )
+    index['price_spread'] = index['price_max'] - index['price_min']
+    index['supplier_score'] = supplier_scores(index)
+    index.index = index.index.astype(str)
+    return index.sort_values('supplier_score', ascending=False)
+
+
+def supplier_scores(frame: pd.DataFrame, reviews_max: Optional[float] = None,
+                    sold_max: Optional[float] = None) -> pd.Series:
+    """Score 0-1.3 por fila de `frame` (proveedores del índice o productos sueltos)
+    verificación + rating + reviews/máximo + años + vendidos/máximo"""
+    reviews = frame['supplier_reviews_count'].fillna(0)
+    sold = frame['amount_sold'].fillna(0) if 'amount_sold' in frame.columns else None
+    reviews_max = reviews.max() if reviews_max is None else reviews_max
+    scores = frame['verified_supplier'].astype(int) * VERIFIED_WEIGHT
+    scores += (frame['supplier_rating'].fillna(0) / 5.0) * RATING_WEIGHT
+    if reviews_max > 0:
+        scores += (reviews / reviews_max).clip(0, 1) * REVIEWS_WEIGHT
+    if 'supplier_years' in frame.columns:
+        scores += (frame['supplier_years'].fillna(0) / YEARS_CAP).clip(0, 1) * YEARS_WEIGHT
+    if sold is not None:
+        sold_max = sold.max() if sold_max is None else sold_max
+        if sold_max > 0:
+            scores += (sold / sold_max).clip(0, 1) * SOLD_WEIGHT
+    return scores.astype(float)
+
+
+def attach_supplier_scores(df: pd.DataFrame, index: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Agregar supplier_score a cada producto por join con el índice de proveedores;
+    los productos sin nombre de proveedor se puntúan por fila con la misma fórmula"""
+    df = df.copy()
+    if index is None:
+        index = build_supplier_index(df)
+    df['supplier_score'] = df[SUPPLIER_KEY].astype(str).map(index['supplier_score']).astype(float)
+    missing = df['supplier_score'].isna()
+    if missing.any():
+        reviews_max = index['supplier_reviews_count'].max() if len(index) else None
+        sold_max = index['amount_sold'].max() if len(index) else None
+        df.loc[missing, 'supplier_score'] = supplier_scores(df[missing], reviews_max, sold_max)
+    return df
+
+
+def best_suppliers(index: pd.DataFrame, n: int = 10, verified_only: bool = False) -> pd.DataFrame:
+    """Top-N proveedores por supplier_score"""
+    if verified_only:
+        index = index[index['verified_supplier']]
+    return index.head(n)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Tests de benchmarks - Sourcing Triads
+Corre los benchmarks como lo haría CI (con `python -O`, que elimina los `assert`) y falla
+si alguno detecta una regresión.
+Uso: python -m pytest -q test_benchmarks.py
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+
+def run_benchmark(script: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, '-O', script, *args], cwd=ROOT, capture_output=True, text=True)
+
+
+def test_sheets_export_call_counts():
+    result = run_benchmark('benchmark_sheets_export.py')
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_import_time_budgets():
+    # Presupuestos holgados: la máquina de CI no es la de referencia
+    result = run_benchmark('benchmark_import_time.py', '--runs', '1', '--budget-scale', '2')
+    assert result.returncode == 0, result.stdout + result.stderr
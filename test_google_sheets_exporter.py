@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests del diff en el lugar de GoogleSheetsExporter - Sourcing Triads
+Uso: python -m pytest -q test_google_sheets_exporter.py
+"""
+
+from benchmark_sheets_export import build_query_data
+from google_sheets_exporter import SHEET_HEADERS, GoogleSheetsExporter
+
+
+def sheet_rows(n_products: int = 3, price_offset: float = 0.0):
+    data = build_query_data("licuadoras", n_products=n_products, price_offset=price_offset)
+    return GoogleSheetsExporter()._collect_rows(data['df_data'], data['triad_data'])
+
+
+def test_diff_maps_columns_by_header_name():
+    exporter = GoogleSheetsExporter()
+    rows = sheet_rows()
+    # Hoja editada a mano: una columna NOTAS al principio y PRECIO_USD movida al final
+    header = ['NOTAS'] + [h for h in SHEET_HEADERS if h != 'PRECIO_USD'] + ['PRECIO_USD']
+    reorder = lambda row: ['nota'] + [v for h, v in zip(SHEET_HEADERS, row) if h != 'PRECIO_USD'] + [row[4]]
+    existing = [header] + [reorder(row) for row in rows]
+
+    changed = sheet_rows(n_products=4, price_offset=1.0)
+    updates, _, added, last_row = exporter._diff_rows(existing, changed)
+
+    cells = {u['range']: u['values'] for u in updates}
+    price_col = exporter._get_cell_reference(2, header.index('PRECIO_USD') + 1)
+    assert cells[price_col] == [[changed[0][4]]]
+    assert not any(ref.startswith('A') and ':' not in ref for ref in cells), "se pisó la columna NOTAS"
+    assert added == 1 and last_row == len(existing) + 1
+    new_row = cells[f"A{len(existing) + 1}:{exporter._get_cell_reference(last_row, len(header))}"][0]
+    assert new_row[0] == "" and new_row[-1] == changed[-1][4]
+    cantidad = exporter._get_cell_reference(1, header.index('CANTIDAD') + 1)[:-1]
+    valor = exporter._get_cell_reference(1, header.index('VALOR_FINAL') + 1)[:-1]
+    assert new_row[header.index('COSTO_TOTAL')] == f"={valor}{last_row}*{cantidad}{last_row}"
+
+
+def test_diff_rewrites_sheet_without_product_column():
+    exporter = GoogleSheetsExporter()
+    rows = sheet_rows()
+    existing = [['PRODUCTO', 'OTRA'], ['viejo', 'x']]
+    updates, _, added, _ = exporter._diff_rows(existing, rows)
+    assert updates == [{'range': 'A1', 'values': [SHEET_HEADERS] + rows}]
+    assert added == len(rows)
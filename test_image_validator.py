@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests de ImageURLValidator contra un servidor HTTP local (http.server) - Sourcing Triads
+Uso: python -m pytest -q test_image_validator.py
+"""
+
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from image_validator import ImageURLValidator
+
+# ruta -> (status HEAD, status GET, Content-Type)
+ROUTES = {
+    '/viva.jpg': (200, 200, 'image/jpeg'),
+    '/muerta.jpg': (404, 404, 'text/html'),
+    '/sin-head.jpg': (405, 200, 'image/png'),
+    '/html.jpg': (200, 200, 'text/html'),
+}
+
+
+@pytest.fixture
+def server():
+    requests_seen = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, method: str):
+            requests_seen[(method, self.path)] += 1
+            head_status, get_status, content_type = ROUTES.get(self.path, (404, 404, 'text/html'))
+            self.send_response(head_status if method == 'HEAD' else get_status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_HEAD(self):
+            self._reply('HEAD')
+
+        def do_GET(self):
+            self._reply('GET')
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests_seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_check_head_and_get_fallback(server):
+    base, requests_seen = server
+    validator = ImageURLValidator(timeout=2)
+    live = validator.validate([f"{base}{path}" for path in ROUTES])
+    assert live == {f"{base}/viva.jpg": True, f"{base}/muerta.jpg": False,
+                    f"{base}/sin-head.jpg": True, f"{base}/html.jpg": False}
+    assert requests_seen[('GET', '/sin-head.jpg')] == 1  # HEAD 405 -> GET
+    assert requests_seen[('GET', '/viva.jpg')] == 0
+
+    # Resultado cacheado: no vuelve a consultar el servidor
+    assert validator.check(f"{base}/viva.jpg") is True
+    assert requests_seen[('HEAD', '/viva.jpg')] == 1
+
+
+def test_first_live_checks_only_needed_candidates(server):
+    base, requests_seen = server
+    validator = ImageURLValidator(timeout=2)
+    chosen = validator.first_live([
+        [f"{base}/muerta.jpg", f"{base}/viva.jpg", f"{base}/nunca.jpg"],
+        [f"{base}/sin-head.jpg", f"{base}/nunca.jpg"],
+        [f"{base}/html.jpg"],
+        [],
+    ])
+    assert chosen == [f"{base}/viva.jpg", f"{base}/sin-head.jpg", None, None]
+    assert requests_seen[('HEAD', '/nunca.jpg')] == 0
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Tests de instrumentation - Sourcing Triads
+Uso: python -m pytest -q test_instrumentation.py
+"""
+
+import instrumentation
+from instrumentation import clear_context, recent_spans, set_context, span
+
+
+def test_recent_spans_filtered_by_session():
+    instrumentation.clear_recent()
+    try:
+        for session in ('sesion-a', 'sesion-b'):
+            set_context(query='licuadoras', session=session)
+            with span('normalize'):
+                with span('normalize.images'):
+                    pass
+        own = recent_spans('licuadoras', session='sesion-a')
+        assert sorted(s['name'] for s in own) == ['normalize', 'normalize.images']
+        assert len(recent_spans('licuadoras')) == 4
+    finally:
+        clear_context()
+        instrumentation.clear_recent()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests de metrics - Sourcing Triads
+Formato de exposición Prometheus: los valores grandes no deben perder precisión.
+Uso: python -m pytest -q test_metrics.py
+"""
+
+from metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_large_counter_renders_full_precision():
+    counter = Counter('oxylabs_response_bytes_total', 'Bytes received from Oxylabs')
+    counter.inc(12345679)
+    assert counter.render()[-1] == 'oxylabs_response_bytes_total 12345679'
+
+
+def test_fractional_and_special_values():
+    gauge = Gauge('ratio', 'Ratio', ['kind'])
+    gauge.set(1234567.125, kind='frac')
+    gauge.set(float('inf'), kind='inf')
+    gauge.set(float('nan'), kind='nan')
+    lines = gauge.render()
+    assert 'ratio{kind="frac"} 1234567.125' in lines
+    assert 'ratio{kind="inf"} +Inf' in lines
+    assert 'ratio{kind="nan"} NaN' in lines
+
+
+def test_histogram_sum_and_bounds():
+    histogram = Histogram('bytes', 'Bytes', buckets=(0.25, 1000000, 25000000))
+    histogram.observe(12345679)
+    histogram.observe(0.1)
+    lines = histogram.render()
+    assert 'bytes_bucket{le="0.25"} 1' in lines
+    assert 'bytes_bucket{le="1000000"} 1' in lines
+    assert 'bytes_bucket{le="25000000"} 2' in lines
+    assert 'bytes_bucket{le="+Inf"} 2' in lines
+    assert 'bytes_sum 12345679.1' in lines
+
+
+def test_registry_render_ends_with_newline():
+    registry = MetricsRegistry()
+    registry.counter('calls_total', 'Calls').inc(3)
+    assert registry.render().endswith('calls_total 3\n')
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Tests de SharedCache - Sourcing Triads
+Uso: python -m pytest -q test_shared_cache.py
+"""
+
+import pandas as pd
+
+from session_cache import estimate_size
+from shared_cache import SharedCache
+
+
+def test_byte_budget_evicts_least_recently_used():
+    frame = lambda n: pd.DataFrame({'title': [f"producto {i}" for i in range(n)]})
+    size = estimate_size(frame(1000))
+    cache = SharedCache(ttl=60, max_bytes=int(size * 2.5))
+    for key in ('a', 'b', 'c'):
+        cache.put('normalized', key, frame(1000))
+    assert cache.get('normalized', 'a') is None
+    assert cache.get('normalized', 'c') is not None
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+    # Una entrada que sola supera el presupuesto se guarda igual (desaloja al resto)
+    cache.put('normalized', 'grande', frame(5000))
+    assert cache.stats()['entries'] == 1
+    cache.invalidate('normalized', 'grande')
+    assert cache.stats()['bytes'] == 0